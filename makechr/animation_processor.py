@@ -0,0 +1,140 @@
+import decompose_sprites_processor
+import errors
+import multiprocessing
+from PIL import Image
+import re
+import rgb
+
+
+def parse_frame_grid(text):
+  """Parse the size of frames in an animation sheet, like "32x24".
+
+  Returns the width and height.
+  """
+  m = re.match(r'^(\d+)x(\d+)$', text or '')
+  if not m or not int(m.group(1)) or not int(m.group(2)):
+    raise errors.CommandLineArgError(
+      'frame grid must be a size like "32x32", got "%s"' % text)
+  return int(m.group(1)), int(m.group(2))
+
+
+def split_frames(img, frame_width, frame_height):
+  """Split an animation sheet into frames, left to right, top to bottom."""
+  width, height = img.size
+  if width % frame_width or height % frame_height:
+    raise errors.CommandLineArgError(
+      'image size %dx%d is not a multiple of the frame grid %dx%d' % (
+        width, height, frame_width, frame_height))
+  frames = []
+  for y in range(0, height, frame_height):
+    for x in range(0, width, frame_width):
+      frames.append(img.crop((x, y, x + frame_width, y + frame_height)))
+  return frames
+
+
+class FrameResult(object):
+  """Pictures found in a single frame, sent back from a worker process.
+
+  pictures: List of (bounds, picture) for each picture in the frame, where
+      bounds is (top, left, bottom, right) and picture is a list of PicElems.
+  tiles: Nes colors of each tile that PicElems refer to, 64 bytes each.
+  errors: Errors found in the frame, with positions relative to the frame.
+  """
+
+  def __init__(self):
+    self.pictures = []
+    self.tiles = []
+    self.errors = []
+
+
+def decompose_frame(task):
+  """Decompose a single frame into pictures, without building chr.
+
+  Runs in a worker process, so the frame is passed as its raw bytes.
+
+  task: Tuple of the frame's mode, size, and bytes, the bg mask and fill, and
+      the name of the rgb mapping.
+  """
+  mode, size, data, bg_mask, bg_fill, mapping_name = task
+  img = Image.frombytes(mode, size, data)
+  processor = decompose_sprites_processor.DecomposeSpritesProcessor()
+  processor.set_rgb_mapping(rgb.get_mapping(mapping_name))
+  result = FrameResult()
+  if processor.prepare_image(img, bg_mask, bg_fill):
+    regions, all_tiles, picdata = processor.find_pictures(None)
+    processor.collect_color_needs(regions, all_tiles, picdata)
+    for i, g in enumerate(regions):
+      bounds = (g.min_y, g.min_x, g.max_y, g.max_x)
+      result.pictures.append((bounds, picdata[i]))
+    result.tiles = all_tiles
+  result.errors = processor.err().get()
+  return result
+
+
+class AnimationProcessor(decompose_sprites_processor.DecomposeSpritesProcessor):
+  """Decompose frames of an animation, sharing chr and palette between them.
+
+  Frames are decomposed in parallel by worker processes. Their color needs
+  are then combined to make a single palette, and their tiles merged into
+  one chr set, where a tile that appears in more than one frame, even if
+  flipped, is only stored once.
+  """
+
+  def process_frames(self, frames, palette_text, bg_mask, bg_fill, jobs=None):
+    """Decompose each frame, building chr, palette, and picdata for all.
+
+    frames: List of frame images.
+    palette_text: Optional palette text.
+    bg_mask: Background mask color.
+    bg_fill: Background fill color.
+    jobs: Number of worker processes. Defaults to the number of cpus. If 1,
+        frames are decomposed in this process.
+    """
+    # Used to extract the palette from an indexed image.
+    self.img = frames[0]
+    self.palette_text = palette_text
+    self.bg_mask = bg_mask
+    self.bg_fill = bg_fill
+    tasks = []
+    for img in frames:
+      if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGB')
+      tasks.append((img.mode, img.size, img.tobytes(), bg_mask, bg_fill,
+                    self.rgb_mapping.name))
+    results = self.map_frames(tasks, jobs)
+    for n, res in enumerate(results):
+      for e in res.errors:
+        # Positions are within the frame, so keep which frame it was.
+        e.frame = n
+        self._err.add(e)
+    if self._err.has():
+      return
+    # Ids from each worker are only local to that frame.
+    for res in results:
+      for bounds, picture in res.pictures:
+        for elem in picture:
+          elem.cid = self._color_manifest.id(elem.color_needs)
+    self._needs_provider = self._color_manifest
+    pal = self.choose_palette()
+    if self._err.has():
+      return
+    self._ppu_memory.palette_spr = pal
+    result = []
+    chrdata_cache = {}
+    for n, res in enumerate(results):
+      pictures = [self.build_picture(bounds, picture, res.tiles, pal,
+                                     chrdata_cache)
+                  for bounds, picture in res.pictures]
+      result.append({'frame': n, 'pictures': pictures})
+    self._ppu_memory.sprite_picdata = result
+
+  def map_frames(self, tasks, jobs):
+    jobs = min(jobs or multiprocessing.cpu_count(), len(tasks))
+    if jobs <= 1:
+      return [decompose_frame(t) for t in tasks]
+    pool = multiprocessing.Pool(jobs)
+    try:
+      return pool.map(decompose_frame, tasks)
+    finally:
+      pool.close()
+      pool.join()
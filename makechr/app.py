@@ -1,22 +1,57 @@
+import changed_file_writer
 import collections
+import component_serializer
+import copy
 import errors
-import memory_importer
+import io
 import os
-import pixel_art_renderer
 import ppu_memory
-import rom_builder
-import view_renderer
+import rgb
+import view_scheduler
 import sys
+import time
 
+try:
+  import queue
+except ImportError:
+  import Queue as queue
 
+
+# Errors past this many are only summarized by type.
+MAX_LISTED_ERRORS = 100
+
+
+# Seconds between checks for interrupts, while waiting for changes to files.
+WATCH_POLL_SECONDS = 0.5
+
+
+VIEW_NAMES = ['palette', 'colorization', 'reuse', 'nametable', 'chr', 'grid',
+              'free_zone']
+
+
+# Imported when first needed, so that starting up is quick.
+Image = None
+animation_processor = None
 eight_by_sixteen_processor = None
 free_sprite_processor = None
 decompose_sprites_processor = None
 image_processor = None
+file_modify_watcher = None
 makepal_processor = None
+memory_importer = None
+pixel_art_renderer = None
+rom_builder = None
+view_renderer = None
 
 
 class Application(object):
+  def __init__(self):
+    self.file_writer = None
+    # Whether to keep the processor, and the results cached by it, between
+    # runs, so that processing an edited image is quicker.
+    self.incremental = False
+    self._processor = None
+
   def run(self, img, args):
     traversal = self.get_traversal(args.traversal_strategy)
     if args.makepal:
@@ -24,13 +59,37 @@ class Application(object):
       if not makepal_processor:
         import makepal_processor
       processor = makepal_processor.MakepalProcessor()
-      processor.process_image(img, args)
+      processor.process_image(img, args, self.get_rgb_mapping(args))
       if processor.err().has():
         self.handle_errors(processor.err(), img, args)
         return False
-      processor.create_output(args.output)
+      processor.create_output(args.output, self.get_file_writer(args))
+      self.show_unchanged(args)
       return True
-    elif 'free' in traversal:
+    processor = self.process_image(img, args, traversal)
+    if args.decompose_sprites and processor.err().has():
+      self.handle_errors(processor.err(), img, args)
+      return False
+    views = self.schedule_views(processor.ppu_memory(), args, img)
+    if processor.err().has():
+      self.finish_views(views, args)
+      self.handle_errors(processor.err(), img, args)
+      return False
+    self.create_output_with_views(processor.ppu_memory(), args, traversal,
+                                  args.platform, views)
+    if args.show_stats:
+      self.show_stats(processor.ppu_memory(), processor, args)
+    self.show_unchanged(args)
+    return True
+
+  def process_image(self, img, args, traversal):
+    """Process the image, picking a processor based upon the args.
+
+    img: Pixel art image.
+    args: Arguments, either from the command-line or library options.
+    traversal: Traversal strategy, from get_traversal.
+    """
+    if 'free' in traversal:
       # DEPRECATED
       if not args.is_sprite or args.bg_color.fill is None:
         raise errors.CommandLineArgError(
@@ -40,7 +99,8 @@ class Application(object):
       if not free_sprite_processor:
         import free_sprite_processor
       processor = free_sprite_processor.FreeSpriteProcessor(traversal)
-      processor.set_verbose('--verbose' in sys.argv)
+      processor.set_verbose(getattr(args, 'verbose', False))
+      processor.set_rgb_mapping(self.get_rgb_mapping(args))
       processor.process_image(img, args.palette, args.bg_color.mask,
                               args.bg_color.fill, args.platform,
                               args.is_locked_tiles, args.lock_sprite_flips,
@@ -52,18 +112,21 @@ class Application(object):
       if args.bg_color.fill is None:
         raise errors.CommandLineArgError(
           'Decompose sprites mode requires -b `mask=fill` flags')
-      global decompose_sprites_processor
-      if not decompose_sprites_processor:
-        import decompose_sprites_processor
-      processor = decompose_sprites_processor.DecomposeSpritesProcessor()
-      # TODO: lock_sprite_flags, is_locked_tiles, allow_overflow?
-      processor.process_image(img, args.palette,
-                              args.bg_color.mask, args.bg_color.fill,
-                              {'anon_view': args.rect_cover_anon_view,
-                               'steps_view': args.rect_cover_steps_view})
+      if getattr(args, 'frame_grid', None) or getattr(args, 'frame', None):
+        processor = self.process_animation(img, args)
+      else:
+        global decompose_sprites_processor
+        if not decompose_sprites_processor:
+          import decompose_sprites_processor
+        processor = decompose_sprites_processor.DecomposeSpritesProcessor()
+        processor.set_rgb_mapping(self.get_rgb_mapping(args))
+        # TODO: lock_sprite_flags, is_locked_tiles, allow_overflow?
+        processor.process_image(img, args.palette,
+                                args.bg_color.mask, args.bg_color.fill,
+                                {'anon_view': args.rect_cover_anon_view,
+                                 'steps_view': args.rect_cover_steps_view})
       if processor.err().has():
-        self.handle_errors(processor.err(), img, args)
-        return False
+        return processor
       args.is_sprite = True
     elif traversal == '8x16':
       if not args.is_sprite:
@@ -72,7 +135,9 @@ class Application(object):
       global eight_by_sixteen_processor
       if not eight_by_sixteen_processor:
         import eight_by_sixteen_processor
-      processor = eight_by_sixteen_processor.EightBySixteenProcessor()
+      processor = self.make_processor(
+        eight_by_sixteen_processor.EightBySixteenProcessor)
+      processor.set_rgb_mapping(self.get_rgb_mapping(args))
       processor.process_image(img, args.palette, args.bg_color.mask,
                               args.bg_color.fill, args.platform, traversal,
                               args.is_sprite, args.is_locked_tiles,
@@ -81,21 +146,135 @@ class Application(object):
       global image_processor
       if not image_processor:
         import image_processor
-      processor = image_processor.ImageProcessor()
+      processor = self.make_processor(image_processor.ImageProcessor)
+      processor.set_rgb_mapping(self.get_rgb_mapping(args))
       processor.process_image(img, args.palette, args.bg_color.mask,
                               args.bg_color.fill, args.platform, traversal,
                               args.is_sprite, args.is_locked_tiles,
                               args.lock_sprite_flips, args.allow_overflow)
     if args.bg_color.fill:
       processor.ppu_memory().override_bg_color(args.bg_color.fill)
-    self.create_views(processor.ppu_memory(), args, img)
-    if processor.err().has():
-      self.handle_errors(processor.err(), img, args)
+    return processor
+
+  def process_animation(self, img, args):
+    """Decompose the frames of an animation, sharing chr between them.
+
+    Frames are the image and each image in args.frame, all split by
+    args.frame_grid if it is set.
+    """
+    global animation_processor
+    if not animation_processor:
+      import animation_processor
+    global Image
+    if not Image:
+      from PIL import Image
+    images = [img]
+    for filename in args.frame or []:
+      try:
+        images.append(Image.open(filename))
+      except IOError:
+        raise errors.CommandLineArgError('Not an image file: "%s"' % filename)
+    frames = images
+    if args.frame_grid:
+      width, height = animation_processor.parse_frame_grid(args.frame_grid)
+      frames = []
+      for img in images:
+        frames += animation_processor.split_frames(img, width, height)
+    processor = animation_processor.AnimationProcessor()
+    processor.set_rgb_mapping(self.get_rgb_mapping(args))
+    processor.process_frames(frames, args.palette, args.bg_color.mask,
+                             args.bg_color.fill, getattr(args, 'jobs', None))
+    return processor
+
+  def get_rgb_mapping(self, args):
+    """Get the rgb mapping named by the args, or the default mapping."""
+    return rgb.get_mapping(getattr(args, 'rgb_mapping', None))
+
+  def make_processor(self, ctor):
+    """Create a processor, or reuse the previous one if incremental.
+
+    ctor: Class of processor, a kind of ImageProcessor.
+    """
+    if not self.incremental:
+      return ctor()
+    if type(self._processor) is not ctor:
+      self._processor = ctor()
+      self._processor.incremental = True
+    return self._processor
+
+  def watch(self, filename, args, watcher=None):
+    """Build the image, then build it again each time the file changes.
+
+    The processor stays in memory between builds, so only tiles that changed
+    are processed again. Only output files whose content changes are written.
+    Errors are shown, but don't stop watching. Runs until interrupted.
+
+    filename: Filename of the pixel art image.
+    args: Arguments from the command-line.
+    watcher: Optional FileModifyWatcher, created if not given.
+    """
+    if watcher is None:
+      global file_modify_watcher
+      if not file_modify_watcher:
+        import file_modify_watcher
+      watcher = file_modify_watcher.FileModifyWatcher()
+    args.write_if_changed = True
+    self.incremental = True
+    changed = queue.Queue()
+    self.rebuild(filename, args)
+    watcher.watch(filename, lambda e: changed.put(e.filename))
+    if args.palette and os.path.isfile(args.palette):
+      watcher.watch(args.palette, lambda e: changed.put(e.filename))
+    print('Watching "{0}", press Ctrl-C to stop'.format(filename))
+    try:
+      while True:
+        try:
+          names = [changed.get(True, WATCH_POLL_SECONDS)]
+        except queue.Empty:
+          continue
+        while not changed.empty():
+          names.append(changed.get())
+        if any(os.path.abspath(n) != os.path.abspath(filename) for n in names):
+          # The palette file changed, which cached results don't account for.
+          self._processor = None
+        self.rebuild(filename, args)
+    except KeyboardInterrupt:
+      pass
+    finally:
+      watcher.stop()
+      watcher.finish()
+
+  def rebuild(self, filename, args):
+    """Build the image from the file, showing how long it took.
+
+    Errors are shown in the same way as a single build. Returns whether the
+    build succeeded.
+    """
+    start = time.time()
+    # A new writer for each build, so that it only counts this build's files.
+    self.file_writer = None
+    global Image
+    if not Image:
+      from PIL import Image
+    try:
+      img = Image.open(filename)
+      img.load()
+    except IOError:
+      sys.stderr.write('Not an image file: "%s"\n' % filename)
       return False
-    self.create_output(processor.ppu_memory(), args, traversal, args.platform)
-    if args.show_stats:
-      self.show_stats(processor.ppu_memory(), processor, args)
-    return True
+    try:
+      success = self.run(img, args)
+    except Exception as e:
+      # Keep the processor out of a half-finished state.
+      self._processor = None
+      sys.stderr.write('{0} {1}\n'.format(type(e).__name__, e))
+      success = False
+    elapsed = (time.time() - start) * 1000
+    if success:
+      print('Built "{0}" in {1:.1f}ms'.format(filename, elapsed))
+    else:
+      print('Failed to build "{0}" in {1:.1f}ms'.format(filename, elapsed))
+    return success
 
   def get_traversal(self, strategy):
     if not strategy or strategy == 'h' or strategy == 'horizontal':
@@ -114,57 +293,140 @@ class Application(object):
       raise errors.UnknownStrategy(strategy)
 
   def read_memory(self, filename, kind, args):
+    global memory_importer
+    if not memory_importer:
+      import memory_importer
     importer = memory_importer.MemoryImporter()
-    mem = importer.read(filename, kind)
+    mem = importer.read(filename, kind, args.module)
     img = None
     if args.grid_view:
-      renderer = pixel_art_renderer.PixelArtRenderer()
+      global pixel_art_renderer
+      if not pixel_art_renderer:
+        import pixel_art_renderer
+      renderer = pixel_art_renderer.PixelArtRenderer(self.get_rgb_mapping(args))
       img = renderer.render(mem)
-    self.create_views(mem, args, img)
-    self.create_output(mem, args, self.get_traversal(None), None)
+    views = self.schedule_views(mem, args, img)
+    self.create_output_with_views(mem, args, self.get_traversal(None), None,
+                                  views)
+    self.show_unchanged(args)
+
+  def get_file_writer(self, args):
+    """Get the writer for output files, shared by all of the outputs."""
+    if self.file_writer is None:
+      self.file_writer = changed_file_writer.ChangedFileWriter(
+        args.write_if_changed)
+    return self.file_writer
 
   def create_views(self, mem, args, img, scale=None):
+    views = self.schedule_views(mem, args, img, scale)
+    self.finish_views(views, args)
+
+  def schedule_views(self, mem, args, img, scale=None):
+    """Start rendering the requested views in the background.
+
+    Returns a scheduler, pass it to finish_views to wait for the views.
+    """
+    views = view_scheduler.ViewScheduler(args.jobs)
+    # Create the shared writer now, before any threads need it.
+    self.get_file_writer(args)
+    for name in VIEW_NAMES:
+      outfile = getattr(args, name + '_view')
+      if outfile:
+        views.add(name, self.render_view, name, outfile, mem, args, img, scale)
+    views.start()
+    return views
+
+  def finish_views(self, views, args):
+    views.wait()
+    if args.verbose:
+      for name, seconds in sorted(views.timings):
+        print('View {0}: {1:.1f}ms'.format(name, seconds * 1000))
+
+  def render_view(self, name, outfile, mem, args, img, scale=None):
+    """Render a single view, with its own renderer so it can run on a thread.
+
+    Each view only reads the parts of ppu memory that it shows.
+    """
+    global view_renderer
+    if not view_renderer:
+      import view_renderer
     if args.use_legacy_views:
-      renderer = view_renderer.ViewRenderer(is_legacy=True)
+      renderer = view_renderer.ViewRenderer(
+        is_legacy=True, file_writer=self.get_file_writer(args),
+        rgb_mapping=self.get_rgb_mapping(args))
     else:
-      renderer = view_renderer.ViewRenderer(is_legacy=False, scale=scale)
-    if args.palette_view:
-      renderer.create_palette_view(args.palette_view, mem, args.is_sprite)
-    if args.colorization_view:
-      renderer.create_colorization_view(args.colorization_view, mem,
-                                        args.is_sprite)
-    if args.reuse_view:
+      renderer = view_renderer.ViewRenderer(
+        is_legacy=False, scale=scale, file_writer=self.get_file_writer(args),
+        rgb_mapping=self.get_rgb_mapping(args))
+    if name == 'palette':
+      return renderer.create_palette_view(outfile, mem, args.is_sprite)
+    elif name == 'colorization':
+      return renderer.create_colorization_view(outfile, mem, args.is_sprite)
+    elif name == 'reuse':
       nt_inverter = mem.build_nt_inverter()
-      renderer.create_reuse_view(args.reuse_view, mem, nt_inverter)
-    if args.nametable_view:
-      renderer.create_nametable_view(args.nametable_view, mem)
-    if args.chr_view:
-      renderer.create_chr_view(args.chr_view, mem)
-    if args.grid_view:
-      renderer.create_grid_view(args.grid_view, img)
-    if args.free_zone_view:
-      renderer.create_free_zone_view(args.free_zone_view, img, mem)
+      return renderer.create_reuse_view(outfile, mem, nt_inverter)
+    elif name == 'nametable':
+      return renderer.create_nametable_view(outfile, mem)
+    elif name == 'chr':
+      return renderer.create_chr_view(outfile, mem)
+    elif name == 'grid':
+      return renderer.create_grid_view(outfile, img)
+    elif name == 'free_zone':
+      return renderer.create_free_zone_view(outfile, img, mem)
+    raise errors.UnknownLogicFailure('unknown view %s' % name)
 
-  def create_output(self, mem, args, traversal, platform):
-    config = ppu_memory.PpuMemoryConfig(
+  def build_config(self, args, traversal, platform):
+    return ppu_memory.PpuMemoryConfig(
       chr_order=args.order, traversal=traversal, platform=platform,
       is_sprite=args.is_sprite,
       is_locked_tiles=args.is_locked_tiles,
       lock_sprite_flips=args.lock_sprite_flips,
       select_chr_plane=args.select_chr_plane)
+
+  def create_output_with_views(self, mem, args, traversal, platform, views):
+    """Create output while the views are still rendering."""
+    try:
+      self.create_output(mem, args, traversal, platform)
+    finally:
+      # Even if the output fails, so that the threads are stopped.
+      self.finish_views(views, args)
+
+  def create_output(self, mem, args, traversal, platform):
+    config = self.build_config(args, traversal, platform)
     if args.vertical_pixel_display:
-      mem.chr_set.vertical_pixel_display()
+      # Output a transposed copy of chr. The memory may be kept by the
+      # processor, and used again for the next build.
+      mem = copy.copy(mem)
+      mem.chr_set = mem.chr_set.transposed()
+    # Build each component once, sharing it between all of the outputs.
+    serializer = component_serializer.ComponentSerializer(mem)
+    file_writer = self.get_file_writer(args)
     if args.output == '/dev/null':
       # Ignore output.
       pass
     elif args.output and args.output.endswith('.o'):
       # Output as a valiant object file.
-      mem.save_valiant(args.output, config)
+      mem.save_valiant(args.output, config, serializer, file_writer)
+    elif args.output and args.output.endswith('.vla'):
+      # Output as a module in a valiant archive.
+      if not args.module:
+        raise errors.CommandLineArgError('archive output needs --module')
+      mem.save_valiant_module(args.output, args.module, config, serializer,
+                              file_writer)
     elif args.output and args.output.endswith('.png'):
       # Render an image.
-      renderer = pixel_art_renderer.PixelArtRenderer()
-      img = renderer.render(mem)
-      img.save(args.output)
+      global pixel_art_renderer
+      if not pixel_art_renderer:
+        import pixel_art_renderer
+      renderer = pixel_art_renderer.PixelArtRenderer(self.get_rgb_mapping(args))
+      if mem.screen_y * mem.screen_x > 1:
+        # Large maps are streamed, one row of screens at a time.
+        buff = io.BytesIO()
+        renderer.render_png(mem, buff)
+        file_writer.write(args.output, buff.getvalue())
+      else:
+        img = renderer.render(mem)
+        file_writer.write_image(args.output, img)
     else:
       # Output as multiple files using a template.
       out_tmpl = args.output or '%s.dat'
@@ -172,11 +434,14 @@ class Application(object):
         out_tmpl = os.path.join(out_tmpl, '%s.dat')
       if not '%s' in out_tmpl:
         raise errors.CommandLineArgError('output needs "%s" in its template')
-      mem.save_template(out_tmpl, config)
+      mem.save_template(out_tmpl, config, serializer, file_writer)
     if args.compile:
       # Compile a runnable ROM.
+      global rom_builder
+      if not rom_builder:
+        import rom_builder
       builder = rom_builder.RomBuilder()
-      builder.build(mem, args.compile)
+      builder.build(mem, args.compile, serializer, file_writer)
 
   def show_stats(self, mem, processor, args):
     print('Number of dot-profiles: {0}'.format(len(processor.dot_manifest())))
@@ -184,17 +449,37 @@ class Application(object):
     pal = mem.palette_spr if args.is_sprite else mem.palette_nt
     print('Palette: {0}'.format(pal))
 
+  def show_unchanged(self, args):
+    if not args.write_if_changed or self.file_writer is None:
+      return
+    total = self.file_writer.num_written + self.file_writer.num_unchanged
+    print('Unchanged files: {0} of {1}'.format(self.file_writer.num_unchanged,
+                                              total))
+
   def handle_errors(self, error_provider, img, args):
     es = error_provider.get()
     sys.stderr.write('Found {0} error{1}:\n'.format(
       len(es), 's'[len(es) == 1:]))
-    for e in es:
-      sys.stderr.write('{0} {1}\n'.format(type(e).__name__, e))
+    for e in es[:MAX_LISTED_ERRORS]:
+      frame = getattr(e, 'frame', None)
+      if frame is not None:
+        sys.stderr.write('{0} {1} in frame {2}\n'.format(
+          type(e).__name__, e, frame))
+      else:
+        sys.stderr.write('{0} {1}\n'.format(type(e).__name__, e))
+    if len(es) > MAX_LISTED_ERRORS:
+      sys.stderr.write('...and {0} more. All errors by type:\n'.format(
+        len(es) - MAX_LISTED_ERRORS))
+      for name, count in error_provider.counts():
+        sys.stderr.write('  {0} x{1}\n'.format(name, count))
     if args.error_outfile:
       sys.stderr.write('Errors displayed in "{0}"\n'.format(args.error_outfile))
-      errors_with_dups = error_provider.get(include_dups=True)
-      renderer = view_renderer.ViewRenderer()
-      renderer.create_error_view(args.error_outfile, img, errors_with_dups)
+      global view_renderer
+      if not view_renderer:
+        import view_renderer
+      renderer = view_renderer.ViewRenderer(
+        file_writer=self.get_file_writer(args))
+      renderer.create_error_view(args.error_outfile, img, error_provider)
     else:
       sys.stderr.write('To see errors visually, use the ' +
                        '"-e <error_image.png>" command-line option.\n')
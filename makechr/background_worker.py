@@ -0,0 +1,118 @@
+import errors
+import threading
+
+
+class Job(object):
+  """A unit of work handed to the background worker.
+
+  Work checks the job regularly, and stops by raising errors.Cancelled once a
+  newer job has replaced it.
+  """
+
+  def __init__(self, worker):
+    self._worker = worker
+    self._cancelled = threading.Event()
+    self.progress = None
+
+  def cancel(self):
+    self._cancelled.set()
+
+  def is_cancelled(self):
+    return self._cancelled.is_set()
+
+  def check(self):
+    """Raise errors.Cancelled if the job has been cancelled."""
+    if self._cancelled.is_set():
+      raise errors.Cancelled()
+
+  def report(self, msg):
+    """Report progress, delivered on the main thread unless cancelled."""
+    if self.progress and not self.is_cancelled():
+      self._worker.deliver(self, self.progress, msg)
+
+
+class BackgroundWorker(object):
+  """Runs jobs one at a time on a background thread, newest first.
+
+  Submitting a job cancels the job in flight, and replaces any job still
+  waiting to run, so that a burst of requests only runs the latest one.
+  Results are marshalled to the main thread by call_after, such as
+  wx.CallAfter, and are dropped if a newer job was submitted meanwhile.
+
+  call_after: Function to call a function on the main thread, with args.
+  """
+
+  def __init__(self, call_after):
+    self.call_after = call_after
+    self._cond = threading.Condition()
+    self._pending = None
+    self._current = None
+    self._thread = None
+    self._is_stopped = False
+
+  def submit(self, func, on_done, on_error=None, on_progress=None):
+    """Run func(job) in the background, cancelling the job in flight.
+
+    on_done: Called with the result of func, on the main thread.
+    on_error: Called with any exception from func, other than cancellation.
+    on_progress: Called with each message the job reports.
+    Returns the job.
+    """
+    with self._cond:
+      if self._current:
+        self._current.cancel()
+      job = Job(self)
+      job.progress = on_progress
+      self._current = job
+      self._pending = (job, func, on_done, on_error)
+      if self._thread is None:
+        self._thread = threading.Thread(target=self._loop)
+        self._thread.daemon = True
+        self._thread.start()
+      self._cond.notify()
+    return job
+
+  def cancel(self):
+    """Cancel the job in flight, without starting another."""
+    with self._cond:
+      if self._current:
+        self._current.cancel()
+      self._current = None
+      self._pending = None
+
+  def stop(self):
+    """Cancel all work and let the background thread end."""
+    with self._cond:
+      self._is_stopped = True
+    self.cancel()
+    with self._cond:
+      self._cond.notify()
+
+  def deliver(self, job, func, *args):
+    """Call func on the main thread, unless the job is stale by then."""
+    self.call_after(self._deliver, job, func, args)
+
+  def _deliver(self, job, func, args):
+    if job is not self._current or job.is_cancelled():
+      return
+    func(*args)
+
+  def _loop(self):
+    while True:
+      with self._cond:
+        while self._pending is None and not self._is_stopped:
+          self._cond.wait()
+        if self._is_stopped:
+          return
+        job, func, on_done, on_error = self._pending
+        self._pending = None
+      try:
+        result = func(job)
+      except errors.Cancelled:
+        continue
+      except Exception as e:
+        if on_error and not job.is_cancelled():
+          self.deliver(job, on_error, e)
+        continue
+      if not job.is_cancelled():
+        self.deliver(job, on_done, result)
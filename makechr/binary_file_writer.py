@@ -1,49 +1,25 @@
-from constants import *
-
-
-ZERO_BYTE = bytearray([0])[0]
+import changed_file_writer
 
 
 class BinaryFileWriter(object):
-  def __init__(self, tmpl):
-    self._name = None
-    self._fout = None
+  """Writes each component of ppu memory to its own binary file.
+
+  The filename for each component is made by filling in a template.
+  """
+  def __init__(self, tmpl, file_writer=None):
     self._tmpl = tmpl
-    self._order = None
-    self._null_value = ZERO_BYTE
-    self._component_req = {}
+    self._file_writer = file_writer or changed_file_writer.ChangedFileWriter()
 
   def _fill_template(self, replace):
     return self._tmpl.replace('%s', replace)
 
-  def get_writable(self, name, unused_is_condensable):
-    if self._fout:
-      self.close()
-    self._name = name
+  def get_filename(self, name):
     filename = self._fill_template(name)
     if name == 'sprite_picdata':
       filename = filename.replace('.dat', '.json')
-    self._fout = open(filename, 'wb')
-    return self._fout
-
-  def configure(self, null_value=None, size=None, order=None, align=None,
-                extract=None):
-    self._null_value = null_value or bytearray([0])[0]
-    _ = size
-    _ = order
-    _ = align
-    self._component_req[self._name] = extract
-    self._order = order
-    if self._order == 1:
-      num = extract - size
-      self._fout.write(bytearray([self._null_value]) * num)
+    return filename
 
-  def close(self):
-    if self._fout is None:
-      return
-    extract = self._component_req.get(self._name)
-    if extract:
-      num = extract - self._fout.tell()
-      self._fout.write(bytearray([self._null_value]) * num)
-    self._fout.close()
-    self._fout = None
+  def write_component(self, component):
+    """Write the component, as extracted into memory, in a single call."""
+    self._file_writer.write(self.get_filename(component.name),
+                            component.extracted())
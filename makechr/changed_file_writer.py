@@ -0,0 +1,143 @@
+import binascii
+import errno
+import io
+import os
+import stat
+import threading
+
+
+IMAGE_FORMATS = {'.png': 'PNG', '.bmp': 'BMP', '.gif': 'GIF',
+                 '.jpg': 'JPEG', '.jpeg': 'JPEG'}
+
+
+class ChangedFileWriter(object):
+  """Writes output files, optionally only when their content has changed.
+
+  When only_if_changed is set, content is built in memory and compared to the
+  existing file, first by size and then by bytes. Unchanged files are left
+  alone, keeping their modification time so that build tools don't rebuild
+  things that depend on them. Changed files are replaced atomically, by
+  writing to a temporary file in the same directory and renaming it.
+  """
+
+  def __init__(self, only_if_changed=False):
+    self.only_if_changed = only_if_changed
+    self.num_written = 0
+    self.num_unchanged = 0
+    # Views may be written from many threads at once.
+    self._lock = threading.Lock()
+
+  def write(self, filename, content):
+    """Write the content to the file. Returns whether the file was written.
+
+    filename: Name of the file to write.
+    content: Bytes to write to the file.
+    """
+    if not self.only_if_changed:
+      fout = open(filename, 'wb')
+      fout.write(content)
+      fout.close()
+      self._count(True)
+      return True
+    if self._is_same(filename, content):
+      self._count(False)
+      return False
+    replace_file(filename, content)
+    self._count(True)
+    return True
+
+  def update(self, filename, is_same, update):
+    """Update part of a file in place, such as a module in an archive.
+
+    Returns whether the file was written.
+
+    filename: Name of the file to update.
+    is_same: Whether that part of the file already has the new content.
+    update: Function that writes the new content.
+    """
+    if self.only_if_changed and is_same:
+      self._count(False)
+      return False
+    update()
+    self._count(True)
+    return True
+
+  def write_image(self, filename, img):
+    """Write the image to the file, in the format given by its extension.
+
+    filename: Name of the file to write.
+    img: PIL image to save.
+    """
+    if not self.only_if_changed:
+      img.save(filename)
+      self._count(True)
+      return True
+    buff = io.BytesIO()
+    ext = os.path.splitext(filename)[1].lower()
+    img.save(buff, format=IMAGE_FORMATS.get(ext, 'PNG'))
+    return self.write(filename, buff.getvalue())
+
+  def _count(self, is_written):
+    with self._lock:
+      if is_written:
+        self.num_written += 1
+      else:
+        self.num_unchanged += 1
+
+  def _is_same(self, filename, content):
+    try:
+      if os.path.getsize(filename) != len(content):
+        return False
+      fp = open(filename, 'rb')
+      existing = fp.read()
+      fp.close()
+    except (IOError, OSError):
+      return False
+    return existing == content
+
+
+def replace_file(filename, content):
+  """Replace the file atomically.
+
+  The content is written to a temporary file in the same directory, which is
+  then renamed to the file.
+  """
+  dirname = os.path.dirname(os.path.abspath(filename))
+  fd, tmpname = _create_temp(dirname)
+  try:
+    fout = os.fdopen(fd, 'wb')
+    fout.write(content)
+    fout.close()
+    try:
+      # Keep the permissions of the file being replaced.
+      os.chmod(tmpname, stat.S_IMODE(os.stat(filename).st_mode))
+    except OSError:
+      pass
+    if hasattr(os, 'replace'):
+      os.replace(tmpname, filename)
+    else:
+      # Python 2 has no os.replace, rename is atomic on posix.
+      if os.name == 'nt' and os.path.exists(filename):
+        os.remove(filename)
+      os.rename(tmpname, filename)
+  except:
+    if os.path.exists(tmpname):
+      os.remove(tmpname)
+    raise
+
+
+def _create_temp(dirname):
+  """Create a temporary file in the directory, returning its fd and name.
+
+  Unlike tempfile.mkstemp, the file gets the usual permissions for new files,
+  by letting the umask apply to it.
+  """
+  flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+  while True:
+    suffix = binascii.hexlify(os.urandom(6)).decode('ascii')
+    tmpname = os.path.join(dirname, '.makechr-' + suffix)
+    try:
+      return os.open(tmpname, flags, 0o666), tmpname
+    except OSError as e:
+      if e.errno != errno.EEXIST:
+        raise
@@ -1,3 +1,4 @@
+import copy
 import errors
 import sys
 
@@ -68,6 +69,14 @@ class ChrTile(object):
     self.low = transpose(self.low)
     self.hi = transpose(self.hi)
 
+  def transposed(self):
+    """Copy of the tile, with its pixel order transposed."""
+    make = ChrTile()
+    make.low = self.low
+    make.hi = self.hi
+    make.transpose_pixel_order()
+    return make
+
   def _assign_bit_low_plane(self, bit, index, offset):
     self.low[index] |= (bit << (7 - offset))
 
@@ -189,6 +198,12 @@ class ChrPage(object):
     for tile in self.tiles:
       tile.transpose_pixel_order()
 
+  def transposed(self):
+    """Copy of the page for vertical pixel displays, leaving this one as is."""
+    make = copy.copy(self)
+    make.tiles = [tile.transposed() for tile in self.tiles]
+    return make
+
 
 class ChrBank(ChrPage):
   """Two pages of chr tiles, 0x2000 bytes, enough for 2*256 tiles."""
@@ -284,6 +299,11 @@ class SparseChrPage(ChrPage):
   def _enum_tiles(self):
     return self.tiles.items()
 
+  def transposed(self):
+    make = copy.copy(self)
+    make.tiles = dict([(k, tile.transposed()) for k, tile in self.tiles.items()])
+    return make
+
 
 class VertTilePair(object):
   """A pair of 8x8 tiles, vertically oriented."""
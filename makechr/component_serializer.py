@@ -0,0 +1,212 @@
+import itertools
+import json
+import sys
+from constants import *
+
+
+if sys.version_info < (3,0):
+  range = xrange
+
+
+class Component(object):
+  """A single serialized component of ppu memory.
+
+  Holds the bytes of the component along with the settings that describe how
+  it is laid out in memory. The bytes are built once by ComponentSerializer
+  and shared by every output sink, which each write them in one bulk call.
+  """
+
+  def __init__(self, name, data, is_condensable=False, null_value=None,
+               size=None, order=None, align=None, extract=None):
+    self.name = name
+    self.data = data
+    self.is_condensable = is_condensable
+    self.null_value = null_value
+    self.size = size
+    self.order = order
+    self.align = align
+    self.extract = extract
+
+  def extracted(self):
+    """Get the bytes as they appear when extracted into memory.
+
+    If the order is 1, the data is preceded by null values that take the place
+    of the other half of memory. If there is an extract size, the data is then
+    padded with null values up to that size. Without either, the data is
+    returned as is, without making a copy.
+    """
+    if self.order != 1 and not self.extract:
+      return self.data
+    null = bytearray([self.null_value or 0])
+    make = bytearray()
+    if self.order == 1:
+      make += null * (self.extract - self.size)
+    make += self.data
+    if self.extract:
+      make += null * (self.extract - len(make))
+    return bytes(make)
+
+
+class ComponentSerializer(object):
+  """Serializes ppu memory into components.
+
+  Each component is built exactly once, no matter how many output sinks
+  consume it. Binary files, valiant object files, and roms all get their
+  bytes from here.
+  """
+
+  def __init__(self, mem):
+    self._mem = mem
+    self._cache = {}
+
+  def components(self, config, enabled):
+    """Get the list of components to output, in the order they are written.
+
+    config: Configuration for how memory is represented.
+    enabled: Set of enabled component names, from the ppu memory.
+    """
+    mem = self._mem
+    bg_color = mem.get_bg_color()
+    make = []
+    if 'nametable' in enabled:
+      for i, gfx in enumerate(mem.gfx):
+        name = 'nametable' if i == 0 else ('nametable%d' % i)
+        make.append(Component(name, self.nametable(i)))
+    if 'chr' in enabled:
+      make.append(Component('chr', self.chr(config.select_chr_plane),
+                            is_condensable=True, null_value=0, size=0x1000,
+                            order=config.chr_order, align=0x10,
+                            extract=0x2000))
+    if 'palette' in enabled:
+      make.append(Component('palette', self.palette(), is_condensable=True,
+                            null_value=bg_color, size=0x10,
+                            order=config.palette_order, extract=0x20))
+    if 'attribute' in enabled:
+      for i, gfx in enumerate(mem.gfx):
+        name = 'attribute' if i == 0 else ('attribute%d' % i)
+        make.append(Component(name, self.attribute(i)))
+    # TODO: Rename this component to `sprites`
+    # Represents either `spritelist` or `sprite_picdata`
+    if 'spritelist' in enabled:
+      if mem.sprite_picdata:
+        make.append(Component('sprite_picdata', self.sprite_picdata()))
+      else:
+        make.append(Component('spritelist', self.spritelist()))
+    return make
+
+  def memory_image(self, role):
+    """Get the bytes for the role as they sit in the PPU's memory.
+
+    Unlike components, these always have a fixed size and position: the
+    palette is 0x20 bytes with the nametable palette first, and chr is 0x2000
+    bytes starting at 0x0000.
+
+    role: One of "nametable", "attribute", "palette", or "chr".
+    """
+    if role == 'nametable':
+      return self.nametable(0)
+    elif role == 'attribute':
+      return self.attribute(0)
+    elif role == 'palette':
+      return self._cached(('memory_image', role), self._build_palette_image)
+    elif role == 'chr':
+      return self._cached(('memory_image', role), self._build_chr_image)
+    raise RuntimeError('Unknown role %s' % role)
+
+  def nametable(self, i):
+    return self._cached(('nametable', i), lambda: self._build_nametable(i))
+
+  def attribute(self, i):
+    return self._cached(('attribute', i), lambda: self._build_attribute(i))
+
+  def chr(self, select_chr_plane):
+    return self._cached(('chr', select_chr_plane),
+                        lambda: self._build_chr(select_chr_plane))
+
+  def palette(self):
+    return self._cached(('palette',), self._build_palette)
+
+  def spritelist(self):
+    return self._cached(('spritelist',), self._build_spritelist)
+
+  def sprite_picdata(self):
+    return self._cached(('sprite_picdata',), self._build_sprite_picdata)
+
+  def _cached(self, key, builder):
+    if key not in self._cache:
+      self._cache[key] = builder()
+    return self._cache[key]
+
+  def _build_nametable(self, i):
+    nametable = self._mem.gfx[i].nametable
+    rows = nametable[:NUM_BLOCKS_Y * 2]
+    return bytes(bytearray(itertools.chain.from_iterable(rows)))
+
+  def _build_attribute(self, i):
+    colorization = self._mem.gfx[i].colorization
+    make = bytearray()
+    for attr_y in range(NUM_BLOCKS_Y // 2 + 1):
+      y = attr_y * 4
+      row = colorization[y]
+      # The last row of attributes only covers the upper half of its blocks.
+      below = colorization[y + 2] if attr_y * 2 + 1 < NUM_BLOCKS_Y else None
+      for x in range(0, NUM_BLOCKS_X * 2, 4):
+        attr = row[x] + (row[x + 2] << 2)
+        if below is not None:
+          attr += (below[x] << 4) + (below[x + 2] << 6)
+        make.append(attr)
+    return bytes(make)
+
+  def _build_chr(self, select_chr_plane):
+    chr_set = self._mem.chr_set
+    if select_chr_plane in ['0','1']:
+      return bytes(chr_set.to_bytes_select_plane(int(select_chr_plane)))
+    elif select_chr_plane is None:
+      return bytes(chr_set.to_bytes())
+    raise RuntimeError('Unknown option for select-chr-plane: %s' %
+                       (select_chr_plane,))
+
+  def _build_chr_image(self):
+    component = Component('chr', self.chr(None), null_value=0, size=0x2000,
+                          order=0, extract=0x2000)
+    return component.extracted()
+
+  def _build_single_palette(self, pal, bg_color):
+    make = bytearray()
+    for i in range(4):
+      palette_option = pal.get(i) or []
+      make += bytearray(palette_option[:4])
+      make += bytearray([bg_color]) * (4 - len(palette_option))
+    return bytes(make)
+
+  def _build_palette(self):
+    mem = self._mem
+    bg_color = mem.get_bg_color()
+    make = b''
+    if mem.palette_nt:
+      make += self._build_single_palette(mem.palette_nt, bg_color)
+    if mem.palette_spr:
+      make += self._build_single_palette(mem.palette_spr, bg_color)
+    return make
+
+  def _build_palette_image(self):
+    mem = self._mem
+    bg_color = mem.get_bg_color()
+    empty = bytes(bytearray([bg_color]) * 0x10)
+    make = b''
+    for pal in [mem.palette_nt, mem.palette_spr]:
+      if pal:
+        make += self._build_single_palette(pal, bg_color)
+      else:
+        make += empty
+    return make
+
+  def _build_spritelist(self):
+    make = bytearray(itertools.chain.from_iterable(self._mem.spritelist))
+    make.append(0xff)
+    return bytes(make)
+
+  def _build_sprite_picdata(self):
+    text = json.dumps(self._mem.sprite_picdata, indent=2, sort_keys=True,
+                      separators=(',', ': '))
+    return text.encode('utf-8')
@@ -1,9 +1,10 @@
 import chr_data
+from constants import NULL
 import errors
 import image_processor
 import outline_tracer
+import pixel_mask
 import rectilinear_coverage
-import rgb
 from PIL import Image, ImageDraw
 import sys
 
@@ -12,21 +13,71 @@ if sys.version_info < (3,0):
   range = xrange
 
 
+# For each 8-bit row mask, bit x for column x, the columns that are set.
+ROW_MASK_COLUMNS = [[x for x in range(8) if n & (1 << x)]
+                    for n in range(0x100)]
+
+
+# From a row of 8 pixels, one byte per pixel that is either 0 or 1, to the
+# byte of a chr plane for that row.
+PACK_ROW = dict((bytes(bytearray([(n >> (7 - x)) & 1 for x in range(8)])), n)
+                for n in range(0x100))
+
+
+def row_mask_from_offset(dx):
+  """Row mask of the columns covered by a tile that is dx pixels right."""
+  if dx >= 0:
+    return (0xff << dx) & 0xff
+  return 0xff >> -dx
+
+
 class DecomposeSpritesProcessor(image_processor.ImageProcessor):
   """Decompose sprites in an image, to build PPU memory and json."""
 
+  def __init__(self):
+    image_processor.ImageProcessor.__init__(self)
+    # From a palette option to lookup tables for each chr plane.
+    self._plane_xlat = {}
+
   def process_image(self, img, palette_text, bg_mask, bg_fill, debug_flags):
-    self.img = img
     self.palette_text = palette_text
+    if not self.prepare_image(img, bg_mask, bg_fill):
+      return
+    self.traverse(debug_flags)
+
+  def prepare_image(self, img, bg_mask, bg_fill):
+    """Load the image, and find which of its pixels are the fill color.
+
+    Returns False if there were errors.
+    """
+    self.img = img
     self.bg_mask = bg_mask
     self.bg_fill = bg_fill
     self.pixels = self.img.load()
     self.width, self.height = self.img.size
     if not self.check_corners_for_fill():
-      return
-    self.traverse(debug_flags)
+      return False
+    try:
+      self.colors = self.nes_color_buffer(self.img)
+    except errors.CouldntConvertRGB as e:
+      self._err.add(e)
+      return False
+    fill_xlat = bytearray([1] * 0x100)
+    fill_xlat[self.bg_fill] = 0
+    self.clear_mask = pixel_mask.PixelMask(
+      self.height, self.width, self.colors.translate(bytes(fill_xlat)))
+    return True
 
   def traverse(self, debug_flags):
+    regions, all_tiles, picdata = self.find_pictures(debug_flags)
+    self.write_data(regions, all_tiles, picdata)
+
+  def find_pictures(self, debug_flags):
+    """Find the pictures in the image, and the tiles that compose them.
+
+    Returns the regions, all of the tiles, and for each region a list of
+    PicElems that refer to those tiles.
+    """
     # General algorithm:
     # 1) Image -> []Region
     #      find the list of regions in the image, by tracing outlines
@@ -55,17 +106,15 @@ class DecomposeSpritesProcessor(image_processor.ImageProcessor):
     # Create the tiles, for each region
     # Coverage -> []Tile
     all_tiles, picdata = self.regions_to_tiles(regions)
-
-    self.write_data(regions, all_tiles, picdata)
+    return regions, all_tiles, picdata
 
   def find_regions_from_outlines(self):
     ot = outline_tracer.OutlineTracer(self.height, self.width,
-                                      self.pixel_is_clear)
+                                      mask=self.clear_mask)
     return ot.find_regions()
 
   def pixel_is_clear(self, y, x):
-    nc = self.get_nes_color(y, x)
-    return nc == self.bg_fill
+    return self.clear_mask.is_clear(y, x)
 
   def calc_coverages_from_regions(self, regions):
     rc = rectilinear_coverage.RectilinearCoverage()
@@ -143,8 +192,7 @@ class DecomposeSpritesProcessor(image_processor.ImageProcessor):
         while y < r.bot:
           x = r.left
           while x < r.right:
-            tile = self.img.crop((x, y, x + 8, y + 8))
-            all_tiles.append(tile)
+            all_tiles.append(self.tile_colors(y, x))
             result.append(PicElem(len(all_tiles) - 1, y - b_y, x - b_x))
             # Increment X
             x += 8
@@ -157,33 +205,17 @@ class DecomposeSpritesProcessor(image_processor.ImageProcessor):
       picdata.append(result)
     return all_tiles, picdata
 
+  def tile_colors(self, y, x):
+    """Nes colors of the 8x8 tile at pixel y,x, as 64 bytes, row by row."""
+    w = self.width
+    return b''.join([self.colors[k:k + 8]
+                     for k in range((y * w) + x, (y + 8) * w + x, w)])
+
   def write_data(self, regions, all_tiles, picdata):
-    self.image_y = self.image_x = 8
-    self.mask_rgb_color = rgb.nc_to_rgb(self.bg_mask)
-    # Create color_needs for each tile's non-overlapping pixels
-    for i, g in enumerate(regions):
-      b_y = g.min_y
-      b_x = g.min_x
-      picture = picdata[i]
-      for j, elem in enumerate(picture):
-        dots = self.calculate_overlap(elem, j, picture)
-        tile = all_tiles[elem.tile_idx]
-        self.pixels = tile.copy().load()
-        self.apply_dots_overlap(dots, self.pixels)
-        try:
-          color_needs, dot_profile = self.process_tile(0, 0)
-        except errors.CouldntConvertRGB as e:
-          self._err.add(e)
-          continue
-        cid = self._color_manifest.id(color_needs)
-        elem.cid = cid
+    self.collect_color_needs(regions, all_tiles, picdata)
     self._needs_provider = self._color_manifest
     # Calculate the palette
-    pal = None
-    if self.palette_text:
-      pal = self.parse_palette(self.palette_text, self.bg_mask)
-    if not pal:
-      pal = self.make_palette(self.bg_mask, True)
+    pal = self.choose_palette()
     if self._err.has():
       return
     # Set palette
@@ -191,55 +223,118 @@ class DecomposeSpritesProcessor(image_processor.ImageProcessor):
     # Create chr and picdata
     result = []
     chrdata_cache = {}
-    for i, _ in enumerate(regions):
-      accum = []
-      for _, elem in enumerate(picdata[i]):
-        tile_pixels = all_tiles[elem.tile_idx]
-        color_needs = self._color_manifest.at(elem.cid)
-        try:
-          (pid, popt) = pal.select(color_needs)
-        except IndexError:
-          self._err.add(errors.PaletteNoChoiceError(elem.y, elem.x,
-                                                    color_needs))
-          continue
-        tile = self.build_tile_from_pixels_ignoring_unknown(tile_pixels, popt)
-        key = str(tile)
-        if key in chrdata_cache:
-          chr_num, flips = chrdata_cache[key]
-        else:
-          chr_num = self._ppu_memory.chr_set.add(tile)
-          flips = 0
-          self.assign_tile_flips(tile, [chr_num], chrdata_cache)
-        accum.append({'y': elem.y, 'x': elem.x, 'attr': flips | pid,
-                      'tile': chr_num})
-      g = regions[i]
-      result.append({'top': g.min_y, 'left': g.min_x,
-                     'bottom': g.max_y, 'right': g.max_x,
-                     'elems': accum})
+    for i, g in enumerate(regions):
+      bounds = (g.min_y, g.min_x, g.max_y, g.max_x)
+      result.append(self.build_picture(bounds, picdata[i], all_tiles, pal,
+                                       chrdata_cache))
     self._ppu_memory.sprite_picdata = result
 
-  def calculate_overlap(self, elem, j, all_pic):
-    dots = [0] * 64
-    for k, other in enumerate(all_pic):
-      if j == k:
-        continue
-      y_offset = other.y - elem.y
-      x_offset = other.x - elem.x
-      if y_offset < -7 or y_offset > 7 or x_offset < -7 or x_offset > 7:
+  def collect_color_needs(self, regions, all_tiles, picdata):
+    """Find the color needs of each element, ignoring overlapped pixels."""
+    # Overlapped pixels become the mask color, as if it was in the image.
+    self.mask_nc = self.rgb_to_nescolor(
+      self.rgb_mapping.nc_to_rgb(self.bg_mask))
+    # Create color_needs for each tile's non-overlapping pixels
+    for i, g in enumerate(regions):
+      picture = picdata[i]
+      overlaps = self.calculate_overlaps(picture)
+      for j, elem in enumerate(picture):
+        tile = self.apply_dots_overlap(overlaps[j], all_tiles[elem.tile_idx])
+        color_needs = self.tile_color_needs(tile)
+        elem.color_needs = color_needs
+        elem.cid = self._color_manifest.id(color_needs)
+
+  def choose_palette(self):
+    """Parse the palette if one was given, otherwise make it from color needs."""
+    pal = None
+    if self.palette_text:
+      pal = self.parse_palette(self.palette_text, self.bg_mask)
+    if not pal:
+      pal = self.make_palette(self.bg_mask, True)
+    return pal
+
+  def build_picture(self, bounds, picture, all_tiles, pal, chrdata_cache):
+    """Add chr for each element of the picture, and return its picdata.
+
+    Tiles already in chrdata_cache, including flipped versions, are reused.
+
+    bounds: Tuple of the picture's top, left, bottom, and right.
+    picture: List of PicElems, with their color needs collected.
+    all_tiles: Tile images, that PicElems refer to.
+    pal: Sprite palette.
+    chrdata_cache: Dict from tile key to its chr_num and flips.
+    """
+    accum = []
+    for elem in picture:
+      tile_colors = all_tiles[elem.tile_idx]
+      color_needs = self._color_manifest.at(elem.cid)
+      try:
+        (pid, popt) = pal.select(color_needs)
+      except IndexError:
+        self._err.add(errors.PaletteNoChoiceError(elem.y, elem.x,
+                                                  color_needs))
         continue
-      for a in range(8):
-        for b in range(8):
-          y = a + y_offset
-          x = b + x_offset
-          if y in range(0, 8) and x in range(0, 8):
-            dots[y*8 + x] += 1
-    return dots
-
-  def apply_dots_overlap(self, dots, pixels):
-    for y in range(8):
-      for x in range(8):
-        if dots[y*8 + x] > 0:
-          pixels[x,y] = self.mask_rgb_color
+      tile = self.build_tile_from_colors(tile_colors, popt)
+      key = str(tile)
+      if key in chrdata_cache:
+        chr_num, flips = chrdata_cache[key]
+      else:
+        chr_num = self._ppu_memory.chr_set.add(tile)
+        flips = 0
+        self.assign_tile_flips(tile, [chr_num], chrdata_cache)
+      accum.append({'y': elem.y, 'x': elem.x, 'attr': flips | pid,
+                    'tile': chr_num})
+    top, left, bottom, right = bounds
+    return {'top': top, 'left': left, 'bottom': bottom, 'right': right,
+            'elems': accum}
+
+  def calculate_overlaps(self, picture):
+    """For each element of the picture, find pixels covered by other elements.
+
+    Elements are bucketed into a grid of 8x8 cells, so each element is only
+    compared against elements in neighboring cells. Returns a list, for each
+    element, of 8 row masks.
+    """
+    cells = {}
+    for k, elem in enumerate(picture):
+      cells.setdefault((elem.y >> 3, elem.x >> 3), []).append(k)
+    overlaps = []
+    for j, elem in enumerate(picture):
+      rows = [0] * 8
+      cell_y = elem.y >> 3
+      cell_x = elem.x >> 3
+      for near_y in range(cell_y - 1, cell_y + 2):
+        for near_x in range(cell_x - 1, cell_x + 2):
+          for k in cells.get((near_y, near_x), []):
+            if j == k:
+              continue
+            other = picture[k]
+            y_offset = other.y - elem.y
+            x_offset = other.x - elem.x
+            if (y_offset < -7 or y_offset > 7 or x_offset < -7 or
+                x_offset > 7):
+              continue
+            mask = row_mask_from_offset(x_offset)
+            for y in range(max(0, y_offset), min(8, y_offset + 8)):
+              rows[y] |= mask
+      overlaps.append(rows)
+    return overlaps
+
+  def apply_dots_overlap(self, rows, tile):
+    """Return the tile with pixels set in the row masks as the mask color."""
+    if not any(rows):
+      return tile
+    tile = bytearray(tile)
+    for y, n in enumerate(rows):
+      for x in ROW_MASK_COLUMNS[n]:
+        tile[y * 8 + x] = self.mask_nc
+    return bytes(tile)
+
+  def tile_color_needs(self, tile):
+    """Color needs of the tile, the first 4 colors in the order they appear."""
+    colors = bytearray(tile)
+    found = sorted(set(colors), key=colors.index)[:4]
+    return bytearray(found + [NULL] * (4 - len(found)))
 
   def tile_palette_fault(self, tile_y, tile_x):
     # TODO: Record failed colors, use to reconstruct overlapping colors.
@@ -248,25 +343,27 @@ class DecomposeSpritesProcessor(image_processor.ImageProcessor):
   def add_error(self, e):
     self._err.add(e)
 
-  def build_tile_from_pixels_ignoring_unknown(self, tile_pixels, popt):
-    pixels = tile_pixels.load()
+  def build_tile_from_colors(self, tile_colors, popt):
+    """Build chr from the tile's nes colors, using the palette option.
+
+    Colors not in the palette option become 0. Each plane is translated from
+    the colors using a lookup table, then packed a row at a time.
+    """
+    key = tuple(popt)
+    if key not in self._plane_xlat:
+      low = bytearray(0x100)
+      hi = bytearray(0x100)
+      # Assign in reverse, so the first index of a repeated color is kept.
+      for i in reversed(range(len(popt))):
+        low[popt[i]] = i & 1
+        hi[popt[i]] = i >> 1
+      self._plane_xlat[key] = (bytes(low), bytes(hi))
+    low, hi = self._plane_xlat[key]
+    low = tile_colors.translate(low)
+    hi = tile_colors.translate(hi)
     tile = chr_data.ChrTile()
-    for row in range(8):
-      for col in range(8):
-        i = row * 8 + col
-        p = pixels[col, row]
-        color_val = (p[0] << 16) + (p[1] << 8) + p[2]
-        if color_val in rgb.RGB_XLAT:
-          nc = rgb.RGB_XLAT[color_val]
-        else:
-          nc = self.components_to_nescolor(p[0], p[1], p[2])
-          if nc == -1:
-            raise errors.CouldntConvertRGB(p, tile_y, tile_x, i, j)
-        try:
-          val = popt.index(nc)
-        except ValueError:
-          val = 0
-        tile.put_pixel(row, col, val)
+    tile.low = [PACK_ROW[low[k:k + 8]] for k in range(0, 64, 8)]
+    tile.hi = [PACK_ROW[hi[k:k + 8]] for k in range(0, 64, 8)]
     return tile
 
   def check_corners_for_fill(self):
@@ -292,4 +389,5 @@ class PicElem(object):
     self.tile_idx = tile_idx
     self.y = y
     self.x = x
+    self.color_needs = None
     self.cid = None
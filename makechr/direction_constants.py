@@ -4,6 +4,9 @@ DIR_RIGHT = 'right'
 DIR_DOWN = 'down'
 
 
+ALL_DIRS = [DIR_UP, DIR_RIGHT, DIR_DOWN, DIR_LEFT]
+
+
 def rotate_dir_cw(dir):
   if dir == DIR_UP:
     return DIR_RIGHT
@@ -19,7 +19,7 @@ class EightBySixteenProcessor(image_processor.ImageProcessor):
     """Process the block by treating it as two vertical pairs."""
     y = block_y * 2
     x = block_x * 2
-    process_tile_func = self.process_tile
+    process_tile_func = self.get_process_tile_func()
     combine_color_needs_func = self.combine_color_needs
     if bg_mask:
       process_tile_func = (
@@ -164,3 +164,4 @@ class EightBySixteenProcessor(image_processor.ImageProcessor):
     self._dot_manifest = other_processor._dot_manifest
     self._ppu_memory = other_processor._ppu_memory
     self.tile_ctor = other_processor.tile_ctor
+    self.rgb_mapping = other_processor.rgb_mapping
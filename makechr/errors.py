@@ -1,3 +1,6 @@
+import collections
+
+
 class CommandLineArgError(Exception):
   def __init__(self, msg):
     self.msg = msg
@@ -164,6 +167,14 @@ class FileFormatError(Exception):
       return 'FileFormatError'
 
 
+class ValiantFormatError(Exception):
+  def __init__(self, msg):
+    self.msg = msg
+
+  def __str__(self):
+    return 'ValiantFormatError: %s' % self.msg
+
+
 class UnknownStrategy(Exception):
   def __init__(self, text):
     self.text = text
@@ -172,6 +183,14 @@ class UnknownStrategy(Exception):
     return 'UnknownStrategy: "%s"' % self.text
 
 
+class UnknownRgbMapping(Exception):
+  def __init__(self, name):
+    self.name = name
+
+  def __str__(self):
+    return 'Unknown rgb-mapping: "%s"' % self.name
+
+
 class UnknownLogicFailure(Exception):
   def __init__(self, text):
     self.text = text
@@ -227,6 +246,11 @@ class MakepalInvalidFormat(Exception):
   pass
 
 
+class Cancelled(Exception):
+  def __str__(self):
+    return 'Cancelled'
+
+
 class GeometryError(Exception):
   def __init__(self, msg):
     self.msg = msg
@@ -243,21 +267,45 @@ class AlgorithmError(Exception):
     return 'AlgorithmError: %s' % self.msg
 
 
+def find_cells(errs):
+  """Cells of a list of errors, the same as ErrorCollector.cells."""
+  collector = ErrorCollector()
+  for e in errs:
+    collector._add_cells(e, None)
+  return collector.cells()
+
+
 class ErrorCollector(object):
+  """Collects errors found while processing an image.
+
+  Errors are indexed by the tile and block they are at, as they are added, so
+  that finding the error at a position doesn't need to look at every error.
+  The cells that errors are at, including duplicates, are kept in the order
+  they should be drawn, and errors are counted by type.
+  """
   def __init__(self):
     self.errs = []
     self.dup = []
     self.color_not_allowed_dups = {}
     self.nametable_overflow_idx = None
     self.spritelist_overflow_idx = None
+    # Position of the earliest error at each tile and each block.
+    self._tile_index = {}
+    self._block_index = {}
+    # Keys of (is_block, y, x), ordered by when each cell was last added.
+    self._cells = collections.OrderedDict()
+    self._type_counts = collections.OrderedDict()
+    self._positions = {}
 
   def add(self, error):
     if isinstance(error, CouldntConvertRGB):
-      c = error.get_color()
+      # Errors from different frames of an animation are kept apart.
+      c = (getattr(error, 'frame', None), error.get_color())
       if c in self.color_not_allowed_dups:
         idx = self.color_not_allowed_dups[c]
         self.errs[idx].count += 1
         self.dup.append(error)
+        self._add_cells(error, None)
         return
       self.color_not_allowed_dups[c] = len(self.errs)
     if isinstance(error, NametableOverflow):
@@ -272,7 +320,16 @@ class ErrorCollector(object):
         self.spritelist_overflow_idx = len(self.errs)
       else:
         return
+    self._positions[id(error)] = len(self.errs)
+    self._add_cells(error, len(self.errs))
     self.errs.append(error)
+    name = type(error).__name__
+    self._type_counts[name] = self._type_counts.get(name, 0) + 1
+
+  def add_block(self, error, block_y, block_x):
+    """Add a block to an error's list_blocks, after the error was added."""
+    error.list_blocks.append([block_y, block_x])
+    self._index_cell(True, block_y, block_x, self._positions.get(id(error)))
 
   def has(self):
     return len(self.errs)
@@ -282,23 +339,48 @@ class ErrorCollector(object):
       return self.errs + self.dup
     return self.errs
 
+  def counts(self):
+    """List of (type name, count) for each type of error, in order found."""
+    return list(self._type_counts.items())
+
+  def cells(self):
+    """List of (is_block, y, x) for each cell with an error, in draw order.
+
+    Includes the cells of duplicate errors. The position y, x is in blocks if
+    is_block is set, otherwise in tiles.
+    """
+    return list(self._cells.keys())
+
   def find(self, y, x):
     if y is None or x is None:
       return None
-    for e in self.errs:
-      if hasattr(e, 'tile_y') and hasattr(e, 'tile_x'):
-        tile_y, tile_x = getattr(e, 'tile_y'), getattr(e, 'tile_x')
-        if y == tile_y and x == tile_x:
-          return e
-      if hasattr(e, 'block_y') and hasattr(e, 'block_x'):
-        block_y, block_x = getattr(e, 'block_y'), getattr(e, 'block_x')
-        if y // 2 == block_y and x // 2 == block_x:
-          return e
-      if hasattr(e, 'list_blocks'):
-        for block_y, block_x in getattr(e, 'list_blocks'):
-          if y // 2 == block_y and x // 2 == block_x:
-            return e
-    return None
+    found = [self._tile_index.get((y, x)),
+             self._block_index.get((y // 2, x // 2))]
+    found = [idx for idx in found if idx is not None]
+    if not found:
+      return None
+    return self.errs[min(found)]
+
+  def _add_cells(self, error, idx):
+    for block_y, block_x in getattr(error, 'list_blocks', []):
+      self._index_cell(True, block_y, block_x, idx)
+    if (getattr(error, 'tile_y', None) is not None and
+        getattr(error, 'tile_x', None) is not None):
+      self._index_cell(False, error.tile_y, error.tile_x, idx)
+    elif (getattr(error, 'block_y', None) is not None and
+          getattr(error, 'block_x', None) is not None):
+      self._index_cell(True, error.block_y, error.block_x, idx)
+
+  def _index_cell(self, is_block, y, x, idx):
+    key = (is_block, y, x)
+    # Move the cell to the end, it is drawn on top of earlier cells.
+    self._cells.pop(key, None)
+    self._cells[key] = None
+    if idx is None:
+      return
+    index = self._block_index if is_block else self._tile_index
+    if not (y, x) in index or idx < index[(y, x)]:
+      index[(y, x)] = idx
 
   def find_type(self, t):
     for e in self.errs:
@@ -1,6 +1,5 @@
 import errors
 import palette
-import rgb
 
 
 class ExtractIndexedImagePalette(object):
@@ -35,9 +34,4 @@ class ExtractIndexedImagePalette(object):
       g = ord(g)
     if isinstance(b, str):
       b = ord(b)
-    color_val = (r << 16) + (g << 8) + b
-    if color_val in rgb.RGB_XLAT:
-      nc = rgb.RGB_XLAT[color_val]
-    else:
-      nc = self.parent.components_to_nescolor(r, g, b)
-    return nc
+    return self.parent.rgb_to_nescolor((r, g, b))
@@ -1,41 +1,157 @@
+import hashlib
 import os
+import threading
 import watchdog.observers
 import watchdog.events
 
 
+# Seconds to wait for a file to stop changing before calling back.
+DEBOUNCE_SECONDS = 0.2
+
+
+def daemon_timer(interval, function, args):
+  """Make a timer that doesn't keep the process running."""
+  timer = threading.Timer(interval, function, args)
+  timer.daemon = True
+  return timer
+
+
 class FileModifyEvent(object):
   def __init__(self, filename):
     self.filename = filename
 
 
 class FileModifyEventHandler(watchdog.events.FileSystemEventHandler):
-  def __init__(self, filename, callback):
-    self.filename = os.path.abspath(filename)
-    self.callback = callback
+  """Passes events for any watched file in a directory to the watcher."""
+  def __init__(self, watcher):
+    self.watcher = watcher
 
   def on_modified(self, event):
-    target = os.path.abspath(event.src_path)
-    if target == self.filename:
-      self.callback(FileModifyEvent(self.filename))
+    self.watcher.notify(event.src_path)
 
-  def observe_path(self):
-    return os.path.dirname(os.path.abspath(self.filename))
+  def on_created(self, event):
+    self.watcher.notify(event.src_path)
+
+  def on_moved(self, event):
+    # Editors often save by writing a temporary file, then renaming it.
+    self.watcher.notify(event.dest_path)
+
+
+class WatchedFile(object):
+  def __init__(self, filename, callback, digest):
+    self.filename = filename
+    self.callback = callback
+    self.digest = digest
+    self.timer = None
 
 
 class FileModifyWatcher(object):
-  def __init__(self):
+  """Watches files, calling back once each time a file's content changes.
+
+  Editors may write a file in many chunks, or write a temporary file and
+  rename it, causing a burst of events for a single save. Events are
+  debounced, so that nothing happens until the file has been quiet for a
+  short time. Then the file's content is hashed, and the callback only
+  happens if the content is different than before. A file that is still
+  being written is checked again later. All files are watched by a single
+  observer, with one watch per directory.
+
+  debounce: Seconds the file must be quiet for, before it is checked.
+  make_timer: Optional function to make the debounce timers, called like
+      threading.Timer, with the seconds, function and args.
+  """
+  def __init__(self, debounce=None, make_timer=None):
     self.observer = None
+    self.debounce = DEBOUNCE_SECONDS if debounce is None else debounce
+    self._make_timer = make_timer or daemon_timer
+    self._files = {}
+    self._dirs = set()
+    self._lock = threading.Lock()
 
   def watch(self, filename, callback):
-    self.observer = watchdog.observers.Observer()
-    event_handler = FileModifyEventHandler(filename, callback)
-    self.observer.schedule(event_handler, event_handler.observe_path())
-    self.observer.start()
+    """Watch the file, replacing the callback if it is already watched."""
+    filename = os.path.abspath(filename)
+    with self._lock:
+      if filename in self._files:
+        self._files[filename].callback = callback
+        return
+      self._files[filename] = WatchedFile(filename, callback,
+                                          self._digest(filename))
+      dirname = os.path.dirname(filename)
+      if dirname in self._dirs:
+        return
+      self._dirs.add(dirname)
+      if self.observer is None:
+        self.observer = watchdog.observers.Observer()
+        self.observer.start()
+      self.observer.schedule(FileModifyEventHandler(self), dirname)
+
+  def unwatch(self, filename):
+    filename = os.path.abspath(filename)
+    with self._lock:
+      watched = self._files.pop(filename, None)
+      if watched and watched.timer:
+        watched.timer.cancel()
+
+  def watching(self):
+    """List of watched filenames."""
+    with self._lock:
+      return sorted(self._files.keys())
+
+  def notify(self, filename):
+    """Note that the file may have changed, checking it once it is quiet."""
+    filename = os.path.abspath(filename)
+    with self._lock:
+      watched = self._files.get(filename)
+      if watched is None:
+        return
+      if watched.timer:
+        watched.timer.cancel()
+      watched.timer = self._make_timer(self.debounce, self._settle, [watched])
+      watched.timer.start()
 
   def stop(self):
+    with self._lock:
+      for watched in self._files.values():
+        if watched.timer:
+          watched.timer.cancel()
     if self.observer:
       self.observer.stop()
 
   def finish(self):
     if self.observer:
       self.observer.join()
+
+  def _settle(self, watched):
+    try:
+      before = os.stat(watched.filename)
+      digest = self._digest(watched.filename)
+      after = os.stat(watched.filename)
+    except (IOError, OSError):
+      # Missing, probably in the middle of being replaced. Its creation or
+      # rename will cause another event.
+      return
+    if before.st_size != after.st_size or before.st_mtime != after.st_mtime:
+      # Still being written.
+      self.notify(watched.filename)
+      return
+    if not after.st_size:
+      # Truncated before being written, writing will cause another event.
+      return
+    with self._lock:
+      if self._files.get(watched.filename) is not watched:
+        return
+      if digest == watched.digest:
+        return
+      watched.digest = digest
+    watched.callback(FileModifyEvent(watched.filename))
+
+  def _digest(self, filename):
+    try:
+      fp = open(filename, 'rb')
+    except (IOError, OSError):
+      return None
+    try:
+      return hashlib.sha1(fp.read()).hexdigest()
+    finally:
+      fp.close()
@@ -5,7 +5,7 @@ import errors
 import id_manifest
 import image_processor
 import ppu_memory
-import rgb
+import span_list
 import span_list_delta
 from constants import *
 
@@ -18,7 +18,7 @@ class FreeSpriteProcessor(image_processor.ImageProcessor):
     self.traversal = traversal
     self._verbose = False
     self._min_width = 8
-    self._regions = []
+    self._regions = span_list.SortedSpanList()
     self._vert_color_manifest = id_manifest.IdManifest()
 
   def set_verbose(self, verbose):
@@ -136,23 +136,15 @@ class FreeSpriteProcessor(image_processor.ImageProcessor):
     """Scan the entire image. Calculate the positions of tile corners."""
     if self._verbose:
       print('')
-    self._regions = []
+    mask = self.fill_mask(self.img, fill)
+    self._regions = span_list.SortedSpanList()
     zones = []
     # For each line of the image, starting from the top.
     for y in range(self.image_y):
-      is_color = False
-      x = 0
-      spans = []
-      # Construct next span.
-      while x < self.image_x:
-        nc = self.get_nes_color(y, x)
-        if nc != fill and not is_color:
-          is_color = True
-          spans.append(data.Span(x, None))
-        elif nc == fill and is_color:
-          is_color = False
-          spans[-1].right = x
-        x += 1
+      spans = span_list.find_spans(
+        mask[y * self.image_x:(y + 1) * self.image_x])
+      if not spans and not len(self._regions):
+        continue
       # Combine previous and next spans.
       zones += self._combine_spans(y, spans)
     # Display the zones in verbose mode.
@@ -169,7 +161,6 @@ class FreeSpriteProcessor(image_processor.ImageProcessor):
 
   def _combine_spans(self, y, spans):
     built = []
-    test_prev = str(self._regions)
     delta = span_list_delta.get_delta(spans, self._regions)
     if self._verbose and delta.keys() and delta.keys() != ['same']:
       print('')
@@ -203,26 +194,18 @@ class FreeSpriteProcessor(image_processor.ImageProcessor):
   def _insert_spans_as_regions(self, y, include):
     """Insert new regions."""
     for edge in include:
-      self._insert_into(data.Region.make_from(y, edge), self._regions)
+      self._regions.insert(data.Region.make_from(y, edge))
 
   def _exclude_regions_and_make_zones(self, y, exclude):
     """Remove the excluded zones and collect their zones."""
     built = []
-    k = 0
     for elem in exclude:
       # Finish the zones from any excluded regions.
       zones = elem.zones
       for z in zones:
         z.bottom = y
       built += zones
-      # Remove excluded regions.
-      while k < len(self._regions):
-        region = self._regions[k]
-        if elem == region:
-          self._regions = self._regions[0:k] + self._regions[k+1:]
-          break
-        else:
-          k += 1
+      self._regions.remove(elem)
     return built
 
   def _merge_region_changes(self, y, merge):
@@ -266,7 +249,7 @@ class FreeSpriteProcessor(image_processor.ImageProcessor):
           self._regions.remove(above)
       region = data.Region(below.left, below.right)
       region.zones = collect
-      self._insert_into(region, self._regions)
+      self._regions.insert(region)
     return built
 
   def _insert_into(self, item, target):
@@ -4,6 +4,8 @@ from direction_constants import *
 
 
 class Point(object):
+  __slots__ = ('y', 'x')
+
   def __init__(self, y, x):
     self.y = y
     self.x = x
@@ -36,6 +38,8 @@ class Point(object):
 
 
 class Vertex(Point):
+  __slots__ = ('kind', 'idx', 'terminal')
+
   def __init__(self, kind, y, x, idx=None):
     Point.__init__(self, y, x)
     if kind not in ['reflex', 'convex']:
@@ -63,6 +67,8 @@ class Vertex(Point):
 
 
 class Edge(object):
+  __slots__ = ('facing', 'y0', 'x0', 'y1', 'x1', 'done', 'cover')
+
   def __init__(self, facing, y0, x0, y1, x1):
     self.done = False
     if y0 > y1:
@@ -274,11 +280,15 @@ class Edge(object):
 
 
 class Rectangle(object):
+  __slots__ = ('top', 'left', 'bot', 'right', 'count')
+
   def __init__(self, top, left, bot, right):
     self.top = top
     self.left = left
     self.bot = bot
     self.right = right
+    # Which step of rectilinear coverage collected this rectangle.
+    self.count = None
 
   def exclusively_inside(self, y, x):
     return self.top < y < self.bot and self.left < x < self.right
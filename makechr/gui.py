@@ -9,8 +9,11 @@ from PIL import Image
 import StringIO
 import sys
 import tempfile
+import threading
+import time
 
 import app
+import background_worker
 import binary_file_writer
 import color_cycler
 import errors
@@ -19,10 +22,11 @@ import eight_by_sixteen_processor
 import makechr
 import memory_importer
 import pixel_art_renderer
-import pkg_resources
 import ppu_memory
+import resource_cache
 import rom_builder
 import view_renderer
+import view_scheduler
 import file_modify_watcher
 from constants import *
 
@@ -32,6 +36,10 @@ APP_HEIGHT = 704
 APP_TITLE = 'Makechr'
 
 
+# Views shown next to the input, each rendered by its own renderer.
+VIEW_NAMES = ['colorization', 'nametable', 'reuse', 'palette', 'chr']
+
+
 MousePos = collections.namedtuple('MousePos',
                                   ['clear', 'y', 'x', 'size', 'meta'])
 
@@ -303,13 +311,43 @@ class DrawCursorManager(object):
         comp.drawBox(clear, cursor.y, cursor.x, cursor.size, color)
 
 
+class ProcessedImage(object):
+  """Results of processing an image, along with its rendered views.
+
+  Kept apart from the processor, so that the background worker can reuse the
+  processor for the next run while these results are still being displayed.
+  """
+  def __init__(self, mem, err):
+    self._ppu_memory = mem
+    self._err = err
+    self.views = {}
+    self.nt_inverter = None
+    self.elapsed = None
+
+  def ppu_memory(self):
+    return self._ppu_memory
+
+  def err(self):
+    return self._err
+
+
 class MakechrGui(wx.Frame):
   """MakechrGui main application."""
 
   def __init__(self, *args, **kwargs):
     super(MakechrGui, self).__init__(*args, **kwargs)
-    self.processor = image_processor.ImageProcessor()
+    self.processor = ProcessedImage(None, errors.ErrorCollector())
+    # Processor owned by the background worker, reused between runs.
+    self.workProcessor = None
+    self.worker = background_worker.BackgroundWorker(wx.CallAfter)
     self.renderer = view_renderer.ViewRenderer(scale=1)
+    # Threads and renderers for the views, kept so that their caches are
+    # reused each time the image is processed.
+    self.viewScheduler = view_scheduler.ViewScheduler(keep_pool=True)
+    self.viewRenderers = dict([(name, view_renderer.ViewRenderer(scale=1))
+                               for name in VIEW_NAMES])
+    # A cancelled run may still be rendering while the next one starts.
+    self.viewLock = threading.Lock()
     self.inputImagePath = None
     self.cursor = None
     self.manager = None
@@ -325,7 +363,6 @@ class MakechrGui(wx.Frame):
     self.CreateImages()
     self.CreateOptions()
     self.CreateLabels()
-    self.CreateReloadTimer()
     self.CreateCursorManager()
     self.CreateMessageTimer()
 
@@ -336,8 +373,8 @@ class MakechrGui(wx.Frame):
     self.SetTitle(APP_TITLE)
     self.SetPosition((200, 30))
     # Set the application icon.
-    res = pkg_resources.resource_stream('makechr', 'res/icon.png')
-    bitmap = self.PilImgToBitmap(Image.open(res))
+    res = resource_cache.image('res/icon.png')
+    bitmap = self.PilImgToBitmap(res)
     icon = wx.Icon()
     icon.CopyFromBitmap(bitmap)
     self.SetIcon(icon)
@@ -483,7 +520,7 @@ class MakechrGui(wx.Frame):
 
   def SetBitmapResource(self, control, rel):
     try:
-      img = Image.open(pkg_resources.resource_stream('makechr', rel))
+      img = resource_cache.image(rel)
       wx.CallAfter(control.SetBitmap, self.PilImgToBitmap(img))
     except IOError:
       pass
@@ -510,10 +547,6 @@ class MakechrGui(wx.Frame):
     self.manager.addComponent(self.colorsComp)
     self.manager.addComponent(self.chrComp)
 
-  def CreateReloadTimer(self):
-    self.reloadTimer = wx.Timer(self, wx.ID_ANY)
-    self.Bind(wx.EVT_TIMER, self.OnReloadTimer, self.reloadTimer)
-
   def IdentifyFileKind(self, path):
     golden = '(VALIANT)'
     fp = open(path, 'rb')
@@ -529,12 +562,7 @@ class MakechrGui(wx.Frame):
     kind = self.IdentifyFileKind(self.inputImagePath)
     if kind == 'image':
       self.ReassignImage()
-      self.ProcessMakechr()
-      self.CreateViews()
-      self.OnImageLoaded()
-      # TODO: Unwatch when something else is opened.
-      self.watcher.watch(self.inputImagePath, self.OnModify)
-      self.ShowMessage('Loaded "%s"' % self.inputImagePath, 4.0)
+      self.StartProcessing(True)
     elif kind == 'valiant':
       self.LoadValiant()
       self.ReassignImage()
@@ -556,8 +584,9 @@ class MakechrGui(wx.Frame):
     outfile = tempfile.mkstemp(suffix='.png')[1]
     img.save(outfile)
     self.inputImagePath = outfile
-    self.processor._err = errors.ErrorCollector()
-    self.processor._ppu_memory = mem
+    self.worker.cancel()
+    self.processor = ProcessedImage(mem, errors.ErrorCollector())
+    self.manager.setProcessor(self.processor)
     self.ReassignImage()
     self.CreateViews()
     self.OnImageLoaded()
@@ -572,8 +601,9 @@ class MakechrGui(wx.Frame):
     outfile = tempfile.mkstemp(suffix='.png')[1]
     img.save(outfile)
     self.inputImagePath = outfile
-    self.processor._err = errors.ErrorCollector()
-    self.processor._ppu_memory = mem
+    self.worker.cancel()
+    self.processor = ProcessedImage(mem, errors.ErrorCollector())
+    self.manager.setProcessor(self.processor)
     self.ShowMessage('Opened "%s"' % path, 4.0)
 
   def ReassignImage(self):
@@ -589,56 +619,121 @@ class MakechrGui(wx.Frame):
       bitmap = wx.Bitmap(img)
     self.inputComp.load(bitmap)
 
-  def ProcessMakechr(self):
+  def StartProcessing(self, is_first_load):
+    """Process the input image and render views on the background worker.
+
+    Any run still in flight is cancelled, only the newest run is shown.
+    """
+    path = self.inputImagePath
     config = self.BuildConfigFromOptions()
-    # TODO: It might be inefficient to reconstruct every time.
+    self.ShowMessage('Processing "%s"...' % path, 60.0)
+    self.worker.submit(lambda job: self.RunProcessing(job, path, config),
+                       lambda result: self.OnProcessed(result, path,
+                                                       is_first_load),
+                       self.OnProcessingError, self.OnProcessingProgress)
+
+  def GetWorkProcessor(self, config):
+    # Keep the processor while the kind stays the same, so that reloading an
+    # edited image only processes the tiles that changed.
     if config.traversal != '8x16':
-      self.processor = image_processor.ImageProcessor()
-      self.manager.setProcessor(self.processor)
+      kind = image_processor.ImageProcessor
     else:
-      self.processor = eight_by_sixteen_processor.EightBySixteenProcessor()
-      self.manager.setProcessor(self.processor)
-    input = Image.open(self.inputImagePath)
+      kind = eight_by_sixteen_processor.EightBySixteenProcessor
+    if type(self.workProcessor) is not kind:
+      self.workProcessor = kind()
+      self.workProcessor.incremental = True
+    return self.workProcessor
+
+  def RunProcessing(self, job, path, config):
+    """Process the image and render its views. Runs on the worker thread."""
+    start_time = time.time()
+    processor = self.GetWorkProcessor(config)
+    processor.cancel_check = job.check
+    input = Image.open(path)
     platform = None
-    self.processor.process_image(input, None, None, None, platform,
-                                 config.traversal,
-                                 config.is_sprite, config.is_locked_tiles,
-                                 None, config.allow_overflow)
+    processor.process_image(input, None, None, None, platform,
+                            config.traversal,
+                            config.is_sprite, config.is_locked_tiles,
+                            None, config.allow_overflow)
+    job.check()
+    result = ProcessedImage(processor.ppu_memory(), processor.err())
+    job.report('Rendering views...')
+    self.RenderViews(result, config, input)
+    job.check()
+    result.elapsed = time.time() - start_time
+    return result
+
+  def OnProcessed(self, result, path, is_first_load):
+    self.processor = result
+    self.manager.setProcessor(self.processor)
+    self.ShowViews(result)
+    self.OnImageLoaded()
+    verb = 'Processed'
+    if is_first_load:
+      # TODO: Unwatch when something else is opened.
+      self.watcher.watch(path, self.OnModify)
+      verb = 'Loaded'
+    self.ShowMessage('%s "%s" in %dms' % (verb, path, result.elapsed * 1000),
+                     4.0)
+
+  def OnProcessingProgress(self, msg):
+    self.ShowMessage(msg, 60.0)
+
+  def OnProcessingError(self, e):
+    self.ShowMessage('ERROR: {0} {1}'.format(type(e).__name__, e), 8.0)
 
   def CreateViews(self):
     config = self.BuildConfigFromOptions()
-    renderer = self.renderer
-    if self.processor.err().has():
-      self.ClearViews()
+    input = Image.open(self.inputImagePath)
+    self.RenderViews(self.processor, config, input)
+    self.ShowViews(self.processor)
+
+  def RenderViews(self, result, config, input):
+    """Render the views of the result. Safe to call from any thread."""
+    if result.err().has():
       # Errors.
-      input = Image.open(self.inputImagePath)
-      view = renderer.create_error_view(None, input, self.processor.err().get(),
-                                        has_grid=False)
-      self.inputComp.load(self.PilImgToBitmap(view))
+      result.views['error'] = self.NewRenderer().create_error_view(
+        None, input, result.err(), has_grid=False)
       return
-    self.nt_inverter = self.processor.ppu_memory().build_nt_inverter()
-    # Colorization.
-    view = renderer.create_colorization_view(None, self.processor.ppu_memory(),
-                                             config.is_sprite)
-    self.colorsComp.load(self.PilImgToBitmap(view))
-    # Nametable.
-    view = renderer.create_nametable_view(None, self.processor.ppu_memory())
-    self.ntComp.load(self.PilImgToBitmap(view))
-    # Reuse.
-    view = renderer.create_reuse_view(None, self.processor.ppu_memory(),
-                                      self.nt_inverter)
-    self.reuseComp.load(self.PilImgToBitmap(view))
-    # Palette.
-    view = renderer.create_palette_view(None, self.processor.ppu_memory(),
-                                        config.is_sprite)
-    wx.CallAfter(self.paletteCtrl.SetBitmap, self.PilImgToBitmap(view))
-    # Chr.
-    view = renderer.create_chr_view(None, self.processor.ppu_memory())
-    self.chrComp.load(self.PilImgToBitmap(view))
+    mem = result.ppu_memory()
+    result.nt_inverter = mem.build_nt_inverter()
+    # Render each view on its own thread, with its own renderer.
+    with self.viewLock:
+      views = self.viewScheduler
+      renderers = self.viewRenderers
+      views.add('colorization',
+                renderers['colorization'].create_colorization_view, None, mem,
+                config.is_sprite)
+      views.add('nametable', renderers['nametable'].create_nametable_view, None,
+                mem)
+      views.add('reuse', renderers['reuse'].create_reuse_view, None, mem,
+                result.nt_inverter)
+      views.add('palette', renderers['palette'].create_palette_view, None, mem,
+                config.is_sprite)
+      views.add('chr', renderers['chr'].create_chr_view, None, mem)
+      views.start()
+      result.views = views.wait()
+
+  def ShowViews(self, result):
+    """Display the rendered views of the result, on the main thread."""
+    if 'error' in result.views:
+      self.ClearViews()
+      self.inputComp.load(self.PilImgToBitmap(result.views['error']))
+      return
+    self.nt_inverter = result.nt_inverter
+    self.colorsComp.load(self.PilImgToBitmap(result.views['colorization']))
+    self.ntComp.load(self.PilImgToBitmap(result.views['nametable']))
+    self.reuseComp.load(self.PilImgToBitmap(result.views['reuse']))
+    wx.CallAfter(self.paletteCtrl.SetBitmap,
+                 self.PilImgToBitmap(result.views['palette']))
+    self.chrComp.load(self.PilImgToBitmap(result.views['chr']))
     # Num tiles.
-    num = self.processor.ppu_memory().chr_set.size()
+    num = result.ppu_memory().chr_set.size()
     self.UpdateNumTileMsg(num, None)
 
+  def NewRenderer(self):
+    return view_renderer.ViewRenderer(scale=1)
+
   def ClearViews(self):
     self.inputComp.clear()
     self.ntComp.clear()
@@ -745,16 +840,12 @@ class MakechrGui(wx.Frame):
 
   def ReloadFile(self):
     self.ReassignImage()
-    self.ProcessMakechr()
-    self.CreateViews()
-    self.OnImageLoaded()
-
-  def OnReloadTimer(self, e):
-    self.reloadTimer.Stop()
-    self.ReloadFile()
+    self.StartProcessing(False)
 
   def OnModify(self, e):
-    wx.CallAfter(self.reloadTimer.Start, 1000)
+    # The watcher only calls back once a save has settled, and changed the
+    # file's content.
+    wx.CallAfter(self.ReloadFile)
 
   def OnQuit(self, e):
     self.Close()
@@ -765,7 +856,7 @@ class MakechrGui(wx.Frame):
     except:
       pass
     try:
-      self.reloadTimer.Stop()
+      self.worker.stop()
     except:
       pass
     try:
@@ -776,6 +867,10 @@ class MakechrGui(wx.Frame):
       self.manager.cursorTimer.Stop()
     except:
       pass
+    try:
+      self.viewScheduler.close()
+    except:
+      pass
     e.Skip()
 
 
@@ -1,5 +1,6 @@
 import chr_data
 import collections
+import copy
 import extract_indexed_image_palette
 import errors
 import guess_best_palette
@@ -8,9 +9,11 @@ import itertools
 import math
 import os
 import palette
+from PIL import Image, ImageChops
 import ppu_memory
 import sys
 import rgb
+import span_list
 import wrapped_image_palette
 from constants import *
 
@@ -19,6 +22,11 @@ if sys.version_info < (3,0):
   range = xrange
 
 
+# Most colors to handle with whole image operations, one per color. Images
+# with more colors, such as noisy or dithered ones, are looked up per pixel.
+MAX_LAYER_COLORS = 64
+
+
 class ImageProcessor(object):
   """Converts pixel art image into data structures in the PPU's memory."""
 
@@ -26,6 +34,17 @@ class ImageProcessor(object):
     self.initialize()
     # A flag only used by tests, whether sprites auto detect background color.
     self._test_only_auto_sprite_bg = False
+    # Whether to keep results from the previous image, so that processing an
+    # edited version of it only needs to process the tiles that changed.
+    self.incremental = False
+    self._tile_results = {}
+    self._prev_tile_results = {}
+    self._palette_result = None
+    self._run_key = None
+    # Called regularly while processing, raises errors.Cancelled to stop.
+    self.cancel_check = None
+    # Converts RGB colors to nes colors, see set_rgb_mapping.
+    self.rgb_mapping = rgb.get_mapping()
 
   def initialize(self):
     self._ppu_memory = ppu_memory.PpuMemory()
@@ -37,6 +56,7 @@ class ImageProcessor(object):
     self._artifacts = None
     self._flip_bits = None
     self._err = errors.ErrorCollector()
+    self._raw = None
     self.image_x = self.image_y = None
     self.tile_ctor = None
 
@@ -51,7 +71,9 @@ class ImageProcessor(object):
 
   def load_image(self, img):
     self.img = img
-    self.pixels = self.img.convert('RGB').load()
+    rgb_img = self.img.convert('RGB')
+    self.pixels = rgb_img.load()
+    self._raw = rgb_img.tobytes() if self.incremental else None
     (self.image_x, self.image_y) = self.img.size
     self.blocks_y = int(math.ceil(float(self.image_y) / 16))
     self.blocks_x = int(math.ceil(float(self.image_x) / 16))
@@ -62,7 +84,7 @@ class ImageProcessor(object):
     size_y = NUM_TILES_Y * self.screen_y
     self._artifacts = [row[:] for row in [[None] * size_x] * size_y]
     self._flip_bits = [row[:] for row in [[None] * size_x] * size_y]
-    self._ppu_memory.allocate_num_pages(self.screen_y * self.screen_x)
+    self._ppu_memory.allocate_screens(self.screen_y, self.screen_x)
     # Set size of nametable for each screen.
     for y in range(self.screen_y):
       for x in range(self.screen_x):
@@ -94,50 +116,147 @@ class ImageProcessor(object):
   def dot_manifest(self):
     return self._dot_manifest
 
+  def check_cancelled(self):
+    """Stop processing, by raising errors.Cancelled, if asked to."""
+    if self.cancel_check:
+      self.cancel_check()
+
+  def set_rgb_mapping(self, rgb_mapping):
+    """Set the mapping used to convert RGB colors to nes colors."""
+    if rgb_mapping is self.rgb_mapping:
+      return
+    self.rgb_mapping = rgb_mapping
+    # Results kept from previous images were converted by another mapping.
+    self._tile_results = {}
+    self._prev_tile_results = {}
+    self._palette_result = None
+    self._run_key = None
+
   def components_to_nescolor(self, r, g, b):
     """Convert RGB color components to an index into the NES system palette.
 
     Given the color components of a pixel from PIL/pillow, find the
     corresponding index in the NES system palette that most closely matches
-    that color. Save the result in RGB_XLAT so future accesses will be fast.
-    If the color cannot be converted, return -1.
+    that color, according to the rgb mapping. If the color cannot be
+    converted, return -1.
 
     r: The red value of the pixel.
     g: The green value of the pixel.
     b: The blue value of the pixel.
     """
-    found_nc = -1
-    found_diff = float('infinity')
-    colors = rgb.RGB_COLORS
-    for i,allow_val in enumerate(colors):
-      diff_r = abs(r - allow_val // (256 * 256))
-      diff_g = abs(g - (allow_val // 256) % 256)
-      diff_b = abs(b - allow_val % 256)
-      diff = diff_r + diff_g + diff_b
-      if diff < found_diff:
-        found_nc = i
-        found_diff = diff
-    if found_diff > rgb.COLOR_TOLERANCE:
-      return -1
-    if found_nc == 0x0d:
-      found_nc = 0x0f
-    color_val = r * 256 * 256 + g * 256 + b
-    rgb.RGB_XLAT[color_val] = found_nc
-    return found_nc
+    return self.rgb_mapping.components_to_nescolor(r, g, b)
 
   def get_nes_color(self, y, x):
     """Get the nes color corresponding to the pixel at position y,x."""
 
     p = self.pixels[x, y]
     color_val = (p[0] << 16) + (p[1] << 8) + p[2]
-    if color_val in rgb.RGB_XLAT:
-      return rgb.RGB_XLAT[color_val]
+    if color_val in self.rgb_mapping.xlat:
+      return self.rgb_mapping.xlat[color_val]
     else:
       nc = self.components_to_nescolor(p[0], p[1], p[2])
       if nc == -1:
         raise errors.CouldntConvertRGB(p, y // 8, x // 8, y%8, x%8)
       return nc
 
+  def rgb_to_nescolor(self, p):
+    """Convert the pixel p to a nes color, or -1 if it cannot be converted."""
+    color_val = (p[0] << 16) + (p[1] << 8) + p[2]
+    if color_val in self.rgb_mapping.xlat:
+      return self.rgb_mapping.xlat[color_val]
+    return self.components_to_nescolor(p[0], p[1], p[2])
+
+  def fill_mask(self, img, fill):
+    """Build a mask of the image, one byte per pixel, 0 where it is fill.
+
+    Each distinct color in the image is converted to a nes color only once.
+    With few colors, the mask is built from whole image operations, comparing
+    against the colors that convert to fill.
+
+    img: Pixel art image.
+    fill: Nes color that is fill.
+    """
+    rgb_img = img.convert('RGB')
+    width, height = rgb_img.size
+    colors = self._convert_colors(rgb_img)
+    if len(colors) > MAX_LAYER_COLORS:
+      return self._translate_pixels(
+        rgb_img, [(p, 0 if nc == fill else 1) for p, nc in colors])
+    mask = None
+    for p, nc in colors:
+      if nc != fill:
+        continue
+      diff = self._color_difference(rgb_img, p)
+      mask = diff if mask is None else ImageChops.darker(mask, diff)
+    if mask is None:
+      return span_list.MASK_COLOR * (width * height)
+    return mask.point([0] + [1] * 255).tobytes()
+
+  def nes_color_buffer(self, img):
+    """Decode the image into nes colors, one byte per pixel, row by row.
+
+    Like fill_mask, each distinct color is converted only once, and with few
+    colors the buffer is built from whole image operations, one per color.
+
+    img: Pixel art image.
+    """
+    rgb_img = img.convert('RGB')
+    colors = self._convert_colors(rgb_img)
+    if len(colors) > MAX_LAYER_COLORS:
+      return self._translate_pixels(rgb_img, colors)
+    buff = None
+    for p, nc in colors:
+      layer = self._color_difference(rgb_img, p).point([nc] + [0] * 255)
+      buff = layer if buff is None else ImageChops.lighter(buff, layer)
+    return buff.tobytes()
+
+  def _translate_pixels(self, rgb_img, colors):
+    """Translate each pixel to a byte, taking the same time for any number of
+    colors.
+
+    colors: List of (color, byte value) for every color in the image.
+    """
+    table = dict([(bytes(bytearray(p)), val) for p, val in colors])
+    raw = rgb_img.tobytes()
+    return bytes(bytearray([table[raw[k:k + 3]]
+                            for k in range(0, len(raw), 3)]))
+
+  def _convert_colors(self, rgb_img):
+    """List each distinct color of the image, with its nes color.
+
+    Raises CouldntConvertRGB for the first pixel that cannot be converted.
+    """
+    width, height = rgb_img.size
+    colors = []
+    bad_colors = []
+    for unused, p in rgb_img.getcolors(width * height):
+      nc = self.rgb_to_nescolor(p)
+      if nc == -1:
+        bad_colors.append(p)
+      colors.append((p, nc))
+    if bad_colors:
+      # Report the first pixel that can't be converted, scanning in order.
+      raw = rgb_img.tobytes()
+      pos = min(self._find_pixel(raw, p) for p in bad_colors)
+      y, x = divmod(pos, width)
+      p = rgb_img.getpixel((x, y))
+      raise errors.CouldntConvertRGB(p, y // 8, x // 8, y % 8, x % 8)
+    return colors
+
+  def _color_difference(self, rgb_img, p):
+    """Single band image, zero only where the pixel is the color p."""
+    diff = ImageChops.difference(rgb_img, Image.new('RGB', rgb_img.size, p))
+    r, g, b = diff.split()
+    return ImageChops.lighter(ImageChops.lighter(r, g), b)
+
+  def _find_pixel(self, raw, p):
+    """Position of the first pixel of color p, in raw rgb bytes."""
+    needle = bytes(bytearray(p))
+    k = raw.find(needle)
+    while k % 3:
+      k = raw.find(needle, k + 1)
+    return k // 3
+
   def collect_error(self, e, block_y, block_x, i, j, is_block=False):
     """Add the exception to the error exception and clear the artifacts entry.
 
@@ -180,7 +299,7 @@ class ImageProcessor(object):
     # performance. 'xlat' is mutated whenever 'components_to_nescolor_func' is
     # called.
     ps = self.pixels
-    xlat = rgb.RGB_XLAT
+    xlat = self.rgb_mapping.xlat
     components_to_nescolor_func = self.components_to_nescolor
     for i in range(TILE_SIZE):
       row = i * TILE_SIZE
@@ -227,6 +346,43 @@ class ImageProcessor(object):
         dot_profile[row + j] = idx
     return color_needs, dot_profile
 
+  def get_process_tile_func(self):
+    """Get the function to process tiles, which may reuse earlier results."""
+    if self._raw is not None:
+      return self.cached_process_tile
+    return self.process_tile
+
+  def raw_tile(self, tile_y, tile_x):
+    """Get the rgb bytes of the tile, or None if it overruns the image."""
+    pixel_y = tile_y * TILE_SIZE
+    pixel_x = tile_x * TILE_SIZE
+    if pixel_y + TILE_SIZE > self.image_y or pixel_x + TILE_SIZE > self.image_x:
+      return None
+    stride = self.image_x * 3
+    start = pixel_y * stride + pixel_x * 3
+    data = self._raw
+    return b''.join([data[start + i * stride:start + i * stride + TILE_SIZE * 3]
+                     for i in range(TILE_SIZE)])
+
+  def cached_process_tile(self, tile_y, tile_x):
+    """Process the tile, reusing the result if its pixels were seen before.
+
+    Results are kept for the tiles of this image and the previous one, keyed
+    by their raw pixels. Tiles with errors are never kept, since their errors
+    depend upon their position.
+    """
+    raw = self.raw_tile(tile_y, tile_x)
+    if raw is None:
+      return self.process_tile(tile_y, tile_x)
+    found = self._tile_results.get(raw)
+    if found is None:
+      found = self._prev_tile_results.get(raw)
+    if found is None:
+      (color_needs, dot_profile) = self.process_tile(tile_y, tile_x)
+      found = (bytes(color_needs), bytes(dot_profile))
+    self._tile_results[raw] = found
+    return bytearray(found[0]), bytearray(found[1])
+
   def tile_palette_fault(self, tile_y, tile_x):
     raise errors.PaletteOverflowError(tile_y, tile_x)
 
@@ -242,7 +398,7 @@ class ImageProcessor(object):
     block_color_needs = bytearray([NULL, NULL, NULL, NULL])
     y = block_y * 2
     x = block_x * 2
-    process_tile_func = self.process_tile
+    process_tile_func = self.get_process_tile_func()
     combine_color_needs_func = self.combine_color_needs
     if is_sprite:
       combine_color_needs_func = self.null_func
@@ -271,7 +427,7 @@ class ImageProcessor(object):
       self._artifacts[y][x][ARTIFACT_BCID] = bcid
 
   def filter_process_tile(self, tile_y, tile_x, bg_mask, bg_fill):
-    (color_needs, dot_profile) = self.process_tile(tile_y, tile_x)
+    (color_needs, dot_profile) = self.get_process_tile_func()(tile_y, tile_x)
     for i in range(len(color_needs)):
       if color_needs[i] == bg_mask:
         color_needs[i] = bg_fill
@@ -436,11 +592,19 @@ class ImageProcessor(object):
     if bg_color is not None:
       guesser.set_bg_color(bg_color)
     color_sets = self._needs_provider.elems()
+    # Reuse the previous palette if the color needs haven't changed.
+    key = None
+    if self.incremental:
+      key = (bg_color, [list(e) for e in color_sets])
+      if self._palette_result and self._palette_result[0] == key:
+        return copy.deepcopy(self._palette_result[1])
     try:
       pal = guesser.guess_palette(color_sets)
     except (errors.PaletteTooManySubsets, errors.TooManyPalettesError) as e:
       self._err.add(e)
       return None
+    if key is not None:
+      self._palette_result = (key, copy.deepcopy(pal))
     return pal
 
   def is_subset_of_one_of(self, needle, haystack):
@@ -465,7 +629,7 @@ class ImageProcessor(object):
         if self.is_subset_of_one_of(block_color_needs, e.colors):
           continue
         if self.is_subset_of_one_of(block_color_needs, e.to_merge):
-          e.list_blocks.append([block_y, block_x])
+          self._err.add_block(e, block_y, block_x)
 
   def process_to_artifacts(self, bg_mask, bg_fill, config):
     """Process the image and store data in the artifact table.
@@ -478,6 +642,7 @@ class ImageProcessor(object):
     config: Configuration of ppu_memory
     """
     for block_y in range(self.blocks_y):
+      self.check_cancelled()
       for block_x in range(self.blocks_x):
         try:
           self.process_block(block_y, block_x, bg_mask, bg_fill,
@@ -631,6 +796,32 @@ class ImageProcessor(object):
     allow_overflow: Characters representing components. Only 'c' and 's'
         are supported.
     """
+    if self.incremental:
+      run_key = (img.mode, img.size, img.convert('RGB').tobytes(),
+                 img.getpalette() if img.palette else None, palette_text,
+                 bg_color_mask, bg_color_fill, platform, traversal, is_sprite,
+                 is_locked_tiles, lock_sprite_flips,
+                 tuple(allow_overflow or []))
+      if run_key == self._run_key:
+        # Same image and settings as last time, ppu memory is already built.
+        return
+      if self._run_key is None:
+        # The previous run didn't finish, so keep everything seen before it.
+        self._prev_tile_results.update(self._tile_results)
+      else:
+        self._prev_tile_results = self._tile_results
+      self._tile_results = {}
+      self._run_key = None
+    self.build_ppu_memory(img, palette_text, bg_color_mask, bg_color_fill,
+                          platform, traversal, is_sprite, is_locked_tiles,
+                          lock_sprite_flips, allow_overflow)
+    if self.incremental:
+      self._run_key = run_key
+
+  def build_ppu_memory(self, img, palette_text, bg_color_mask, bg_color_fill,
+                       platform, traversal, is_sprite, is_locked_tiles,
+                       lock_sprite_flips, allow_overflow):
+    """Build ppu memory for the image, see process_image for arguments."""
     self.initialize()
     self.load_image(img)
     self.set_platform(platform)
@@ -653,6 +844,7 @@ class ImageProcessor(object):
     self.process_to_artifacts(bg_color_mask, bg_color_fill, config)
     if self._err.has():
       return
+    self.check_cancelled()
     # Make the palette, if it doesn't already exist.
     if not pal:
       pal = self.make_palette(bg_color_fill, config.is_sprite)
@@ -665,10 +857,12 @@ class ImageProcessor(object):
       self._ppu_memory.palette_spr = pal
     # Replace mask with fill.
     self.replace_mask_with_fill(bg_color_mask, bg_color_fill)
+    self.check_cancelled()
     # Make colorization for each block and tile.
     self.make_colorization(pal, config)
     if self._err.has():
       return
+    self.check_cancelled()
     # Traverse the artifacts, building chr and other ppu_memory.
     self.traverse_artifacts(traversal, pal, config)
     if self._err.has():
@@ -0,0 +1,106 @@
+import app
+import bg_color_spec
+import component_serializer
+import copy
+from PIL import Image
+
+
+class Options(object):
+  """Options for processing an image, matching the command-line flags.
+
+  palette: Palette text, as accepted by -p.
+  bg_color: Background color, either text as accepted by -b, or a BgColorSpec.
+  is_sprite: Sprite mode, same as -s.
+  decompose_sprites: Decompose sprite mode, same as -ds.
+  is_locked_tiles: Lock tiles, same as -l.
+  lock_sprite_flips: Lock sprite flip flags, same as --lock-sprite-flips.
+  traversal_strategy: Traversal strategy name, same as -t.
+  order: Chr order, either 0 or 1, same as -r.
+  allow_overflow: List of components that may overflow, like ['c', 's'].
+  platform: Platform name, same as --platform.
+  vertical_pixel_display: Store chr for vertical displays.
+  select_chr_plane: Only output this plane of chr, either '0' or '1'.
+  rgb_mapping: Name of the rgb mapping, same as --rgb-mapping.
+  """
+
+  def __init__(self, palette=None, bg_color=None, is_sprite=False,
+               decompose_sprites=False, is_locked_tiles=False,
+               lock_sprite_flips=False, traversal_strategy=None, order=None,
+               allow_overflow=None, platform=None, vertical_pixel_display=False,
+               select_chr_plane=None, rgb_mapping=None):
+    if bg_color is None:
+      bg_color = bg_color_spec.default()
+    elif not isinstance(bg_color, bg_color_spec.BgColorSpec):
+      bg_color = bg_color_spec.build(bg_color)
+    self.palette = palette
+    self.bg_color = bg_color
+    self.is_sprite = is_sprite
+    self.decompose_sprites = decompose_sprites
+    self.is_locked_tiles = is_locked_tiles
+    self.lock_sprite_flips = lock_sprite_flips
+    self.traversal_strategy = traversal_strategy
+    self.order = order
+    self.allow_overflow = allow_overflow or []
+    self.platform = platform
+    self.vertical_pixel_display = vertical_pixel_display
+    self.select_chr_plane = select_chr_plane
+    self.rgb_mapping = rgb_mapping
+    # Debug views are never rendered by the library.
+    self.rect_cover_anon_view = None
+    self.rect_cover_steps_view = None
+    self.verbose = False
+
+
+class Result(object):
+  """Result of processing an image.
+
+  ppu_memory: The processed PpuMemory, or None if processing failed early.
+  errors: List of errors found while processing.
+  components: Dict from component name to its bytes, as they would be written
+      to a binary file by the command-line. Empty if there were errors.
+  """
+
+  def __init__(self, ppu_memory, errors, components):
+    self.ppu_memory = ppu_memory
+    self.errors = errors
+    self.components = components
+
+  def has_errors(self):
+    return len(self.errors) > 0
+
+  def get(self, name):
+    """Get the bytes for the component, or None if it was not output."""
+    return self.components.get(name)
+
+
+def process(image, options=None):
+  """Process a pixel art image in memory, without writing any files.
+
+  Raises errors.CommandLineArgError if the options are invalid, same as the
+  command-line tool would report, or errors.UnknownRgbMapping if there is no
+  such rgb mapping.
+
+  image: Either a PIL Image or a filename of an image.
+  options: Options for processing, defaults to Options().
+  """
+  if options is None:
+    options = Options()
+  # Processing may modify options, such as forcing sprite mode, so use a copy.
+  args = copy.copy(options)
+  if not isinstance(image, Image.Image):
+    image = Image.open(image)
+  application = app.Application()
+  traversal = application.get_traversal(args.traversal_strategy)
+  processor = application.process_image(image, args, traversal)
+  mem = processor.ppu_memory()
+  if processor.err().has():
+    return Result(mem, processor.err().get(), {})
+  config = application.build_config(args, traversal, args.platform)
+  if args.vertical_pixel_display:
+    mem.chr_set.vertical_pixel_display()
+  serializer = component_serializer.ComponentSerializer(mem)
+  enabled = mem.get_enabled_components(config)
+  components = {}
+  for component in serializer.components(config, enabled):
+    components[component.name] = component.extracted()
+  return Result(mem, [], components)
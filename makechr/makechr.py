@@ -1,11 +1,16 @@
-import app
 import argparse
 import bg_color_spec
 import errno
 import errors
 import os
-from PIL import Image
+import rgb
 import sys
+import valiant_archive
+
+
+# Imported when first needed, so that starting up is quick.
+app = None
+Image = None
 
 
 __version__ = '1.5'
@@ -28,9 +33,9 @@ def allow_overflow_build(text):
 
 def is_valiant(filename):
   fp = open(filename, 'rb')
-  content = fp.read()
+  magic = fp.read(len(b'(VALIANT)'))
   fp.close()
-  return content.startswith(b'(VALIANT)')
+  return magic == b'(VALIANT)'
 
 
 class BlankLineFormatter(argparse.RawDescriptionHelpFormatter):
@@ -66,12 +71,34 @@ def main():
                             'an image file to render. A template needs to '
                             'have "%%s" in it. An object file needs to end in '
                             '".o". An image file needs to end in ".png". See '
-                            'valiant.proto for the format of object files.'))
+                            'valiant.proto for the format of object files. '
+                            'An archive of object files needs to end in '
+                            '".vla", and also needs --module.'))
+
+  parser.add_argument('--module', dest='module', metavar='name',
+                      help=('Name of the module inside of a valiant archive, '
+                            'either to add or replace when outputting, or to '
+                            'read when the input is an archive.'))
 
   parser.add_argument('-c', dest='compile', metavar='rom',
                       help=('Create an NES rom file that just displays the '
                             'original iamge.'))
 
+  parser.add_argument('--write-if-changed', dest='write_if_changed',
+                      action='store_true',
+                      help=('Only write output files whose content has '
+                            'changed, replacing them atomically. Unchanged '
+                            'files keep their modification time, so that '
+                            'build tools do not rebuild things that depend '
+                            'on them. Shows how many files were unchanged.'))
+
+  parser.add_argument('--watch', dest='watch', action='store_true',
+                      help=('Keep running, and build again each time the '
+                            'input image changes, showing how long each '
+                            'build takes. Only tiles that changed are '
+                            'processed again. Implies --write-if-changed. '
+                            'Press Ctrl-C to stop.'))
+
   parser.add_argument('-e', dest='error_outfile', metavar='image',
                       help=('Output filename for image if there are any '
                             'errors.'))
@@ -115,6 +142,22 @@ def main():
                             'The result is chr, palette, and json representing '
                             'how to compose the original input picture.'))
 
+  parser.add_argument('--frame-grid', dest='frame_grid', metavar='size',
+                      help=('With -ds, decompose an animation sheet, split '
+                            'into a grid of frames this size, such as '
+                            '"32x32", left to right, top to bottom. Frames '
+                            'are decomposed in parallel, and share a single '
+                            'chr and palette. The picdata has a list of '
+                            'pictures for each frame.'))
+
+  parser.add_argument('--frame', dest='frame', metavar='image',
+                      action='append',
+                      help=('With -ds, another frame of an animation, '
+                            'after the input image. Can be given many times. '
+                            'All frames share a single chr and palette, the '
+                            'same as --frame-grid, which also splits each '
+                            'of these images if given.'))
+
   # Flags.
   parser.add_argument('-l', dest='is_locked_tiles', action='store_true',
                       help=('Lock tiles in the pixel art so that they appear '
@@ -255,15 +298,43 @@ def main():
                             'about rectilinear covering\'s algorithm steps '
                             'on top of it.'))
 
+  parser.add_argument('--jobs', dest='jobs', metavar='num', type=int,
+                      help=('Number of threads used to render views, and '
+                            'processes used to decompose animation frames. '
+                            'Defaults to the number of cpus. Use --verbose '
+                            'to show how long each view takes.'))
+
   parser.add_argument('--use-legacy-views', dest='use_legacy_views',
                       action="store_true",
                       help=('Views created using legacy styles. Default is '
                             'false.'))
   args = parser.parse_args()
+  if args.rgb_mapping:
+    try:
+      rgb.get_mapping(args.rgb_mapping)
+    except errors.UnknownRgbMapping as e:
+      sys.stderr.write('%s\n' % e)
+      sys.exit(1)
   if args.version:
     sys.stdout.write('makechr ' + __version__ + '\n')
     sys.exit(0)
+  global app
+  if not app:
+    import app
   application = app.Application()
+  if args.watch and (args.memimport or not args.input or
+                     (os.path.isfile(args.input) and
+                      (is_valiant(args.input) or
+                       valiant_archive.is_archive(args.input)))):
+    sys.stderr.write('Command-line error: --watch needs an input image\n')
+    sys.exit(1)
+  if (args.frame_grid or args.frame) and not args.decompose_sprites:
+    sys.stderr.write('Command-line error: animation frames need -ds\n')
+    sys.exit(1)
+  for filename in args.frame or []:
+    if not os.path.isfile(filename):
+      sys.stderr.write('File not found: "%s"\n' % filename)
+      sys.exit(1)
   if args.memimport and args.input:
     sys.stderr.write('Cannot both import memory and process input file')
     sys.exit(1)
@@ -277,7 +348,16 @@ def main():
     sys.exit(1)
   elif args.input and is_valiant(args.input):
     application.read_memory(args.input, 'valiant', args)
+  elif args.input and valiant_archive.is_archive(args.input):
+    try:
+      application.read_memory(args.input, 'archive', args)
+    except (errors.CommandLineArgError, errors.ValiantFormatError) as e:
+      sys.stderr.write('Command-line error: %s\n' % e)
+      sys.exit(1)
   elif args.input:
+    global Image
+    if not Image:
+      from PIL import Image
     try:
       img = Image.open(args.input)
     except IOError as e:
@@ -289,7 +369,9 @@ def main():
         sys.stderr.write('Directory does not exist: "%s"\n' % args.output)
         sys.exit(1)
     try:
-      if not application.run(img, args):
+      if args.watch:
+        application.watch(args.input, args)
+      elif not application.run(img, args):
         sys.exit(1)
     except errors.CommandLineArgError as e:
       sys.stderr.write('Command-line error: %s\n' % e)
@@ -1,3 +1,4 @@
+import changed_file_writer
 import errors
 import image_processor
 import gen.valiant_pb2 as valiant
@@ -8,11 +9,13 @@ MAGIC_NUM = 7210303610482106886
 
 
 class MakepalProcessor(object):
-  def process_image(self, img, args):
+  def process_image(self, img, args, rgb_mapping=None):
     self._err = errors.ErrorCollector()
     self.width, self.height = img.size
     self.pixels = img.load()
     self.base = image_processor.ImageProcessor()
+    if rgb_mapping:
+      self.base.set_rgb_mapping(rgb_mapping)
     self.base.pixels = self.pixels
     try:
       self.unit_size = self._find_unit_size()
@@ -104,12 +107,11 @@ class MakepalProcessor(object):
     binary.bin = bytes(self.pal.to_bytes())
     return obj
 
-  def create_output(self, out_file):
+  def create_output(self, out_file, file_writer=None):
     if out_file.endswith('.bin') or out_file.endswith('.dat'):
       serialized = self.pal.to_bytes()
     else:
       obj = self._build_vobject(self.pal)
       serialized = obj.SerializeToString()
-    fp = open(out_file, 'wb')
-    fp.write(serialized)
-    fp.close()
+    file_writer = file_writer or changed_file_writer.ChangedFileWriter()
+    file_writer.write(out_file, serialized)
@@ -1,5 +1,6 @@
 import chr_data
 import errors
+import mmap
 import os
 import palette
 import ppu_memory
@@ -7,134 +8,105 @@ import sys
 from constants import *
 
 
-asbyte = lambda n: n
 if sys.version_info < (3,0):
   range = xrange
-  asbyte = ord
+else:
+  basestring = str
+
+
+RAM_SIZE = 0x4000
 
 
 class MemoryImporter(object):
-  def read(self, filename, kind):
+  def read(self, filename, kind, module=None):
     if kind == 'ram':
       return self.read_ram(filename)
     elif kind == 'valiant':
       return self.read_valiant(filename)
+    elif kind == 'archive':
+      return self.read_archive(filename, module)
     raise errors.UnknownMemoryKind(kind)
 
   def read_ram(self, filename):
-    # Check file size
     with open(filename, 'rb') as fp:
       file_size = os.fstat(fp.fileno()).st_size
-      if file_size != 0x4000:
-        raise errors.FileFormatError(file_size, size=0x4000)
-      mem = ppu_memory.PpuMemory()
-      mem.allocate_num_pages(2)
-      # Read CHR from $0000-$2000
-      mem.chr_set = chr_data.ChrBank.from_binary(fp.read(0x2000))
-      # TODO: Handle chr order (background / sprite at $0000 / $1000).
-      # For each graphics page, read nametable & attribute.
-      for loop_num in range(2):
-        gfx = mem.gfx[0] if not loop_num else mem.gfx[1]
-        if loop_num == 1:
-          # Skip $2400-$2c00
-          fp.read(0x800)
-        # Read nametable from $2000-$23c0 & $2c00-$2fc0.
-        # TODO: Handle mirroring.
-        for y in range(30):
-          for x in range(32):
-            gfx.nametable[y][x] = asbyte(fp.read(1)[0])
-        # Read attributes from $23c0-$2400 & $2fc0-$3000.
-        for k in range(64):
-          byte = asbyte(fp.read(1)[0])
-          y = (k // 8) * 4
-          x = (k % 8) * 4
-          gfx.colorization[y + 0][x + 0] = (byte & 0x03)
-          gfx.colorization[y + 0][x + 2] = (byte & 0x0c) >> 2
-          if y < (7 * 4):
-            gfx.colorization[y + 2][x + 0] = (byte & 0x30) >> 4
-            gfx.colorization[y + 2][x + 2] = (byte & 0xc0) >> 6
-      # Unused $3000-$3f00.
-      unused = fp.read(0x0f00)
-      # Read palette $3f00.
-      mem.palette_nt = palette.Palette()
-      mem.palette_spr = palette.Palette()
-      # Two palettes, first for nametable, then for palette.
-      bg_color = None
-      pal = mem.palette_nt
-      for loop_num in range(2):
-        pal = mem.palette_nt if not loop_num else mem.palette_spr
-        for k in range(4):
-          opt = [asbyte(p) for p in fp.read(4)]
-          if bg_color is None:
-            bg_color = opt[0]
-          pal.set_bg_color(bg_color)
-          pal.add(opt)
+      if file_size != RAM_SIZE:
+        raise errors.FileFormatError(file_size, size=RAM_SIZE)
+      data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+      try:
+        return self.decode_ram(data)
+      finally:
+        data.close()
+
+  def read_ram_all(self, sources):
+    """Read many ram dumps, yielding pairs of (filename, ppu memory).
+
+    Dumps are read one at a time, so that only one is in memory at once.
+
+    sources: Either a directory containing dumps, or a list of filenames. Files
+        in a directory that are not the size of a dump are skipped.
+    """
+    if isinstance(sources, basestring) and os.path.isdir(sources):
+      sources = [os.path.join(sources, f) for f in sorted(os.listdir(sources))]
+      sources = [f for f in sources if os.path.isfile(f) and
+                 os.path.getsize(f) == RAM_SIZE]
+    for filename in sources:
+      yield (filename, self.read_ram(filename))
+
+  def decode_ram(self, data):
+    """Decode a ram dump, from a buffer that holds all of ppu memory.
+
+    data: Buffer of 0x4000 bytes, such as bytes or a memory map.
+    """
+    mem = ppu_memory.PpuMemory()
+    mem.allocate_num_pages(2)
+    # Read CHR from $0000-$2000
+    # TODO: Handle chr order (background / sprite at $0000 / $1000).
+    mem.chr_set = chr_data.ChrBank.from_binary(bytes(data[0:0x2000]))
+    # For each graphics page, read nametable & attribute. Nametables are at
+    # $2000-$23c0 & $2c00-$2fc0, attributes at $23c0-$2400 & $2fc0-$3000.
+    # TODO: Handle mirroring.
+    for gfx, addr in zip(mem.gfx, [0x2000, 0x2c00]):
+      gfx.fill_nametable(data[addr:addr + 0x3c0])
+      gfx.fill_attribute(data[addr + 0x3c0:addr + 0x400])
+    # Read palette $3f00. Two palettes, first for nametable, then for sprites.
+    pal_bin = bytearray(data[0x3f00:0x3f20])
+    bg_color = pal_bin[0]
+    mem.palette_nt = palette.Palette()
+    mem.palette_spr = palette.Palette()
+    for n, pal in enumerate([mem.palette_nt, mem.palette_spr]):
+      pal.set_bg_color(bg_color)
+      for k in range(4):
+        addr = n * 0x10 + k * 4
+        pal.add(list(pal_bin[addr:addr + 4]))
     return mem
 
   def read_valiant(self, filename):
-    import gen.valiant_pb2 as valiant
-    fp = open(filename, 'rb')
-    content = fp.read()
-    fp.close()
+    import valiant_reader
+    with valiant_reader.ValiantReader(filename) as reader:
+      return self._read_from_reader(reader)
+
+  def read_archive(self, filename, module=None):
+    """Read a module from a valiant archive.
+
+    filename: Name of the archive.
+    module: Name of the module, can be omitted if there is only one.
+    """
+    import valiant_archive
+    archive = valiant_archive.ValiantArchive(filename)
+    if module is None:
+      names = archive.names()
+      if len(names) != 1:
+        raise errors.CommandLineArgError(
+          'archive has %d modules, pick one with --module' % len(names))
+      module = names[0]
+    with archive.reader(module) as reader:
+      return self._read_from_reader(reader)
+
+  def _read_from_reader(self, reader):
     mem = ppu_memory.PpuMemory()
     mem.allocate_num_pages(2)
-    obj_file = valiant.ObjectFile()
-    obj_file.ParseFromString(content)
-    binary_map = {}
-    for packet in obj_file.body.packets:
-      if packet.role == valiant.CHR:
-        binary_map['chr'] = packet.binary
-      if packet.role == valiant.NAMETABLE:
-        binary_map['nametable'] = packet.binary
-      if packet.role == valiant.ATTRIBUTE:
-        binary_map['attribute'] = packet.binary
-      if packet.role == valiant.PALETTE:
-        binary_map['palette'] = packet.binary
-    chr_bin = self._expand_binary(binary_map['chr'])
-    nt_bin = self._expand_binary(binary_map['nametable'])
-    at_bin = self._expand_binary(binary_map['attribute'])
-    pal_bin = self._expand_binary(binary_map['palette'])
-    # Parse chr data.
-    mem.chr_set = chr_data.ChrBank.from_binary(bytes(bytearray(chr_bin)))
-    # Parse nametable data.
-    for y in range(30):
-      for x in range(32):
-        mem.gfx[0].nametable[y][x] = nt_bin[y*32 + x]
-    # Parse attributes data.
-    for a in range(64):
-      p0 = (at_bin[a] >> 0) & 0x03
-      p1 = (at_bin[a] >> 2) & 0x03
-      p2 = (at_bin[a] >> 4) & 0x03
-      p3 = (at_bin[a] >> 6) & 0x03
-      y = (a // 8) * 4
-      x = (a % 8) * 4
-      mem.gfx[0].colorization[y + 0][x + 0] = p0
-      mem.gfx[0].colorization[y + 0][x + 2] = p1
-      if y < (7 * 4):
-        mem.gfx[0].colorization[y + 2][x + 0] = p2
-        mem.gfx[0].colorization[y + 2][x + 2] = p3
-    # Parse palette data.
-    pal = palette.Palette()
-    pal.set_bg_color(pal_bin[0])
-    for i in range(4):
-      p = []
-      for j in range(4):
-        p.append(pal_bin[i*4 + j])
-      pal.add(p)
-    mem.palette_nt = pal
+    mem.chr_set = reader.chr_set()
+    reader.fill_graphics_page(mem.gfx[0])
+    mem.palette_nt = reader.palette()
     return mem
-
-  def _expand_binary(self, binary, req_align=0):
-    prepad = binary.pre_pad if binary.pre_pad else None
-    padding = binary.padding if binary.padding else None
-    nullval = binary.null_value if binary.null_value else 0
-    if req_align:
-      size = (prepad or 0) + len(binary.bin) + (padding or 0)
-      padding = (padding or 0) + req_align - size
-    bytes = bytearray()
-    if prepad is not None:
-      bytes += bytearray([nullval] * prepad)
-    bytes += binary.bin
-    if padding is not None:
-      bytes += bytearray([nullval] * padding)
-    return bytes
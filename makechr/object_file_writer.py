@@ -1,26 +1,10 @@
+import changed_file_writer
 import gen.valiant_pb2 as valiant
-from io import BytesIO
 
 
 MAGIC_NUM = 7210303610482106886
 
 
-class DataInfo(object):
-  def __init__(self):
-    self.clear()
-
-  def clear(self):
-    self.name = None
-    self.align = None
-    self.size = None
-    self.order = None
-    self.null_value = None
-    self.is_condensable = False
-
-  def empty(self):
-    return self.name is None
-
-
 class ObjectFileWriter(object):
   """Creates a valiant object file from ppu memory.
 
@@ -34,31 +18,10 @@ class ObjectFileWriter(object):
     self.file_obj.magic1 = MAGIC_NUM % 100
     self.file_obj.magic2 = MAGIC_NUM // 100
     self.obj_body = self.file_obj.body
-    self.buffer = None
-    self.info = DataInfo()
-    self.component_req = {}
-
-  def get_writable(self, name, is_condensable):
-    if not self.info.empty():
-      self.add_component(self.buffer.getvalue(), self.info)
-    self.buffer = BytesIO()
-    self.info.clear()
-    self.info.name = name
-    self.info.is_condensable = is_condensable
-    return self.buffer
-
-  def close(self):
-    if not self.info.empty():
-      self.add_component(self.buffer.getvalue(), self.info)
-      self.info.clear()
-
-  def configure(self, null_value=None, size=None, order=None, align=None,
-                extract=None):
-    self.info.null_value = null_value
-    self.info.size = size
-    self.info.order = order
-    self.info.align = align
-    self.component_req[self.info.name] = extract
+
+  def write_component(self, component):
+    """Add the component to the valiant object as a packet."""
+    self.add_component(component.data, component)
 
   def write_module(self, module_name):
     """Write the module name to the valiant object."""
@@ -90,24 +53,26 @@ class ObjectFileWriter(object):
       palette_metadata = self._get_palette_metadata()
       palette_metadata.order = 1
 
-  def add_component(self, bytes, info):
-    pad_size = info.size - len(bytes) if (info.size is not None) else None
-    if info.is_condensable:
-      pre_pad, padding, bytes = self._condense(bytes, info.align, pad_size)
+  def add_component(self, bytes, component):
+    size = component.size
+    pad_size = size - len(bytes) if (size is not None) else None
+    if component.is_condensable:
+      pre_pad, padding, bytes = self._condense(bytes, component.align,
+                                               pad_size)
     else:
       pre_pad = padding = 0
-    role = valiant.DataRole.Value(self._strip_num_suffix(info.name.upper()))
-    binary = valiant.DirectBinary()
+    role = valiant.DataRole.Value(
+      self._strip_num_suffix(component.name.upper()))
+    packet = self.obj_body.packets.add()
+    packet.role = role
+    binary = packet.binary
     binary.bin = bytes
-    if info.null_value:
-      binary.null_value = info.null_value
+    if component.null_value:
+      binary.null_value = component.null_value
     if pre_pad is not None:
       binary.pre_pad = pre_pad
     if padding is not None:
       binary.padding = padding
-    packet = self.obj_body.packets.add()
-    packet.role = role
-    packet.binary.CopyFrom(binary)
 
   def _strip_num_suffix(self, text):
     while text and text[-1].isdigit():
@@ -151,8 +116,10 @@ class ObjectFileWriter(object):
         return packet.metadata.palette_metadata
     raise RuntimeError('Could not find PALETTE packet')
 
-  def save(self, filename):
-    serialized = self.file_obj.SerializeToString()
-    fp = open(filename, 'wb')
-    fp.write(serialized)
-    fp.close()
+  def serialize(self):
+    return self.file_obj.SerializeToString()
+
+  def save(self, filename, file_writer=None):
+    serialized = self.serialize()
+    file_writer = file_writer or changed_file_writer.ChangedFileWriter()
+    file_writer.write(filename, serialized)
@@ -1,31 +1,118 @@
 import errors
+import pixel_mask
 import region_perimeter
 from direction_constants import *
 import sys
 
 
+if sys.version_info < (3,0):
+  range = xrange
+
+
 class OutlineTracer(object):
-  def __init__(self, height, width, is_clear_func):
+  """Finds regions of opaque pixels, and traces the outline of each.
+
+  height: Height of the image.
+  width: Width of the image.
+  is_clear_func: Function of (y, x), whether that pixel is clear. Only used
+      to build the mask if one is not given.
+  mask: Optional PixelMask of the image.
+  """
+
+  def __init__(self, height, width, is_clear_func=None, mask=None):
     self.height = height
     self.width = width
-    self.is_clear_func = is_clear_func
+    if mask is None:
+      mask = pixel_mask.PixelMask.from_func(height, width, is_clear_func)
+    self.mask = mask
+    # For each direction, the moves to try in order: left, forward, right.
+    # Each is the new direction, the change in y and x, and the change in
+    # the mask's index.
+    self._moves = {}
+    for dir in ALL_DIRS:
+      self._moves[dir] = []
+      for next_dir in [rotate_dir_counter_cw(dir), dir, rotate_dir_cw(dir)]:
+        dy, dx = self.move_at(next_dir, 0, 0)
+        self._moves[dir].append((next_dir, dy, dx, dy * mask.stride + dx))
 
   def find_regions(self):
+    """Find each region of connected opaque pixels, tracing its outline.
+
+    Regions are in order of their first pixel, scanning the image from the
+    top, left to right.
+    """
     regions = []
-    for y in range(self.height):
-      for x in range(self.width):
-        if self.is_in_region(regions, y, x):
-          continue
-        if self.is_clear_func(y, x):
-          continue
-        regions.append(self.create_new_region(y, x))
+    for y, x in self.find_starts():
+      regions.append(self.create_new_region(y, x))
     return regions
 
-  def is_in_region(self, regions, y, x):
-    for r in regions:
-      if r.contains(y, x):
-        return True
-    return False
+  def find_starts(self):
+    """The first pixel of each region, where tracing its outline begins."""
+    starts = []
+    seen = set()
+    for y, x0, unused_x1, label in self.label_runs():
+      if not label in seen:
+        seen.add(label)
+        starts.append((y, x0))
+    return starts
+
+  def label_runs(self):
+    """Label each run of opaque pixels by which region it belongs to.
+
+    Runs in neighboring rows that share a column are connected. Labels are
+    merged using union-find, so the image only needs to be scanned once.
+    Returns a list of runs, each [y, x0, x1, label], in scan order.
+    """
+    parent = []
+    runs = []
+    prev = []
+    for y in range(self.height):
+      curr = []
+      k = 0
+      for x0, x1 in self.find_runs(y):
+        # Runs in the previous row that end before this one can't touch it,
+        # or any run after it.
+        while k < len(prev) and prev[k][1] <= x0:
+          k += 1
+        label = None
+        j = k
+        while j < len(prev) and prev[j][0] < x1:
+          other = self._find_root(parent, prev[j][2])
+          if label is None:
+            label = other
+          elif other != label:
+            label, other = min(label, other), max(label, other)
+            parent[other] = label
+          j += 1
+        if label is None:
+          label = len(parent)
+          parent.append(label)
+        curr.append((x0, x1, label))
+        runs.append([y, x0, x1, label])
+      prev = curr
+    for run in runs:
+      run[3] = self._find_root(parent, run[3])
+    return runs
+
+  def find_runs(self, y):
+    """Runs of opaque pixels in row y, as (x0, x1) with x1 exclusive."""
+    runs = []
+    row = self.mask.row(y)
+    x = row.find(b'\x01')
+    while x != -1:
+      end = row.find(b'\x00', x)
+      if end == -1:
+        runs.append((x, self.width))
+        break
+      runs.append((x, end))
+      x = row.find(b'\x01', end)
+    return runs
+
+  def _find_root(self, parent, label):
+    while parent[label] != label:
+      parent[label] = parent[parent[label]]
+      label = parent[label]
+    return label
 
   def create_new_region(self, y, x):
     try:
@@ -53,37 +140,14 @@ class OutlineTracer(object):
     return region
 
   def get_move(self, dir, y, x):
-    m = self.turn_left(dir, y, x)
-    if m:
-      return m[0], m[1], m[2]
-    m = self.go_forward(dir, y, x)
-    if m:
-      return m[0], m[1], m[2]
-    m = self.turn_right(dir, y, x)
-    if m:
-      return m[0], m[1], m[2]
+    """Move along the outline, keeping clear pixels on the left."""
+    data = self.mask.data
+    pos = self.mask.index(y, x)
+    for next_dir, dy, dx, offset in self._moves[dir]:
+      if data[pos + offset]:
+        return next_dir, y + dy, x + dx
     raise errors.AlgorithmError('Stuck, cannot move at %sy, %sx' % (y, x))
 
-  def turn_left(self, dir, y, x):
-    dir = rotate_dir_counter_cw(dir)
-    next_y, next_x = self.move_at(dir, y, x)
-    if self.is_clear_func(next_y, next_x):
-      return None
-    return dir, next_y, next_x
-
-  def turn_right(self, dir, y, x):
-    dir = rotate_dir_cw(dir)
-    next_y, next_x = self.move_at(dir, y, x)
-    if self.is_clear_func(next_y, next_x):
-      return None
-    return dir, next_y, next_x
-
-  def go_forward(self, dir, y, x):
-    next_y, next_x = self.move_at(dir, y, x)
-    if self.is_clear_func(next_y, next_x):
-      return None
-    return dir, next_y, next_x
-
   def move_at(self, dir, y, x):
     if dir == DIR_UP:
       return y - 1, x
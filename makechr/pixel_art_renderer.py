@@ -1,26 +1,103 @@
 from PIL import Image
+import png_strip_writer
 import rgb
+import sys
+from constants import *
+
+
+if sys.version_info < (3,0):
+  range = xrange
 
 
 class PixelArtRenderer(object):
+  """Renders ppu memory back into pixel art.
+
+  Each graphics page is a screen, laid out the same way as the map that the
+  ppu memory was made from. Each row of screens is built as a single 'P' mode
+  image. Each pixel's index is its palette option times 4 plus its chr pixel
+  value, so the image's palette is just the 16 colors of the nametable
+  palette. Rows of indexes are cached for each distinct pair of chr tile and
+  palette option.
+
+  rgb_mapping: Mapping from nes colors to RGB, defaults to rgb.get_mapping().
+  """
+
+  def __init__(self, rgb_mapping=None):
+    self.rgb_mapping = rgb_mapping or rgb.get_mapping()
+
   def render(self, mem):
-    img = Image.new('RGB', (256, 240), 'white')
-    for y in range(30):
-      for x in range(32):
-        nt_num = mem.gfx[0].nametable[y][x]
-        tile = mem.chr_set.get(nt_num)
-        attr = mem.gfx[0].colorization[y & 0xfe][x & 0xfe]
-        pal = mem.palette_nt.get(attr)
-        pixels = self.create_pixels(tile, pal)
-        img.paste(pixels, (x*8, y*8, x*8+8, y*8+8))
-    return img
-
-  def create_pixels(self, tile, pal):
-    make = Image.new('RGB', (8, 8), 'white')
-    pixels = make.load()
-    for i in range(8):
-      for j in range(8):
-        nc = pal[tile.get_pixel(i, j)]
-        col = rgb.RGB_COLORS[nc]
-        pixels[j,i] = (col // 0x10000, (col // 0x100) % 0x100, col % 0x100)
+    """Render every graphics page, in screen layout, as one rgb image."""
+    width, height = self.size(mem)
+    img = Image.new('P', (width, height))
+    img.putpalette(self.create_palette(mem.palette_nt))
+    tile_rows = {}
+    for screen_y in range(mem.screen_y):
+      strip = self.render_strip(mem, screen_y, tile_rows)
+      img.paste(strip, (0, screen_y * HEIGHT))
+    return img.convert('RGB')
+
+  def render_png(self, mem, fout):
+    """Render every graphics page, writing a PNG one row of screens at a time.
+
+    Only one row of screens is held in memory at once, so that very large
+    maps can be rendered without building the whole rgb image.
+
+    mem: Ppu memory to render.
+    fout: File object to write the PNG to.
+    """
+    width, height = self.size(mem)
+    pal = self.create_palette(mem.palette_nt)
+    writer = png_strip_writer.PngStripWriter(fout, width, height)
+    tile_rows = {}
+    for screen_y in range(mem.screen_y):
+      strip = self.render_strip(mem, screen_y, tile_rows)
+      strip.putpalette(pal)
+      writer.write_strip(strip.convert('RGB').tobytes())
+    writer.close()
+
+  def size(self, mem):
+    """Size of the rendered image, in pixels."""
+    return (mem.screen_x * WIDTH, mem.screen_y * HEIGHT)
+
+  def render_strip(self, mem, screen_y, tile_rows):
+    """Render a row of screens as a 'P' image, without its palette.
+
+    mem: Ppu memory to render.
+    screen_y: Which row of screens to render.
+    tile_rows: Cache of rows of indexes, shared between strips.
+    """
+    pages = mem.gfx[screen_y * mem.screen_x:(screen_y + 1) * mem.screen_x]
+    lines = []
+    for y in range(NUM_TILES_Y):
+      cells = []
+      for gfx in pages:
+        nametable = gfx.nametable[y]
+        colorization = gfx.colorization[y & 0xfe]
+        for x in range(NUM_TILES_X):
+          nt_num = nametable[x]
+          attr = colorization[x & 0xfe]
+          key = (nt_num, attr)
+          if not key in tile_rows:
+            tile_rows[key] = self.create_rows(mem.chr_set.get(nt_num), attr)
+          cells.append(tile_rows[key])
+      for i in range(8):
+        lines.append(b''.join([rows[i] for rows in cells]))
+    return Image.frombytes('P', (len(pages) * WIDTH, HEIGHT),
+                           b''.join(lines))
+
+  def create_rows(self, tile, attr):
+    """Rows of palette indexes for the tile, using the palette option attr."""
+    base = attr * 4
+    return [bytes(bytearray([base + tile.get_pixel(i, j) for j in range(8)]))
+            for i in range(8)]
+
+  def create_palette(self, pal):
+    """Flat list of rgb values for the 16 colors of the palette."""
+    make = []
+    for k in range(4):
+      poption = pal.get(k) or []
+      for n in range(4):
+        nc = poption[n] if n < len(poption) else pal.bg_color
+        col = self.rgb_mapping.colors[nc or 0]
+        make += [col // 0x10000, (col // 0x100) % 0x100, col % 0x100]
     return make
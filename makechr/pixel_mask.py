@@ -0,0 +1,57 @@
+import sys
+
+
+if sys.version_info < (3,0):
+  range = xrange
+
+
+# Values in the mask, for clear pixels and opaque pixels.
+CLEAR = 0
+OPAQUE = 1
+
+
+class PixelMask(object):
+  """Which pixels of an image are opaque, and which are clear.
+
+  Stored as a single buffer, one byte per pixel, surrounded by a border of
+  clear pixels. Looking up a neighbor of any pixel in the image never goes
+  out of bounds, so callers can index the buffer directly, using index() and
+  stride to move around.
+  """
+
+  def __init__(self, height, width, data):
+    """Create a mask from rows of bytes, 0 for clear pixels, 1 for opaque.
+
+    data: Bytes of the image's mask, without any border, width per row.
+    """
+    self.height = height
+    self.width = width
+    self.stride = width + 2
+    border = bytearray(self.stride)
+    make = [border]
+    for y in range(height):
+      make.append(b'\x00' + data[y * width:(y + 1) * width] + b'\x00')
+    make.append(border)
+    self.data = bytearray(b''.join(make))
+
+  @staticmethod
+  def from_func(height, width, is_clear_func):
+    """Create a mask by calling is_clear_func(y, x) for each pixel."""
+    data = bytearray(height * width)
+    for y in range(height):
+      for x in range(width):
+        if not is_clear_func(y, x):
+          data[y * width + x] = OPAQUE
+    return PixelMask(height, width, bytes(data))
+
+  def index(self, y, x):
+    """Index into data for the pixel at y,x. May be in the border."""
+    return (y + 1) * self.stride + x + 1
+
+  def is_clear(self, y, x):
+    return self.data[(y + 1) * self.stride + x + 1] == CLEAR
+
+  def row(self, y):
+    """Bytes of the mask for row y, without the border."""
+    start = (y + 1) * self.stride + 1
+    return bytes(self.data[start:start + self.width])
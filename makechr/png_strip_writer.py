@@ -0,0 +1,87 @@
+import struct
+import zlib
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+# Color type for truecolor pixels, 3 bytes each.
+COLOR_TYPE_RGB = 2
+
+
+# Filter type for rows that are stored as is.
+FILTER_NONE = b'\x00'
+
+
+# Size of compressed data to collect before writing an IDAT chunk.
+CHUNK_SIZE = 0x10000
+
+
+class PngStripWriter(object):
+  """Writes an rgb PNG a strip of rows at a time.
+
+  Rows are compressed as they arrive, so only the current strip and the
+  compressor's state are ever held in memory, no matter the image's size.
+
+  fout: File object to write to.
+  width: Width of the image, in pixels.
+  height: Height of the image, in pixels.
+  """
+
+  def __init__(self, fout, width, height):
+    self.fout = fout
+    self.width = width
+    self.height = height
+    self.num_rows = 0
+    self._compressor = zlib.compressobj()
+    self._pending = []
+    self._pending_size = 0
+    self.fout.write(PNG_SIGNATURE)
+    self._write_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8,
+                                           COLOR_TYPE_RGB, 0, 0, 0))
+
+  def write_strip(self, data):
+    """Write a strip of rows.
+
+    data: Bytes of rgb pixels, a whole number of rows long.
+    """
+    stride = self.width * 3
+    if len(data) % stride:
+      raise ValueError('strip is not a whole number of rows')
+    rows = len(data) // stride
+    if self.num_rows + rows > self.height:
+      raise ValueError('too many rows for image height %d' % self.height)
+    make = []
+    for i in range(rows):
+      make.append(FILTER_NONE)
+      make.append(data[i * stride:(i + 1) * stride])
+    self._add(self._compressor.compress(b''.join(make)))
+    self.num_rows += rows
+
+  def close(self):
+    """Finish the image. Does not close the file object."""
+    if self.num_rows != self.height:
+      raise ValueError('wrote %d rows, expected %d' %
+                       (self.num_rows, self.height))
+    self._add(self._compressor.flush())
+    self._flush(True)
+    self._write_chunk(b'IEND', b'')
+
+  def _add(self, compressed):
+    if compressed:
+      self._pending.append(compressed)
+      self._pending_size += len(compressed)
+    self._flush(False)
+
+  def _flush(self, is_final):
+    if not self._pending or (self._pending_size < CHUNK_SIZE and not is_final):
+      return
+    self._write_chunk(b'IDAT', b''.join(self._pending))
+    self._pending = []
+    self._pending_size = 0
+
+  def _write_chunk(self, kind, data):
+    crc = zlib.crc32(kind)
+    crc = zlib.crc32(data, crc) & 0xffffffff
+    self.fout.write(struct.pack('>I', len(data)) + kind + data +
+                    struct.pack('>I', crc))
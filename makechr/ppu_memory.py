@@ -1,19 +1,23 @@
 import binary_file_writer
 import collections
 import chr_data
+import component_serializer
 from constants import *
-import json
+import errors
 import os
 import sys
+import valiant_archive
 
 object_file_writer = None
 
 
 if sys.version_info < (3,0):
   range = xrange
-  to_byte = chr
-else:
-  to_byte = lambda v: bytes([v])
+
+
+# Split each attribute byte into the palette options for its four blocks.
+ATTRIBUTE_SPLIT = [((a >> 0) & 0x03, (a >> 2) & 0x03,
+                    (a >> 4) & 0x03, (a >> 6) & 0x03) for a in range(0x100)]
 
 
 class GraphicsPage(object):
@@ -23,6 +27,31 @@ class GraphicsPage(object):
     self.nametable = [row[:] for row in [[0]*(NUM_TILES_X)]*(NUM_TILES_Y)]
     self.colorization = [row[:] for row in [[0]*(NUM_TILES_X)]*(NUM_TILES_Y)]
 
+  def fill_nametable(self, data):
+    """Fill the nametable from bytes, as they sit in the PPU's memory."""
+    data = bytearray(data)
+    for y in range(NUM_TILES_Y):
+      self.nametable[y][:] = data[y * NUM_TILES_X:(y + 1) * NUM_TILES_X]
+
+  def fill_attribute(self, data):
+    """Fill the colorization from bytes, as they sit in the PPU's memory.
+
+    Only the upper-left tile of each block is assigned.
+    """
+    data = bytearray(data)
+    width = NUM_BLOCKS_X // 2
+    for attr_y in range(NUM_BLOCKS_Y // 2 + 1):
+      top = []
+      bottom = []
+      for attr in data[attr_y * width:(attr_y + 1) * width]:
+        p0, p1, p2, p3 = ATTRIBUTE_SPLIT[attr]
+        top += [p0, p1]
+        bottom += [p2, p3]
+      y = attr_y * 4
+      self.colorization[y][0::2] = top
+      if y + 2 < NUM_TILES_Y:
+        self.colorization[y + 2][0::2] = bottom
+
 
 class PpuMemoryConfig(object):
   def __init__(self, traversal=None, platform=None,
@@ -52,6 +81,9 @@ class PpuMemory(object):
   """
   def __init__(self):
     self.gfx = None
+    # Layout of graphics pages, in screens, as a map is drawn.
+    self.screen_y = 1
+    self.screen_x = 1
     self.palette_nt = None
     self.palette_spr = None
     self.chr_set = chr_data.ChrPage()
@@ -67,6 +99,16 @@ class PpuMemory(object):
   def allocate_num_pages(self, num):
     self.gfx = [GraphicsPage() for i in range(num)]
 
+  def allocate_screens(self, screen_y, screen_x):
+    """Allocate a graphics page for each screen of a map, in row-major order.
+
+    screen_y: Number of screens tall.
+    screen_x: Number of screens wide.
+    """
+    self.allocate_num_pages(screen_y * screen_x)
+    self.screen_y = screen_y
+    self.screen_x = screen_x
+
   def override_bg_color(self, bg_color):
     self._bg_color = bg_color
     if self.palette_nt:
@@ -77,120 +119,75 @@ class PpuMemory(object):
   def upgrade_chr_set_to_bank(self):
     self.chr_set = chr_data.ChrBank()
 
-  def save_template(self, tmpl, config):
+  def save_template(self, tmpl, config, serializer=None, file_writer=None):
     """Save binary files representing the ppu memory.
 
     tmpl: String representing a filename template to save files to.
     config: Configuration for how memory is represented.
+    serializer: Optional serializer, to share components with other outputs.
+    file_writer: Optional writer for files, to only write changed files.
     """
-    self._writer = binary_file_writer.BinaryFileWriter(tmpl)
-    return self._save_components(config)
+    self._writer = binary_file_writer.BinaryFileWriter(tmpl, file_writer)
+    return self._save_components(config, serializer)
 
-  def save_valiant(self, output_filename, config):
+  def save_valiant(self, output_filename, config, serializer=None,
+                   file_writer=None):
     """Save the ppu memory as a protocal buffer based object file.
 
     The format of an object file is specific by valiant.proto.
 
     output_filename: String representing a filename for the object file.
     config: Configuration for how memory is represented.
+    serializer: Optional serializer, to share components with other outputs.
+    file_writer: Optional writer for files, to only write changed files.
+    """
+    module_name = os.path.splitext(os.path.basename(output_filename))[0]
+    ret = self._build_valiant(module_name, config, serializer)
+    self._writer.save(output_filename, file_writer)
+    return ret
+
+  def save_valiant_module(self, archive_filename, module_name, config,
+                          serializer=None, file_writer=None):
+    """Save the ppu memory as a module in a valiant archive.
+
+    The module is added to the archive, or replaces an existing module with
+    the same name, without rewriting the rest of the archive.
+
+    archive_filename: String representing a filename for the archive.
+    module_name: Name of the module.
+    config: Configuration for how memory is represented.
+    serializer: Optional serializer, to share components with other outputs.
+    file_writer: Optional writer for files, to only write changed modules.
     """
+    ret = self._build_valiant(module_name, config, serializer)
+    archive = valiant_archive.ValiantArchive(archive_filename)
+    archive.put(module_name, self._writer.serialize(), file_writer)
+    return ret
+
+  def _build_valiant(self, module_name, config, serializer):
     global object_file_writer
     if object_file_writer is None:
       import object_file_writer
     self._writer = object_file_writer.ObjectFileWriter()
-    ret = self._save_components(config)
-    module_name = os.path.splitext(os.path.basename(output_filename))[0]
+    ret = self._save_components(config, serializer)
     self._writer.write_module(module_name)
     self._writer.write_bg_color(self._bg_color)
     self._writer.write_chr_info(self.chr_set)
     self._writer.write_extra_settings(config)
-    self._writer.save(output_filename)
     return ret
 
-  def _save_components(self, config):
-    self._bg_color = self._get_bg_color(self.palette_nt, self.palette_spr)
-    components = self._get_enabled_components(config)
-    if 'nametable' in components:
-      for i, gfx in enumerate(self.gfx):
-        name = 'nametable' if i == 0 else ('nametable%d' % i)
-        fout = self._writer.get_writable(name, False)
-        self._save_nametable(fout, gfx.nametable)
-        self._writer.close()
-    if 'chr' in components:
-      fout = self._writer.get_writable('chr', True)
-      self._writer.configure(null_value=0, size=0x1000, order=config.chr_order,
-                             align=0x10, extract=0x2000)
-      self._save_chr(fout, self.chr_set, config.select_chr_plane)
-    if 'palette' in components:
-      fout = self._writer.get_writable('palette', True)
-      self._writer.configure(null_value=self._bg_color, size=0x10,
-                             order=config.palette_order, extract=0x20)
-      self._save_palette(fout, self.palette_nt, self.palette_spr)
-    if 'attribute' in components:
-      for i, gfx in enumerate(self.gfx):
-        name = 'attribute' if i == 0 else ('attribute%d' % i)
-        fout = self._writer.get_writable(name, False)
-        self._save_attribute(fout, gfx.colorization)
-        self._writer.close()
-    # TODO: Rename this component to `sprites`
-    # Represents either `spritelist` or `sprite_picdata`
-    if 'spritelist' in components:
-      if self.sprite_picdata:
-        fout = self._writer.get_writable('sprite_picdata', False)
-        self._save_sprite_picdata(fout, self.sprite_picdata)
-      else:
-        fout = self._writer.get_writable('spritelist', False)
-        self._save_spritelist(fout, self.spritelist, self.gfx[0].colorization)
-    self._writer.close()
+  def _save_components(self, config, serializer):
+    self._bg_color = self.get_bg_color()
+    if serializer is None:
+      serializer = component_serializer.ComponentSerializer(self)
+    components = self.get_enabled_components(config)
+    for component in serializer.components(config, components):
+      self._writer.write_component(component)
     return components
 
-  def _save_nametable(self, fout, nametable):
-    for y in range(NUM_BLOCKS_Y * 2):
-      for x in range(NUM_BLOCKS_X * 2):
-        nt = nametable[y][x]
-        fout.write(to_byte(nt))
-
-  def _save_chr(self, fout, chr_set, select_chr_plane):
-    if select_chr_plane in ['0','1']:
-      fout.write(chr_set.to_bytes_select_plane(int(select_chr_plane)))
-    elif select_chr_plane is None:
-      fout.write(chr_set.to_bytes())
-    else:
-      raise RuntimeError('Unknown option for select-chr-plane: %s' %
-                         (select_chr_plane,))
-
-  def _save_palette(self, fout, palette_1, palette_2):
-    self._write_single_palette(fout, palette_1, self._bg_color)
-    self._write_single_palette(fout, palette_2, self._bg_color)
-
-  def _save_attribute(self, fout, colorization):
-    for attr_y in range(NUM_BLOCKS_Y // 2 + 1):
-      for attr_x in range(NUM_BLOCKS_X // 2):
-        block_y = attr_y * 2
-        block_x = attr_x * 2
-        y = block_y * 2
-        x = block_x * 2
-        p0 = colorization[y + 0][x + 0]
-        p1 = colorization[y + 0][x + 2]
-        p2 = colorization[y + 2][x + 0] if block_y + 1 < NUM_BLOCKS_Y else 0
-        p3 = colorization[y + 2][x + 2] if block_y + 1 < NUM_BLOCKS_Y else 0
-        attr = p0 + (p1 << 2) + (p2 << 4) + (p3 << 6)
-        fout.write(to_byte(attr))
-
-  def _save_spritelist(self, fout, spritelist, sprite_palettes):
-    n = 0
-    for y_pos, tile, attr, x_pos in spritelist:
-      fout.write(to_byte(y_pos))
-      fout.write(to_byte(tile))
-      fout.write(to_byte(attr))
-      fout.write(to_byte(x_pos))
-      n += 1
-    fout.write(to_byte(0xff))
-
-  def _save_sprite_picdata(self, fout, sprite_picdata):
-    text = json.dumps(sprite_picdata, indent=2, sort_keys=True,
-                      separators=(',', ': '))
-    fout.write(text.encode('utf-8'))
+  def get_bg_color(self):
+    """Get the background color shared by the palettes."""
+    return self._get_bg_color(self.palette_nt, self.palette_spr)
 
   def _get_bg_color(self, palette_1, palette_2):
     bg_color = None
@@ -203,7 +200,7 @@ class PpuMemory(object):
       bg_color = palette_2.bg_color
     return bg_color
 
-  def _get_enabled_components(self, config):
+  def get_enabled_components(self, config):
     components = set()
     if not config.is_sprite and not config.is_locked_tiles:
       components.add('nametable')
@@ -217,19 +214,6 @@ class PpuMemory(object):
       components.add('spritelist')
     return components
 
-  def _write_single_palette(self, fout, palette, bg_color):
-    if not palette:
-      return
-    for i in range(4):
-      palette_option = palette.get(i)
-      if palette_option is None:
-        palette_option = []
-      for j in range(4):
-        if j < len(palette_option):
-          fout.write(to_byte(palette_option[j]))
-        else:
-          fout.write(to_byte(bg_color))
-
   def build_nt_inverter(self):
     """Build a table that maps tile numbers to lists of positions."""
     nametable = self.gfx[0].nametable
@@ -240,46 +224,6 @@ class PpuMemory(object):
     return lookup
 
   def get_bytes(self, role):
-    if role == 'nametable':
-      nametable = self.gfx[0].nametable
-      bytes = bytearray()
-      for y in range(30):
-        bytes += bytearray(nametable[y])
-      return bytes
-    elif role == 'attribute':
-      colorization = self.gfx[0].colorization
-      bytes = bytearray()
-      for attr_y in range(NUM_BLOCKS_Y // 2 + 1):
-        for attr_x in range(NUM_BLOCKS_X // 2):
-          block_y = attr_y * 2
-          block_x = attr_x * 2
-          y = block_y * 2
-          x = block_x * 2
-          p0 = colorization[y  ][x  ]
-          p1 = colorization[y  ][x+2]
-          p2 = colorization[y+2][x  ] if block_y + 1 < NUM_BLOCKS_Y else 0
-          p3 = colorization[y+2][x+2] if block_y + 1 < NUM_BLOCKS_Y else 0
-          attr = p0 + (p1 << 2) + (p2 << 4) + (p3 << 6)
-          bytes.append(attr)
-      return bytes
-    elif role == 'palette':
-      if self._bg_color is None:
-        self._bg_color = self._get_bg_color(self.palette_nt, self.palette_spr)
-      bytes = bytearray()
-      if self.palette_nt:
-        bytes += self.palette_nt.to_bytes()
-        bytes += bytearray([self._bg_color] * (0x10 - len(bytes)))
-      else:
-        bytes += bytearray([self._bg_color] * 0x10)
-      if self.palette_spr:
-        bytes += self.palette_spr.to_bytes()
-        bytes += bytearray([self._bg_color] * (0x20 - len(bytes)))
-      else:
-        bytes += bytearray([self._bg_color] * 0x10)
-      return bytes
-    elif role == 'chr':
-      bytes = self.chr_set.to_bytes()
-      bytes += bytearray([0] * (0x2000 - len(bytes)))
-      return bytes
-    else:
-      raise RuntimeError('Unknown role %s' % role)
+    """Get the bytes for the role, as they sit in the PPU's memory."""
+    serializer = component_serializer.ComponentSerializer(self)
+    return bytearray(serializer.memory_image(role))
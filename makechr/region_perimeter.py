@@ -1,3 +1,4 @@
+import bisect
 import errors
 import geometry
 import math
@@ -16,6 +17,11 @@ class RegionPerimeter(object):
     self.min_x = self.max_x = self.start_x = self.curr_x = init_x
     self.rects = []
     self.count = 0
+    # Indexes for finding edges, vertices and rectangles by position. Edge and
+    # vertex indexes are built once the outline is complete.
+    self._edge_index = None
+    self._vertex_index = None
+    self._rect_index = dict((d, ([], [])) for d in ALL_DIRS)
 
   def __str__(self):
     accum = []
@@ -40,6 +46,7 @@ class RegionPerimeter(object):
       point_x += 1
     elif next_dir == DIR_LEFT:
       point_y += 1
+    self._edge_index = self._vertex_index = None
     # Edge
     edge = geometry.Edge(rotate_dir_cw(dir), self.curr_y, self.curr_x,
                          point_y, point_x)
@@ -75,21 +82,10 @@ class RegionPerimeter(object):
     return [self.vertices[p] for p in params]
 
   def get_opposite_edge(self, edge):
-    facing = opposite_dir(edge.facing)
-    min_dist = INFINITY
-    min_index = None
-    for i, e in enumerate(self.edges):
-      if e.facing != facing:
-        continue
-      if e.not_in_range_of(edge):
-        continue
-      dist = e.distance_from(edge)
-      if dist < 0:
-        continue
-      if dist < min_dist:
-        min_dist = dist
-        min_index = i
-    return self.edges[min_index]
+    answer = self._find_nearest_opposite(edge)
+    if answer is None:
+      raise errors.AlgorithmError('No edge opposite of %s' % (edge,))
+    return answer
 
   def make_rectangle(self, edges):
     all_y = set()
@@ -153,10 +149,12 @@ class RegionPerimeter(object):
     return overlaps
 
   def _find_matches(self, dir, line):
+    # Only edges on the same line can overlap it.
+    coords, entries = self._get_edge_index()[dir]
+    k = line_coord(line)
     result = []
-    for e in self.edges:
-      if e.facing != dir:
-        continue
+    for unused, unused_i, e in entries[bisect.bisect_left(coords, k):
+                                       bisect.bisect_right(coords, k)]:
       if line.fully_overlap(e):
         result.append([e, e.dim_to_range()])
         continue
@@ -166,47 +164,39 @@ class RegionPerimeter(object):
     return result
 
   def _find_vertices(self, line):
-    result = []
-    for v in self.vertices:
-      if line.overlaps_point(v):
-        result.append(v)
-    return result
+    if line.facing in [DIR_UP, DIR_DOWN]:
+      index = self._get_vertex_index()[0].get(line.y0)
+      lo, hi = line.x0, line.x1
+    else:
+      index = self._get_vertex_index()[1].get(line.x0)
+      lo, hi = line.y0, line.y1
+    if not index:
+      return []
+    coords, entries = index
+    found = entries[bisect.bisect_left(coords, lo):
+                    bisect.bisect_right(coords, hi)]
+    # Same order as the list of vertices.
+    return [v for unused, unused_i, v in sorted(found, key=lambda n: n[1])]
 
   def push_as_far_as_available(self, edge):
     # Get closet edge
     dir = edge.facing
     min_dist = INFINITY
-    answer = None
-    for e in self.edges:
-      if e.facing != opposite_dir(dir):
-        continue
-      if e.not_in_range_of(edge):
-        continue
-      dist = e.distance_from(edge)
-      if dist < 0:
-        continue
-      if dist < min_dist:
-        min_dist = dist
-        answer = e
-    # Collect other rectangles
-    accum = []
-    for r in self.rects:
-      side = r.get_side(opposite_dir(dir))
-      dist = edge.distance_from(side)
-      if dist < -7: # rectangles that we're already inside of
-        continue
-      if side.partially_in_range_of(edge):
-        accum.append([dist, side])
-    # Sort them by distance
-    accum.sort(key=lambda n: n[0])
-    # Find when we reach coverage
+    answer = self._find_nearest_opposite(edge)
+    if answer is not None:
+      min_dist = answer.distance_from(edge)
+    # Collect other rectangles, from nearest to farthest, skipping rectangles
+    # that we're already inside of. Find when they reach coverage.
     coverage = num_range.MultiRange()
-    for dist, other in accum:
+    edge_range = edge.dim_to_range()
+    for dist, other in self._each_rect_side_in_front(edge):
+      if dist >= min_dist:
+        break
       coverage.add(other.dim_to_range())
-      if coverage.fully_overlap(edge.dim_to_range()):
-        if dist < min_dist:
-          min_dist = dist
-          answer = other
+      if coverage.fully_overlap(edge_range):
+        min_dist = dist
+        answer = other
+        break
     if answer is None:
       return edge
     if edge.facing in [DIR_UP, DIR_DOWN]:
@@ -217,5 +207,96 @@ class RegionPerimeter(object):
                              edge.y1, answer.x0)
     return answer
 
+  def _find_nearest_opposite(self, edge):
+    """Nearest edge facing edge, whose range overlaps it, or None.
+
+    Ties go to the edge that comes first in the outline.
+    """
+    facing = opposite_dir(edge.facing)
+    coords, entries = self._get_edge_index()[facing]
+    k = line_coord(edge)
+    # Edges facing up or left are in front when their coordinate is larger.
+    if facing in [DIR_UP, DIR_LEFT]:
+      n = bisect.bisect_left(coords, k)
+      step = 1
+    else:
+      n = bisect.bisect_right(coords, k) - 1
+      step = -1
+    best = None
+    while 0 <= n < len(entries):
+      coord, i, e = entries[n]
+      if best is not None and coord != best[0]:
+        break
+      if not e.not_in_range_of(edge) and (best is None or i < best[1]):
+        best = entries[n]
+      n += step
+    return best[2] if best else None
+
+  def _each_rect_side_in_front(self, edge):
+    """Sides of rectangles facing edge, nearest first, as [dist, side].
+
+    Sides up to 7 behind the edge are included. Ties go to the rectangle that
+    was collected first.
+    """
+    facing = opposite_dir(edge.facing)
+    coords, entries = self._rect_index[facing]
+    k = line_coord(edge)
+    if facing in [DIR_UP, DIR_LEFT]:
+      n = bisect.bisect_left(coords, k - 7)
+      step = 1
+    else:
+      n = bisect.bisect_right(coords, k + 7) - 1
+      step = -1
+    while 0 <= n < len(entries):
+      # Group sides that are the same distance away.
+      coord = coords[n]
+      group = []
+      while 0 <= n < len(entries) and coords[n] == coord:
+        group.append(entries[n])
+        n += step
+      group.sort(key=lambda g: g[1])
+      for unused, unused_seq, side in group:
+        yield edge.distance_from(side), side
+
+  def _get_edge_index(self):
+    """For each facing, edges sorted by coordinate then outline order."""
+    if self._edge_index is None:
+      self._edge_index = {}
+      for d in ALL_DIRS:
+        entries = sorted([(line_coord(e), i, e)
+                          for i, e in enumerate(self.edges) if e.facing == d],
+                         key=lambda n: (n[0], n[1]))
+        self._edge_index[d] = ([n[0] for n in entries], entries)
+    return self._edge_index
+
+  def _get_vertex_index(self):
+    """Vertices by row and by column, each sorted by the other coordinate."""
+    if self._vertex_index is None:
+      rows = {}
+      cols = {}
+      for i, v in enumerate(self.vertices):
+        rows.setdefault(v.y, []).append((v.x, i, v))
+        cols.setdefault(v.x, []).append((v.y, i, v))
+      for lines in [rows, cols]:
+        for k, entries in lines.items():
+          entries.sort(key=lambda n: (n[0], n[1]))
+          lines[k] = ([n[0] for n in entries], entries)
+      self._vertex_index = (rows, cols)
+    return self._vertex_index
+
   def put_rect(self, rect):
+    seq = len(self.rects)
     self.rects.append(rect)
+    for d in ALL_DIRS:
+      side = rect.get_side(d)
+      coords, entries = self._rect_index[d]
+      n = bisect.bisect_right(coords, line_coord(side))
+      coords.insert(n, line_coord(side))
+      entries.insert(n, (line_coord(side), seq, side))
+
+
+def line_coord(edge):
+  """The coordinate that an edge lies on, y for horizontal, x for vertical."""
+  if edge.facing in [DIR_UP, DIR_DOWN]:
+    return edge.y0
+  return edge.x0
@@ -0,0 +1,148 @@
+from PIL import Image
+import os
+import sys
+import threading
+
+
+if sys.version_info < (3,0):
+  range = xrange
+
+
+# Fonts for nametable values, as (filename, glyph width, glyph height).
+NT_FONTS = {False: ('nt_tiny.png', 3, 5), True: ('nt_font.png', 7, 11)}
+
+
+# Colors for the upper and lower digits of nametable values.
+NT_UPPER_COLOR = 0xc0c0c0
+NT_LOWER_COLOR = 0x909090
+
+
+_cache = {}
+# Reentrant, since building one resource may need another.
+_lock = threading.RLock()
+
+
+def res_dir():
+  """Directory that holds the resource files."""
+  here = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'res')
+  if os.path.isdir(here) or not getattr(sys, 'frozen', False):
+    return here
+  # Frozen executables put resources next to the executable.
+  return os.path.join(os.path.dirname(sys.executable), 'res')
+
+
+def path(rel):
+  """Path to a resource file.
+
+  rel: Path of the resource, relative to the package, such as 'res/icon.png'.
+  """
+  return os.path.join(res_dir(), os.path.relpath(rel, 'res'))
+
+
+def get(key, build):
+  """Get the resource for key, calling build to create it the first time.
+
+  Resources are shared by the whole process, and are never released.
+  """
+  try:
+    return _cache[key]
+  except KeyError:
+    pass
+  with _lock:
+    if not key in _cache:
+      _cache[key] = build()
+    return _cache[key]
+
+
+def image(rel):
+  """Get the decoded image from a resource file. Do not modify it."""
+  return get(('image', rel), lambda: _load_image(rel))
+
+
+def nt_font(is_legacy):
+  """Get the glyphs for the 16 hex digits, along with their size.
+
+  Returns a tuple of (glyphs, width, height). Legacy glyphs are the rgba
+  images from the font. Otherwise, glyphs are palette images, index 1 for
+  the white foreground and 0 for the rest.
+  """
+  is_legacy = bool(is_legacy)
+  return get(('nt_font', is_legacy), lambda: _build_nt_font(is_legacy))
+
+
+def colored_glyph(n, color, scale):
+  """Get the glyph for hex digit n, with its foreground colored and scaled.
+
+  Glyphs are palette images, so coloring them only swaps the palette.
+  """
+  return get(('glyph', n, color, scale),
+             lambda: _build_colored_glyph(n, color, scale))
+
+
+def nt_value_atlas(is_legacy, scale):
+  """Get a list of 256 images, showing each nametable value as two digits."""
+  is_legacy = bool(is_legacy)
+  return get(('nt_value_atlas', is_legacy, scale),
+             lambda: _build_nt_value_atlas(is_legacy, scale))
+
+
+def nt_digit_offset(is_legacy, scale):
+  """Horizontal offset of the lower digit, when drawing a nametable value."""
+  if is_legacy:
+    return NT_FONTS[True][1]
+  return int(3.5 * scale)
+
+
+def _load_image(rel):
+  img = Image.open(path(rel))
+  img.load()
+  return img
+
+
+def _build_nt_font(is_legacy):
+  filename, w, h = NT_FONTS[is_legacy]
+  font_img = image('res/' + filename)
+  glyphs = []
+  for n in range(16):
+    glyph = font_img.crop([n*w,0,n*w+w,h])
+    if not is_legacy:
+      mask = glyph.convert('L').point(lambda v: 1 if v == 0xff else 0)
+      glyph = Image.frombytes('P', mask.size, mask.tobytes())
+    glyphs.append(glyph)
+  return (glyphs, w, h)
+
+
+def _build_colored_glyph(n, color, scale):
+  glyphs, unused_w, unused_h = nt_font(False)
+  img = glyphs[n].copy()
+  img.putpalette([0, 0, 0, color // 0x10000, (color // 0x100) % 0x100,
+                  color % 0x100])
+  if scale != 1:
+    img = img.resize((img.size[0] * scale, img.size[1] * scale),
+                     Image.NEAREST)
+  # Convert once, so that pasting doesn't need to.
+  return img.convert('RGB')
+
+
+def _build_nt_value_atlas(is_legacy, scale):
+  glyphs, w, h = nt_font(is_legacy)
+  offset = nt_digit_offset(is_legacy, scale)
+  if is_legacy:
+    digits = [g.convert('RGB') for g in glyphs]
+  else:
+    w, h = (w * scale, h * scale)
+    digits = [(colored_glyph(n, NT_UPPER_COLOR, scale),
+               colored_glyph(n, NT_LOWER_COLOR, scale)) for n in range(16)]
+  atlas = []
+  for nt in range(0x100):
+    if is_legacy:
+      upper, lower = (digits[nt // 16], digits[nt % 16])
+    else:
+      upper, lower = (digits[nt // 16][0], digits[nt % 16][1])
+    # Legacy digits cover the whole image. Otherwise, the gap between digits
+    # is black, the same as the view's background.
+    img = Image.new('RGB', (offset + w, h), (0, 0, 0))
+    img.paste(upper, (0, 0))
+    img.paste(lower, (offset, 0))
+    atlas.append(img)
+  return atlas
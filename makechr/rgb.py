@@ -1,25 +1,22 @@
-import sys
-
-
-if '--rgb-mapping' not in sys.argv:
-  mapping = 'almighty'
-else:
-  mapping = sys.argv[sys.argv.index('--rgb-mapping') + 1]
-if mapping == 'almighty':
-  from rgb_almighty import RGB_COLORS
-elif mapping == 'fceux':
-  from rgb_fceux import RGB_COLORS
-elif mapping == 'nesst':
-  from rgb_nesst import RGB_COLORS
-else:
-  sys.stderr.write('Unknown rgb-mapping: "%s"\n' % mapping)
-  sys.exit(1)
+import errors
+import importlib
 
 
 COLOR_TOLERANCE = 64
 BLACK = 0xf
 
 
+# Name of each mapping, and the module that lists its colors.
+MAPPING_MODULES = {
+  'almighty': 'rgb_almighty',
+  'fceux': 'rgb_fceux',
+  'nesst': 'rgb_nesst',
+}
+
+
+DEFAULT_MAPPING = 'almighty'
+
+
 def to_lookup_table(elems):
   answer = {}
   for i,val in enumerate(elems):
@@ -29,12 +26,70 @@ def to_lookup_table(elems):
   return answer
 
 
-RGB_XLAT = to_lookup_table(RGB_COLORS)
+class RgbMapping(object):
+  """Mapping between RGB colors and the NES's native NTSC color signal.
+
+  Each mapping has its own lookup table, which caches every RGB color that
+  has been converted, so mappings can be used side by side.
+
+  name: Name of the mapping.
+  colors: List of RGB values, as ints, for each nes color.
+  """
+
+  def __init__(self, name, colors):
+    self.name = name
+    self.colors = colors
+    self.xlat = to_lookup_table(colors)
+
+  def nc_to_rgb(self, nc):
+    color_val = self.colors[nc]
+    r = color_val // 0x10000
+    g = (color_val // 0x100) % 0x100
+    b = color_val % 0x100
+    return (r, g, b)
+
+  def components_to_nescolor(self, r, g, b):
+    """Convert RGB color components to an index into the NES system palette.
+
+    Find the nes color that most closely matches the color, and save the
+    result in the lookup table so future accesses will be fast. If the color
+    cannot be converted, return -1.
+    """
+    found_nc = -1
+    found_diff = float('infinity')
+    for i,allow_val in enumerate(self.colors):
+      diff_r = abs(r - allow_val // (256 * 256))
+      diff_g = abs(g - (allow_val // 256) % 256)
+      diff_b = abs(b - allow_val % 256)
+      diff = diff_r + diff_g + diff_b
+      if diff < found_diff:
+        found_nc = i
+        found_diff = diff
+    if found_diff > COLOR_TOLERANCE:
+      return -1
+    if found_nc == 0x0d:
+      found_nc = 0x0f
+    color_val = r * 256 * 256 + g * 256 + b
+    self.xlat[color_val] = found_nc
+    return found_nc
+
+
+_mappings = {}
+
 
+def get_mapping(name=None):
+  """Get the mapping by name, or the default mapping if name is None.
 
-def nc_to_rgb(nc):
-  color_val = RGB_COLORS[nc]
-  r = color_val // 0x10000
-  g = (color_val // 0x100) % 0x100
-  b = color_val % 0x100
-  return (r, g, b)
+  Each mapping's colors are only imported the first time it is used, and
+  the same mapping is returned after that. Raises errors.UnknownRgbMapping
+  if there is no such mapping.
+  """
+  if name is None:
+    name = DEFAULT_MAPPING
+  if name in _mappings:
+    return _mappings[name]
+  if name not in MAPPING_MODULES:
+    raise errors.UnknownRgbMapping(name)
+  module = importlib.import_module(MAPPING_MODULES[name])
+  _mappings[name] = RgbMapping(name, module.RGB_COLORS)
+  return _mappings[name]
@@ -1,3 +1,7 @@
+import changed_file_writer
+import component_serializer
+
+
 class RomBuilder(object):
   def __init__(self):
     self.rom_header = (
@@ -14,14 +18,16 @@ class RomBuilder(object):
     self.rom_vectors = b'\x00\x00\x20\xc4\x00\x00'
     self.fill_size = 0x3b61
 
-  def build(self, mem, outfile):
-    fout = open(outfile, 'wb')
-    fout.write(self.rom_header)
-    fout.write(mem.get_bytes('palette'))
-    fout.write(mem.get_bytes('nametable'))
-    fout.write(mem.get_bytes('attribute'))
-    fout.write(self.rom_code)
-    fout.write(bytes(bytearray([0] * self.fill_size)))
-    fout.write(self.rom_vectors)
-    fout.write(mem.get_bytes('chr'))
-    fout.close()
+  def build(self, mem, outfile, serializer=None, file_writer=None):
+    if serializer is None:
+      serializer = component_serializer.ComponentSerializer(mem)
+    rom = b''.join([self.rom_header,
+                    serializer.memory_image('palette'),
+                    serializer.memory_image('nametable'),
+                    serializer.memory_image('attribute'),
+                    self.rom_code,
+                    bytes(bytearray(self.fill_size)),
+                    self.rom_vectors,
+                    serializer.memory_image('chr')])
+    file_writer = file_writer or changed_file_writer.ChangedFileWriter()
+    file_writer.write(outfile, rom)
@@ -0,0 +1,68 @@
+import bisect
+import data
+
+
+# Values in a fill mask, for pixels that are the fill color, or not.
+MASK_FILL = b'\x00'
+MASK_COLOR = b'\x01'
+
+
+def find_spans(row):
+  """Find the runs of non-fill pixels in a row of a fill mask.
+
+  Each run becomes a span. A run that reaches the end of the row has no
+  right side.
+
+  row: Bytes of the fill mask for a single row, one byte per pixel.
+  """
+  spans = []
+  x = row.find(MASK_COLOR)
+  while x != -1:
+    end = row.find(MASK_FILL, x)
+    if end == -1:
+      spans.append(data.Span(x, None))
+      break
+    spans.append(data.Span(x, end))
+    x = row.find(MASK_COLOR, end)
+  return spans
+
+
+class SortedSpanList(object):
+  """Spans that don't overlap, kept sorted by their left side.
+
+  Positions are found by binary search on the left sides, so spans can be
+  inserted and removed without scanning the list.
+  """
+
+  def __init__(self):
+    self._lefts = []
+    self._spans = []
+
+  def insert(self, span):
+    """Insert the span, after any span with the same left side."""
+    k = bisect.bisect_right(self._lefts, span.left)
+    self._lefts.insert(k, span.left)
+    self._spans.insert(k, span)
+
+  def remove(self, span):
+    """Remove the span, which must be in the list."""
+    k = bisect.bisect_left(self._lefts, span.left)
+    while k < len(self._spans) and self._lefts[k] == span.left:
+      if self._spans[k] is span or self._spans[k] == span:
+        del self._lefts[k]
+        del self._spans[k]
+        return
+      k += 1
+    raise ValueError('span not in list: %r' % (span,))
+
+  def __getitem__(self, k):
+    return self._spans[k]
+
+  def __len__(self):
+    return len(self._spans)
+
+  def __iter__(self):
+    return iter(self._spans)
+
+  def __repr__(self):
+    return repr(self._spans)
@@ -31,9 +31,10 @@ def get_delta(newer, older):
       d = older[j]
       if not n.overlap(d):
         break
-      if not n in overlap_new:
+      # Elements are visited in order, so a repeat can only be the last one.
+      if not overlap_new or overlap_new[-1] is not n:
         overlap_new.append(n)
-      if not d in overlap_old:
+      if not overlap_old or overlap_old[-1] is not d:
         overlap_old.append(d)
       if n.right > d.right:
         j += 1
@@ -45,9 +46,9 @@ def get_delta(newer, older):
         i += 1
         j += 1
         break
-    if i < len(newer) and newer[i] in overlap_new:
+    if i < len(newer) and overlap_new and newer[i] is overlap_new[-1]:
       i += 1
-    if j < len(older) and older[j] in overlap_old:
+    if j < len(older) and overlap_old and older[j] is overlap_old[-1]:
       j += 1
     if len(overlap_new) == 1:
       merge.append({'new': overlap_new, 'old': overlap_old})
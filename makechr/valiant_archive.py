@@ -0,0 +1,203 @@
+import changed_file_writer
+import collections
+import errors
+import os
+import struct
+
+
+MAGIC = b'(VALIANT-ARCHIVE)'
+
+
+# Position and size of the index, right after the magic.
+HEADER_FORMAT = '<QI'
+HEADER_SIZE = len(MAGIC) + struct.calcsize(HEADER_FORMAT)
+
+
+# Rewrite the archive once this much of it is replaced modules and indexes,
+# compared to the size of what is still in use.
+COMPACT_RATIO = 1.0
+
+
+def is_archive(filename):
+  """Whether the file is a valiant archive, only reading its magic."""
+  fp = open(filename, 'rb')
+  head = fp.read(len(MAGIC))
+  fp.close()
+  return head == MAGIC
+
+
+class ValiantArchive(object):
+  """An archive of many valiant object files, called modules.
+
+  The archive starts with a header that points to an index, which maps each
+  module name to the position and size of its object file. A single module,
+  or even a single packet, can be read by seeking to it directly. Modules are
+  added or replaced by appending them to the end of the archive, followed
+  by a new index, then updating the header. Replaced modules and old
+  indexes are left in place, until they take up more space than what is
+  still in use, then the archive is compacted.
+
+  Layout:
+    magic        "(VALIANT-ARCHIVE)"
+    header       uint64 index position, uint32 index size
+    modules      valiant object files, one after another
+    index        uint32 count, then for each module: uint16 name size,
+                 name in utf-8, uint64 position, uint64 size
+  """
+
+  def __init__(self, filename):
+    self.filename = filename
+    self.index = collections.OrderedDict()
+    if os.path.isfile(filename):
+      self._read_index()
+
+  def names(self):
+    """List of module names, in the order they were first added."""
+    return list(self.index.keys())
+
+  def has(self, name):
+    return name in self.index
+
+  def locate(self, name):
+    """Get the position and size of the module."""
+    if not name in self.index:
+      raise errors.ValiantFormatError('module not found "%s"' % name)
+    return self.index[name]
+
+  def read(self, name):
+    """Get the bytes of the module's object file."""
+    offset, size = self.locate(name)
+    fp = open(self.filename, 'rb')
+    fp.seek(offset)
+    content = fp.read(size)
+    fp.close()
+    return content
+
+  def reader(self, name):
+    """Get a ValiantReader for the module, reading it in place."""
+    import valiant_reader
+    offset, size = self.locate(name)
+    return valiant_reader.ValiantReader(self.filename, offset, size)
+
+  def put(self, name, content, file_writer=None):
+    """Add the module, or replace it if it already exists.
+
+    Returns whether the archive was written.
+
+    name: Name of the module.
+    content: Bytes of a valiant object file.
+    file_writer: Optional writer for files, to only write changed modules.
+    """
+    if file_writer is None:
+      self._append(name, content)
+      return True
+    is_same = self.has(name) and self.read(name) == content
+    return file_writer.update(self.filename, is_same,
+                              lambda: self._append(name, content))
+
+  def dead_space(self):
+    """Number of bytes used by replaced modules and old indexes."""
+    if not os.path.isfile(self.filename):
+      return 0
+    return os.path.getsize(self.filename) - self._live_size()
+
+  def compact(self):
+    """Rewrite the archive, keeping only its current modules and index."""
+    make = []
+    pos = HEADER_SIZE
+    index = collections.OrderedDict()
+    for name in self.index:
+      content = self.read(name)
+      make.append(content)
+      index[name] = (pos, len(content))
+      pos += len(content)
+    index_bin = self._pack_index(index)
+    header = MAGIC + struct.pack(HEADER_FORMAT, pos, len(index_bin))
+    changed_file_writer.replace_file(
+      self.filename, header + b''.join(make) + index_bin)
+    self.index = index
+
+  def _append(self, name, content):
+    index = collections.OrderedDict(self.index)
+    if not os.path.isfile(self.filename):
+      # Write a new archive all at once, so it never exists without an index.
+      index[name] = (HEADER_SIZE, len(content))
+      index_bin = self._pack_index(index)
+      header = MAGIC + struct.pack(HEADER_FORMAT, HEADER_SIZE + len(content),
+                                   len(index_bin))
+      changed_file_writer.replace_file(self.filename,
+                                       header + content + index_bin)
+      self.index = index
+      return
+    fp = open(self.filename, 'r+b')
+    try:
+      fp.seek(0, os.SEEK_END)
+      offset = fp.tell()
+      fp.write(content)
+      index[name] = (offset, len(content))
+      index_pos = fp.tell()
+      index_bin = self._pack_index(index)
+      fp.write(index_bin)
+      fp.flush()
+      # Only point the header at the new index once it has been written.
+      fp.seek(len(MAGIC))
+      fp.write(struct.pack(HEADER_FORMAT, index_pos, len(index_bin)))
+    finally:
+      fp.close()
+    self.index = index
+    if self.dead_space() > self._live_size() * COMPACT_RATIO:
+      self.compact()
+
+  def put_file(self, filename, name=None):
+    """Add a valiant object file, named after the file by default."""
+    if name is None:
+      name = os.path.splitext(os.path.basename(filename))[0]
+    fp = open(filename, 'rb')
+    content = fp.read()
+    fp.close()
+    self.put(name, content)
+
+  def _live_size(self):
+    size = HEADER_SIZE + len(self._pack_index(self.index))
+    for offset, module_size in self.index.values():
+      size += module_size
+    return size
+
+  def _read_index(self):
+    fp = open(self.filename, 'rb')
+    head = fp.read(HEADER_SIZE)
+    if len(head) != HEADER_SIZE or head[:len(MAGIC)] != MAGIC:
+      fp.close()
+      raise errors.ValiantFormatError('not an archive "%s"' % self.filename)
+    index_pos, index_size = struct.unpack(HEADER_FORMAT, head[len(MAGIC):])
+    fp.seek(index_pos)
+    index_bin = fp.read(index_size)
+    fp.close()
+    if len(index_bin) != index_size or index_size < 4:
+      raise errors.ValiantFormatError('truncated archive index')
+    try:
+      self._unpack_index(index_bin)
+    except struct.error:
+      raise errors.ValiantFormatError('truncated archive index')
+
+  def _pack_index(self, index):
+    make = [struct.pack('<I', len(index))]
+    for name, (offset, size) in index.items():
+      encoded = name.encode('utf-8')
+      make.append(struct.pack('<H', len(encoded)))
+      make.append(encoded)
+      make.append(struct.pack('<QQ', offset, size))
+    return b''.join(make)
+
+  def _unpack_index(self, index_bin):
+    pos = 0
+    (count,) = struct.unpack_from('<I', index_bin, pos)
+    pos += 4
+    for i in range(count):
+      (name_size,) = struct.unpack_from('<H', index_bin, pos)
+      pos += 2
+      name = index_bin[pos:pos + name_size].decode('utf-8')
+      pos += name_size
+      offset, size = struct.unpack_from('<QQ', index_bin, pos)
+      pos += 16
+      self.index[name] = (offset, size)
@@ -0,0 +1,248 @@
+import chr_data
+import collections
+import errors
+import gen.valiant_pb2 as valiant
+import mmap
+import os
+import palette
+import sys
+
+
+asbyte = lambda n: n
+if sys.version_info < (3,0):
+  range = xrange
+  asbyte = ord
+
+
+MAGIC = b'(VALIANT)'
+
+
+ROLE_NAMES = {valiant.CHR: 'chr', valiant.NAMETABLE: 'nametable',
+              valiant.ATTRIBUTE: 'attribute', valiant.PALETTE: 'palette',
+              valiant.SPRITELIST: 'spritelist'}
+
+
+# Field numbers from valiant.proto.
+OBJECT_FILE_HEADER = 13
+OBJECT_FILE_BODY = 15
+BODY_SETTINGS = 1
+BODY_PACKETS = 2
+PACKET_ROLE = 1
+PACKET_NAME = 2
+
+WIRE_VARINT = 0
+WIRE_FIXED64 = 1
+WIRE_LENGTH = 2
+WIRE_FIXED32 = 5
+
+
+def is_valiant(filename):
+  """Whether the file is a valiant object file, only reading its magic."""
+  fp = open(filename, 'rb')
+  head = fp.read(len(MAGIC))
+  fp.close()
+  return head == MAGIC
+
+
+def expand_binary(binary, req_align=0):
+  """Expand a DirectBinary, adding its pre_pad and padding."""
+  prepad = binary.pre_pad or 0
+  padding = binary.padding or 0
+  nullval = binary.null_value or 0
+  if req_align:
+    size = prepad + len(binary.bin) + padding
+    padding += req_align - size
+  null = bytearray([nullval])
+  return bytes(null * prepad + bytearray(binary.bin) + null * padding)
+
+
+class PacketInfo(object):
+  """Location of a packet inside of the file, found without parsing it."""
+  def __init__(self, role, name, start, end):
+    self.role = role
+    self.name = name
+    self.start = start
+    self.end = end
+
+
+class ValiantReader(object):
+  """Reads a valiant object file, expanding packets only when needed.
+
+  Opening the file only walks the protocol buffer's framing, to find the
+  header and the location of each packet. Packets are parsed, and their
+  binaries expanded, the first time they are accessed. The file is memory
+  mapped, so packets that are never accessed are never read from disk.
+
+  filename: Name of the file to read.
+  offset: Position of the object within the file, for modules in an archive.
+  size: Size of the object, defaults to the rest of the file.
+  """
+
+  def __init__(self, filename, offset=0, size=None):
+    self._fp = open(filename, 'rb')
+    if os.fstat(self._fp.fileno()).st_size:
+      self._data = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ)
+    else:
+      self._data = b''
+    self._start = offset
+    self._end = len(self._data) if size is None else offset + size
+    if (self._end > len(self._data) or
+        self._data[offset:offset + len(MAGIC)] != MAGIC):
+      self.close()
+      raise errors.ValiantFormatError('not a valiant file "%s"' % filename)
+    self.header = valiant.ObjectHeader()
+    self.packets = []
+    # Packets with each role, with roles in the order they're first found.
+    self._by_role = collections.OrderedDict()
+    self._settings_span = None
+    self._settings = None
+    self._parsed = {}
+    self._expanded = {}
+    try:
+      self._build_index()
+    except Exception:
+      # Nothing else will close the file if it can't be opened.
+      self.close()
+      raise
+
+  def close(self):
+    if self._data and hasattr(self._data, 'close'):
+      self._data.close()
+    self._data = None
+    self._fp.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *unused):
+    self.close()
+
+  def roles(self):
+    """List of names of the roles that have packets, in file order."""
+    return list(self._by_role.keys())
+
+  def count(self, role):
+    """Number of packets with the role."""
+    return len(self._by_role.get(role, []))
+
+  def has(self, role):
+    return role in self._by_role
+
+  def find(self, role, i=0):
+    """Get the location of the i-th packet with the role."""
+    found = self._by_role.get(role, [])
+    if i >= len(found):
+      raise errors.ValiantFormatError('missing packet "%s" #%d' % (role, i))
+    return found[i]
+
+  def packet(self, role, i=0):
+    """Get the parsed GfxPacket for the i-th packet with the role."""
+    info = self.find(role, i)
+    if not info.start in self._parsed:
+      packet = valiant.GfxPacket()
+      packet.ParseFromString(bytes(self._data[info.start:info.end]))
+      self._parsed[info.start] = packet
+    return self._parsed[info.start]
+
+  def binary(self, role, i=0):
+    """Get the expanded bytes of the i-th packet with the role."""
+    info = self.find(role, i)
+    if not info.start in self._expanded:
+      self._expanded[info.start] = expand_binary(self.packet(role, i).binary)
+    return self._expanded[info.start]
+
+  def settings(self):
+    """Get the GfxSettings from the body."""
+    if self._settings is None:
+      self._settings = valiant.GfxSettings()
+      if self._settings_span:
+        start, end = self._settings_span
+        self._settings.ParseFromString(bytes(self._data[start:end]))
+    return self._settings
+
+  def chr_set(self):
+    return chr_data.ChrBank.from_binary(self.binary('chr'))
+
+  def fill_graphics_page(self, gfx, i=0):
+    """Fill the graphics page from the i-th nametable and attribute."""
+    gfx.fill_nametable(self.binary('nametable', i))
+    gfx.fill_attribute(self.binary('attribute', i))
+
+  def palette(self):
+    """Get the nametable palette, made from the first 0x10 palette bytes."""
+    pal_bin = bytearray(self.binary('palette'))
+    pal = palette.Palette()
+    pal.set_bg_color(pal_bin[0])
+    for i in range(4):
+      pal.add(list(pal_bin[i*4:i*4 + 4]))
+    return pal
+
+  def _build_index(self):
+    for num, wire, unused, start, end in self._fields(self._start, self._end):
+      if num == OBJECT_FILE_HEADER and wire == WIRE_LENGTH:
+        self.header.ParseFromString(bytes(self._data[start:end]))
+      elif num == OBJECT_FILE_BODY and wire == WIRE_LENGTH:
+        self._index_body(start, end)
+
+  def _index_body(self, body_start, body_end):
+    for num, wire, unused, start, end in self._fields(body_start, body_end):
+      if num == BODY_SETTINGS and wire == WIRE_LENGTH:
+        self._settings_span = (start, end)
+      elif num == BODY_PACKETS and wire == WIRE_LENGTH:
+        info = self._index_packet(start, end)
+        self.packets.append(info)
+        self._by_role.setdefault(info.role, []).append(info)
+
+  def _index_packet(self, packet_start, packet_end):
+    role = None
+    name = None
+    for num, wire, value, start, end in self._fields(packet_start, packet_end):
+      if num == PACKET_ROLE and wire == WIRE_VARINT:
+        role = ROLE_NAMES.get(value)
+      elif num == PACKET_NAME and wire == WIRE_LENGTH:
+        name = bytes(self._data[start:end]).decode('utf-8')
+      elif num > PACKET_NAME:
+        # Fields are serialized in order, nothing else is needed.
+        break
+    return PacketInfo(role, name, packet_start, packet_end)
+
+  def _fields(self, pos, end):
+    """Walk the fields of a message, yielding their locations.
+
+    Yields tuples of (field number, wire type, value, start, end), where value
+    is only set for varints, and start and end are the span of the field's
+    content.
+    """
+    while pos < end:
+      key, pos = self._varint(pos)
+      num = key >> 3
+      wire = key & 0x07
+      value = None
+      if wire == WIRE_VARINT:
+        value, next_pos = self._varint(pos)
+      elif wire == WIRE_FIXED64:
+        next_pos = pos + 8
+      elif wire == WIRE_LENGTH:
+        size, pos = self._varint(pos)
+        next_pos = pos + size
+      elif wire == WIRE_FIXED32:
+        next_pos = pos + 4
+      else:
+        raise errors.ValiantFormatError('unknown wire type %d' % wire)
+      if next_pos > end:
+        raise errors.ValiantFormatError('truncated field %d' % num)
+      yield (num, wire, value, pos, next_pos)
+      pos = next_pos
+
+  def _varint(self, pos):
+    result = 0
+    shift = 0
+    while True:
+      if pos >= self._end:
+        raise errors.ValiantFormatError('truncated varint')
+      b = asbyte(self._data[pos])
+      pos += 1
+      result |= (b & 0x7f) << shift
+      if not b & 0x80:
+        return result, pos
+      shift += 7
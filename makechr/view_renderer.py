@@ -1,13 +1,13 @@
 from PIL import Image, ImageDraw
 from constants import *
+import changed_file_writer
+import errors
 import math
 import os
+import resource_cache
 import rgb
 
 
-pkg_resources = None
-
-
 GRAY_COLOR = (64, 64, 64)
 ERROR_GRID_COLOR  = (0xf0, 0x20, 0x20)
 ERROR_GRID_COLOR2 = (0xf0, 0x80, 0x80)
@@ -43,13 +43,16 @@ LEGACY_REUSE_COLORS = [(0xff, 0xff, 0xff), # white (common)
 
 
 class ViewRenderer(object):
-  def __init__(self, is_legacy=False, scale=None):
+  def __init__(self, is_legacy=False, scale=None, file_writer=None,
+               rgb_mapping=None):
     self.img = None
     self.draw = None
-    self.font = None
+    self.tile_bitmaps = {}
     self.empty_tile = None
     self.is_legacy = is_legacy
     self.scale = scale or SCALE_FACTOR
+    self.file_writer = file_writer or changed_file_writer.ChangedFileWriter()
+    self.rgb_mapping = rgb_mapping or rgb.get_mapping()
 
   def create_file(self, outfile, width, height, color=None):
     if color is None:
@@ -60,7 +63,7 @@ class ViewRenderer(object):
 
   def save_file(self):
     if self.outfile:
-      self.img.save(self.outfile)
+      self.file_writer.write_image(self.outfile, self.img)
     return self.img
 
   def determine_empty_tile(self, ppu_memory):
@@ -78,7 +81,7 @@ class ViewRenderer(object):
     return (r,g,b)
 
   def palette_option_to_colors(self, poption):
-    return [self.to_tuple(rgb.RGB_COLORS[p]) for p in poption]
+    return [self.to_tuple(self.rgb_mapping.colors[p]) for p in poption]
 
   def reuse_count_to_color(self, count, scheme):
     table = REUSE_COLORS if scheme != 'legacy' else LEGACY_REUSE_COLORS
@@ -89,44 +92,29 @@ class ViewRenderer(object):
     # Common is represented by index 0.
     return table[0]
 
-  def load_nt_font(self):
-    global pkg_resources
-    if not pkg_resources:
-      import pkg_resources
-    self.font = [None] * 16
-    if not self.is_legacy:
-      w = self.font_width = 3
-      h = self.font_height = 5
-      rel = 'res/nt_tiny.png'
-    else:
-      w = self.font_width = 7
-      h = self.font_height = 11
-      rel = 'res/nt_font.png'
-    font_img = Image.open(pkg_resources.resource_stream('makechr', rel))
-    for n in range(16):
-      self.font[n] = font_img.crop([n*w,0,n*w+w,h])
-    font_img.close()
-
-  def replace_color(self, img, old, new):
-    img = img.copy()
-    pixels = img.load()
-    old_color = (old // 0x10000, (old // 0x100) % 0x100, old % 0x100)
-    new_color = (new // 0x10000, (new // 0x100) % 0x100, new % 0x100)
-    (cols, rows) = img.size
-    for y in range(rows):
-      for x in range(cols):
-        tuple = pixels[x, y]
-        curr_color = (tuple[0], tuple[1], tuple[2])
-        if curr_color == old_color:
-          pixels[x, y] = new_color
-    return img
-
-  def color_and_scale(self, img, old, new):
-    img = self.replace_color(img, old, new)
-    if self.scale != 1:
-      img = img.resize((img.size[0] * self.scale, img.size[1] * self.scale),
+  def tile_bitmap(self, tile, gray_palette, factor):
+    """Get the chr tile as a bitmap, colored with grays and scaled.
+
+    Results are cached, keyed by tile bytes, palette and scale.
+    """
+    key = (bytes(bytearray(tile.get_bytes())), tuple(gray_palette), factor)
+    if not key in self.tile_bitmaps:
+      pixels = bytearray([tile.get_pixel(y, x) for y in range(8)
+                          for x in range(8)])
+      img = Image.frombytes('P', (8, 8), bytes(pixels))
+      colors = []
+      for gray in gray_palette:
+        colors += [gray, gray, gray]
+      img.putpalette(colors)
+      self.tile_bitmaps[key] = self.scale_bitmap(img, factor)
+    return self.tile_bitmaps[key]
+
+  def scale_bitmap(self, img, factor):
+    if factor != 1:
+      img = img.resize((img.size[0] * factor, img.size[1] * factor),
                        Image.NEAREST)
-    return img
+    # Convert once, so that pasting doesn't need to.
+    return img.convert('RGB')
 
   def draw_block(self, block_y, block_x, poption):
     s = self.scale * 8
@@ -178,18 +166,12 @@ class ViewRenderer(object):
     if scheme != 'legacy':
       s *= 2
       t *= 2
-    for y in range(8):
-      for x in range(8):
-        base_y = tile_y * (s + 1)
-        base_x = tile_x * (s + 1)
-        pixel = tile.get_pixel(y, x)
-        if scheme != 'legacy':
-          gray = GRAY_PALETTE[pixel]
-        else:
-          gray = LEGACY_GRAY_PALETTE[pixel]
-        self.draw.rectangle([base_x + x * t, base_y + y * t,
-                             base_x + x * t + t - 1, base_y + y * t + t - 1],
-                             (gray, gray, gray))
+      gray_palette = GRAY_PALETTE
+    else:
+      gray_palette = LEGACY_GRAY_PALETTE
+    base_y = tile_y * (s + 1)
+    base_x = tile_x * (s + 1)
+    self.img.paste(self.tile_bitmap(tile, gray_palette, t), (base_x, base_y))
 
   def draw_reuse_square(self, tile_y, tile_x, count, scheme):
     s = self.scale * 8
@@ -213,31 +195,12 @@ class ViewRenderer(object):
     self.draw.rectangle([j+0,i+0,j+s*2,i+s*2], (0,0,0,255))
 
   def draw_nt_value(self, tile_y, tile_x, nt):
-    try:
-      if self.is_legacy:
-        s = self.scale * 8
-        x = tile_x * s + 1
-        y = tile_y * s + 3
-        w = 7
-        h = 11
-        offset = 7
-        upper = self.font[nt // 16]
-        lower = self.font[nt % 16]
-      else:
-        s = self.scale * 8
-        x = tile_x * s + 1
-        y = tile_y * s + 1
-        w = self.font_width * self.scale
-        h = self.font_height * self.scale
-        offset = int(3.5 * self.scale)
-        upper = self.color_and_scale(self.font[nt // 16], 0xffffff, 0xc0c0c0)
-        lower = self.color_and_scale(self.font[nt % 16], 0xffffff, 0x909090)
-      # Left digit (upper nibble).
-      self.img.paste(upper, [x, y, x + w, y + h])
-      # Right digit (lower nibble).
-      self.img.paste(lower, [x + offset, y, x + offset + w, y + h])
-    except IndexError:
-      pass
+    s = self.scale * 8
+    x = tile_x * s + 1
+    y = tile_y * s + (3 if self.is_legacy else 1)
+    atlas = resource_cache.nt_value_atlas(self.is_legacy, self.scale)
+    if 0 <= nt < len(atlas):
+      self.img.paste(atlas[nt], (x, y))
 
   def draw_error(self, y, x, sz):
     # Inner line.
@@ -357,7 +320,6 @@ class ViewRenderer(object):
     ppu_memory: Ppu memory containing nametable.
     """
     width, height = (256 * self.scale, 240 * self.scale)
-    self.load_nt_font()
     self.determine_empty_tile(ppu_memory)
     bg_color = (0, 0, 0) if not self.is_legacy else (255, 255, 255)
     self.create_file(outfile, width, height, bg_color)
@@ -416,14 +378,14 @@ class ViewRenderer(object):
     draw = ImageDraw.Draw(create)
     for z in ppu_memory.zones:
       draw.rectangle(z.rect(), outline=(0xff,0,0))
-    create.save(outfile)
+    self.file_writer.write_image(outfile, create)
 
   def create_error_view(self, outfile, img, errs, has_grid=True):
     """Create an image that shows the errors.
 
     outfile: Filename to output the error display to.
     img: Input pixel art image.
-    errs: List of errors created by processor.
+    errs: ErrorCollector from the processor, or a list of errors.
     has_grid: Whether to draw a grid on the image.
     """
     orig_wide, orig_high = img.size
@@ -434,23 +396,16 @@ class ViewRenderer(object):
     if has_grid:
       self.draw_grid(make_wide, make_high)
     s = self.scale * 8
-    # Draw errors.
-    for e in errs:
-      if hasattr(e, 'list_blocks'):
-        for block_y,block_x in e.list_blocks:
-          y = block_y * 16 * self.scale
-          x = block_x * 16 * self.scale
-          self.draw_error(y, x, s * 2)
-      if (getattr(e, 'tile_y', None) is not None and
-          getattr(e, 'tile_x', None) is not None):
-        y = e.tile_y * 8 * self.scale
-        x = e.tile_x * 8 * self.scale
-        self.draw_error(y, x, s)
-      elif (getattr(e, 'block_y', None) is not None and
-            getattr(e, 'block_x', None) is not None):
-        y = e.block_y * 16 * self.scale
-        x = e.block_x * 16 * self.scale
-        self.draw_error(y, x, s * 2)
+    # Draw errors, once per cell.
+    if isinstance(errs, errors.ErrorCollector):
+      cells = errs.cells()
+    else:
+      cells = errors.find_cells(errs)
+    for is_block, y, x in cells:
+      if is_block:
+        self.draw_error(y * 16 * self.scale, x * 16 * self.scale, s * 2)
+      else:
+        self.draw_error(y * 8 * self.scale, x * 8 * self.scale, s)
     return self.save_file()
 
   def create_grid_view(self, outfile, img):
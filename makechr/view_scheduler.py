@@ -0,0 +1,79 @@
+import time
+
+
+class ViewScheduler(object):
+  """Renders views on a pool of threads.
+
+  Views are added as tasks, then started all at once. Rendering runs in the
+  background, so that other work, such as writing components, can happen at
+  the same time. Pillow releases the GIL for most of its heavy operations,
+  like resizing and encoding, so views render in parallel.
+
+  jobs: Number of threads to use. Defaults to the number of cpus. If 1, views
+      are rendered immediately, on the calling thread.
+  keep_pool: Whether to keep the threads after waiting, so that the scheduler
+      can render more views. Call close when done with it.
+  """
+
+  def __init__(self, jobs=None, keep_pool=False):
+    self.jobs = jobs
+    self.keep_pool = keep_pool
+    self.timings = []
+    self._tasks = []
+    self._pool = None
+    self._pending = None
+    self._results = None
+
+  def add(self, name, func, *args):
+    """Add a view to render, by calling func(*args)."""
+    self._tasks.append((name, func, args))
+
+  def start(self):
+    """Start rendering all of the views that have been added."""
+    self.timings = []
+    self._results = None
+    # Clear the tasks, so that more can be added if the pool is kept.
+    tasks = self._tasks
+    self._tasks = []
+    jobs = len(tasks)
+    if jobs > 1:
+      # Only needed to render more than one view, so imported when used.
+      import multiprocessing
+      jobs = min(self.jobs or multiprocessing.cpu_count(), jobs)
+    if jobs <= 1:
+      self._results = [self._run(task) for task in tasks]
+      return
+    if self._pool is None:
+      from multiprocessing.pool import ThreadPool
+      self._pool = ThreadPool(jobs)
+    self._pending = self._pool.map_async(self._run, tasks)
+
+  def wait(self):
+    """Wait for all views to finish, returning a dict of name to result.
+
+    If rendering any view raised an exception, it is raised here.
+    """
+    if self._results is None and self._pending is None:
+      self.start()
+    if self._pending is not None:
+      try:
+        self._results = self._pending.get()
+      finally:
+        self._pending = None
+        if not self.keep_pool:
+          self.close()
+    return dict(self._results)
+
+  def close(self):
+    """Stop the threads, waiting for any views that are rendering."""
+    if self._pool is not None:
+      self._pool.close()
+      self._pool.join()
+      self._pool = None
+
+  def _run(self, task):
+    name, func, args = task
+    start_time = time.time()
+    result = func(*args)
+    self.timings.append((name, time.time() - start_time))
+    return (name, result)
@@ -0,0 +1,99 @@
+import general_app_test_util
+import unittest
+
+from PIL import Image
+
+import context
+import animation_processor
+import errors
+
+
+class AnimationProcessorTests(general_app_test_util.GeneralAppTests):
+  def setUp(self):
+    general_app_test_util.GeneralAppTests.setUp(self)
+    self.args.is_sprite = True
+    self.args.clear_views()
+    self.golden_file_prefix = 'animation-sheet'
+
+  def process_sheet(self, jobs):
+    img = Image.open('testdata/animation-sheet.png')
+    frames = animation_processor.split_frames(img, 40, 40)
+    self.processor = animation_processor.AnimationProcessor()
+    self.processor.process_frames(frames, None, 0x31, 0x30, jobs)
+    self.ppu_memory = self.processor.ppu_memory()
+    self.err = self.processor.err()
+
+  def test_process_frames(self):
+    self.process_sheet(1)
+    self.assertFalse(self.err.has())
+    self.create_output()
+    self.assert_output_result('chr')
+    self.assert_output_result('palette')
+    self.assert_output_result_json('sprite_picdata')
+
+  def test_process_frames_in_workers(self):
+    self.process_sheet(2)
+    self.assertFalse(self.err.has())
+    self.create_output()
+    self.assert_output_result('chr')
+    self.assert_output_result('palette')
+    self.assert_output_result_json('sprite_picdata')
+
+  def test_frames_share_chr(self):
+    self.process_sheet(1)
+    picdata = self.ppu_memory.sprite_picdata
+    self.assertEqual([f['frame'] for f in picdata], [0, 1, 2, 3])
+    # Second frame is the first one mirrored, third is empty, fourth is the
+    # first one moved.
+    first = picdata[0]['pictures'][0]['elems']
+    mirrored = picdata[1]['pictures'][0]['elems']
+    self.assertEqual(picdata[2]['pictures'], [])
+    self.assertEqual(picdata[3]['pictures'][0]['elems'], first)
+    self.assertEqual(sorted(set(e['tile'] for e in mirrored)),
+                     sorted(set(e['tile'] for e in first)))
+    self.assertTrue(any(e['attr'] & 0x40 for e in mirrored))
+    self.assertEqual(self.ppu_memory.chr_set.size(), 7)
+
+  def test_frame_errors(self):
+    img = Image.open('testdata/animation-sheet.png')
+    frames = animation_processor.split_frames(img, 40, 40)
+    frames[1].putpixel((12, 10), (0x80, 0xd0, 0x10))
+    self.processor = animation_processor.AnimationProcessor()
+    self.processor.process_frames(frames, None, 0x31, 0x30, 2)
+    es = self.processor.err().get()
+    self.assertEqual(len(es), 1)
+    self.assertIsInstance(es[0], errors.CouldntConvertRGB)
+    self.assertEqual(es[0].frame, 1)
+    self.assertEqual(es[0].args, ((0x80, 0xd0, 0x10), 1, 1, 2, 4))
+    self.assertIsNone(self.processor.ppu_memory().sprite_picdata)
+
+  def test_frame_errors_kept_apart(self):
+    img = Image.open('testdata/animation-sheet.png')
+    frames = animation_processor.split_frames(img, 40, 40)
+    frames[0].putpixel((12, 10), (0x80, 0xd0, 0x10))
+    frames[3].putpixel((12, 10), (0x80, 0xd0, 0x10))
+    self.processor = animation_processor.AnimationProcessor()
+    self.processor.process_frames(frames, None, 0x31, 0x30, 2)
+    es = self.processor.err().get()
+    self.assertEqual([e.frame for e in es], [0, 3])
+    self.assertEqual([str(e) for e in es],
+                     [': R 80, G d0, B 10 @ tile (1y,1x) / pixel (10y,12x)'] * 2)
+
+  def test_split_frames(self):
+    img = Image.new('RGB', (24, 16))
+    img.putpixel((9, 8), (0xff, 0, 0))
+    frames = animation_processor.split_frames(img, 8, 8)
+    self.assertEqual(len(frames), 6)
+    self.assertEqual(frames[4].getpixel((1, 0)), (0xff, 0, 0))
+    with self.assertRaises(errors.CommandLineArgError):
+      animation_processor.split_frames(img, 16, 8)
+
+  def test_parse_frame_grid(self):
+    self.assertEqual(animation_processor.parse_frame_grid('32x24'), (32, 24))
+    for text in ['32', '0x8', 'axb', '']:
+      with self.assertRaises(errors.CommandLineArgError):
+        animation_processor.parse_frame_grid(text)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -42,6 +42,20 @@ class AppBinTests(general_app_test_util.GeneralAppTests):
     self.assert_file_eq(self.args.grid_view,
                         self.golden('grid', 'png'))
 
+  def test_views_finished_when_output_fails(self):
+    """Views are waited for, even if writing the output fails."""
+    img = Image.open('testdata/full-image.png')
+    self.process_image(img)
+    self.args.output = self.args.tmpfile('missing/actual-%s.dat')
+    self.args.jobs = 2
+    a = app.Application()
+    views = a.schedule_views(self.ppu_memory, self.args, img)
+    with self.assertRaises(IOError):
+      a.create_output_with_views(self.ppu_memory, self.args,
+                                 self.args.traversal, self.args.platform, views)
+    self.assertIsNone(views._pool)
+    self.assert_file_eq(self.args.chr_view, self.golden('chr', 'png'))
+
   def test_output(self):
     """Basic usage."""
     img = Image.open('testdata/full-image.png')
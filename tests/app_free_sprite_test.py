@@ -4,7 +4,7 @@ import unittest
 from PIL import Image
 
 import context
-from makechr import app, bg_color_spec
+import app, bg_color_spec
 
 
 class AppFreeSpriteTests(general_app_test_util.GeneralAppTests):
@@ -0,0 +1,82 @@
+import unittest
+
+import context
+import app
+import general_app_test_util
+
+import io
+import os
+import shutil
+import sys
+
+
+class AppWatchTests(general_app_test_util.GeneralAppTests):
+  def setUp(self):
+    general_app_test_util.GeneralAppTests.setUp(self)
+    self.args.clear_views()
+    self.args.traversal_strategy = None
+    self.args.palette = None
+    self.args.makepal = False
+    self.args.decompose_sprites = False
+    self.args.show_stats = False
+    self.args.error_outfile = None
+    self.args.write_if_changed = True
+    self.filename = self.args.tmppng('input')
+    self.app = app.Application()
+    self.app.incremental = True
+
+  def read(self, filename):
+    fp = open(filename, 'rb')
+    content = fp.read()
+    fp.close()
+    return content
+
+  def rebuild(self, source):
+    shutil.copyfile(source, self.filename)
+    stdout = sys.stdout
+    sys.stdout = io.StringIO()
+    try:
+      success = self.app.rebuild(self.filename, self.args)
+      self.output = sys.stdout.getvalue()
+    finally:
+      sys.stdout = stdout
+    self.assertTrue(success)
+    self.assertIn('Built "%s" in ' % self.filename, self.output)
+
+  def test_rebuild_reuses_processor(self):
+    self.rebuild('testdata/full-image.png')
+    processor = self.app._processor
+    self.assertTrue(processor.incremental)
+    self.assert_output_result('chr')
+    self.assert_output_result('attribute')
+    self.rebuild('testdata/full-image-bottom-attr.png')
+    self.assertTrue(self.app._processor is processor)
+    self.assert_output_result('attribute', '-bottom-attr')
+    self.assertIn('Unchanged files: 2 of 4', self.output)
+
+  def test_rebuild_same_image(self):
+    self.rebuild('testdata/full-image.png')
+    chr_file = self.args.output % 'chr'
+    os.remove(chr_file)
+    # Pixels are the same, but a missing output is written again.
+    self.rebuild('testdata/full-image.png')
+    self.assertTrue(os.path.exists(chr_file))
+    self.assert_output_result('chr')
+    self.assertIn('Unchanged files: 3 of 4', self.output)
+
+  def test_rebuild_vertical_pixel_display(self):
+    self.args.vertical_pixel_display = True
+    chr_file = self.args.output % 'chr'
+    self.rebuild('testdata/full-image.png')
+    first = self.read(chr_file)
+    # Chr is transposed for output, the processor's memory isn't changed.
+    self.rebuild('testdata/full-image.png')
+    self.assertEqual(self.read(chr_file), first)
+    self.assertIn('Unchanged files: 4 of 4', self.output)
+    self.args.vertical_pixel_display = False
+    self.rebuild('testdata/full-image.png')
+    self.assert_output_result('chr')
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,70 @@
+import threading
+import unittest
+
+import context
+import background_worker, errors
+
+
+class BackgroundWorkerTests(unittest.TestCase):
+  def setUp(self):
+    self.delivered = threading.Event()
+    self.calls = []
+    self.worker = background_worker.BackgroundWorker(self.call_after)
+
+  def tearDown(self):
+    self.worker.stop()
+
+  def call_after(self, func, *args):
+    # Stands in for the main thread.
+    func(*args)
+
+  def on_done(self, result):
+    self.calls.append(('done', result))
+    self.delivered.set()
+
+  def on_error(self, e):
+    self.calls.append(('error', str(e)))
+    self.delivered.set()
+
+  def test_run_job(self):
+    progress = []
+    def work(job):
+      job.report('working')
+      return 42
+    self.worker.submit(work, self.on_done, self.on_error, progress.append)
+    self.assertTrue(self.delivered.wait(5))
+    self.assertEqual(progress, ['working'])
+    self.assertEqual(self.calls, [('done', 42)])
+
+  def test_error(self):
+    def work(job):
+      raise errors.UnknownLogicFailure('bad')
+    self.worker.submit(work, self.on_done, self.on_error)
+    self.assertTrue(self.delivered.wait(5))
+    self.assertEqual(self.calls, [('error', 'UnknownLogicFailure: "bad"')])
+
+  def test_newer_job_cancels(self):
+    started = threading.Event()
+    release = threading.Event()
+    cancelled = []
+    def slow(job):
+      started.set()
+      release.wait(5)
+      try:
+        job.check()
+      except errors.Cancelled:
+        cancelled.append(True)
+        raise
+      return 'slow'
+    first = self.worker.submit(slow, self.on_done, self.on_error)
+    self.assertTrue(started.wait(5))
+    self.worker.submit(lambda job: 'fast', self.on_done, self.on_error)
+    self.assertTrue(first.is_cancelled())
+    release.set()
+    self.assertTrue(self.delivered.wait(5))
+    self.assertEqual(cancelled, [True])
+    self.assertEqual(self.calls, [('done', 'fast')])
+
+
+if __name__ == '__main__':
+  unittest.main()
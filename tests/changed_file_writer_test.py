@@ -0,0 +1,71 @@
+import unittest
+
+import context
+import changed_file_writer
+
+import os
+from PIL import Image
+import tempfile
+
+
+class ChangedFileWriterTests(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.filename = os.path.join(self.dir, 'out.dat')
+
+  def read(self, filename):
+    fp = open(filename, 'rb')
+    content = fp.read()
+    fp.close()
+    return content
+
+  def test_always_write(self):
+    writer = changed_file_writer.ChangedFileWriter()
+    self.assertTrue(writer.write(self.filename, b'\x01\x02'))
+    self.assertTrue(writer.write(self.filename, b'\x01\x02'))
+    self.assertEqual(writer.num_written, 2)
+    self.assertEqual(writer.num_unchanged, 0)
+
+  def test_write_if_changed(self):
+    writer = changed_file_writer.ChangedFileWriter(only_if_changed=True)
+    self.assertTrue(writer.write(self.filename, b'\x01\x02'))
+    os.utime(self.filename, (1000, 1000))
+    self.assertFalse(writer.write(self.filename, b'\x01\x02'))
+    self.assertEqual(os.path.getmtime(self.filename), 1000)
+    # Same size, different content.
+    self.assertTrue(writer.write(self.filename, b'\x01\x03'))
+    self.assertEqual(self.read(self.filename), b'\x01\x03')
+    # Different size.
+    self.assertTrue(writer.write(self.filename, b'\x01'))
+    self.assertEqual(self.read(self.filename), b'\x01')
+    self.assertEqual(writer.num_written, 3)
+    self.assertEqual(writer.num_unchanged, 1)
+    # No temporary files are left behind.
+    self.assertEqual(os.listdir(self.dir), ['out.dat'])
+
+  @unittest.skipIf(os.name == 'nt', 'posix permissions')
+  def test_permissions(self):
+    writer = changed_file_writer.ChangedFileWriter(only_if_changed=True)
+    umask = os.umask(0o027)
+    try:
+      writer.write(self.filename, b'\x01')
+    finally:
+      os.umask(umask)
+    # New files get the usual permissions.
+    self.assertEqual(os.stat(self.filename).st_mode & 0o777, 0o640)
+    # Replaced files keep their permissions.
+    os.chmod(self.filename, 0o604)
+    writer.write(self.filename, b'\x02')
+    self.assertEqual(os.stat(self.filename).st_mode & 0o777, 0o604)
+
+  def test_write_image(self):
+    writer = changed_file_writer.ChangedFileWriter(only_if_changed=True)
+    filename = os.path.join(self.dir, 'out.png')
+    img = Image.new('RGB', (8, 8), (0x40, 0x40, 0x40))
+    self.assertTrue(writer.write_image(filename, img))
+    self.assertFalse(writer.write_image(filename, img))
+    self.assertEqual(Image.open(filename).getpixel((0, 0)), (0x40, 0x40, 0x40))
+
+
+if __name__ == '__main__':
+  unittest.main()
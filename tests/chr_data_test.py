@@ -71,6 +71,19 @@ class ChrDataTests(unittest.TestCase):
     b = page.to_bytes()
     self.assertEqual(b, raw_data + raw_data[16:32])
 
+  def test_chr_page_transposed(self):
+    raw_data = bytes(bytearray(range(32)))
+    page = chr_data.ChrBank.from_binary(raw_data)
+    make = page.transposed()
+    self.assertIsInstance(make, chr_data.ChrBank)
+    self.assertEqual(make.size(), 2)
+    # The original page is left alone.
+    self.assertEqual(page.to_bytes(), raw_data)
+    expect = chr_data.ChrTile()
+    expect.set(raw_data[16:32])
+    expect.transpose_pixel_order()
+    self.assertEqual(make.get(1), expect)
+
   def test_sorted_chr_page(self):
     data = bytes(bytearray(range(64)))
     input = data[16:32] + data[48:64] + data[32:48] + data[48:64] + data[0:16]
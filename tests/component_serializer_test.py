@@ -0,0 +1,56 @@
+import unittest
+
+import context
+import bg_color_spec, component_serializer, image_processor, ppu_memory
+
+from PIL import Image
+
+
+class ComponentSerializerTests(unittest.TestCase):
+  def setUp(self):
+    img = Image.open('testdata/full-image.png')
+    bg_color = bg_color_spec.default()
+    processor = image_processor.ImageProcessor()
+    processor.process_image(img, None, bg_color.mask, bg_color.fill, None,
+                            'horizontal', False, False, False, [])
+    self.mem = processor.ppu_memory()
+    self.config = ppu_memory.PpuMemoryConfig(traversal='horizontal',
+                                               select_chr_plane=None)
+
+  def test_components(self):
+    serializer = component_serializer.ComponentSerializer(self.mem)
+    enabled = set(['nametable', 'chr', 'palette', 'attribute'])
+    components = serializer.components(self.config, enabled)
+    self.assertEqual([c.name for c in components],
+                     ['nametable', 'chr', 'palette', 'attribute'])
+    sizes = [len(c.data) for c in components]
+    self.assertEqual(sizes[0], 0x3c0)
+    self.assertEqual(sizes[2], 0x10)
+    self.assertEqual(sizes[3], 0x40)
+
+  def test_built_once(self):
+    serializer = component_serializer.ComponentSerializer(self.mem)
+    enabled = set(['nametable', 'chr', 'palette', 'attribute'])
+    first = serializer.components(self.config, enabled)
+    second = serializer.components(self.config, enabled)
+    for a, b in zip(first, second):
+      self.assertIs(a.data, b.data)
+    self.assertIs(serializer.memory_image('nametable'), first[0].data)
+
+  def test_extracted(self):
+    c = component_serializer.Component('palette', b'\x01\x02', null_value=0x0f,
+                                       size=0x10, order=1, extract=0x20)
+    self.assertEqual(c.extracted(), b'\x0f' * 0x10 + b'\x01\x02' +
+                     b'\x0f' * 0x0e)
+    c = component_serializer.Component('nametable', b'\x01\x02')
+    self.assertIs(c.extracted(), c.data)
+
+  def test_memory_image(self):
+    serializer = component_serializer.ComponentSerializer(self.mem)
+    self.assertEqual(len(serializer.memory_image('palette')), 0x20)
+    self.assertEqual(len(serializer.memory_image('chr')), 0x2000)
+    self.assertEqual(len(serializer.memory_image('attribute')), 0x40)
+
+
+if __name__ == '__main__':
+  unittest.main()
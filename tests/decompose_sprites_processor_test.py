@@ -42,6 +42,44 @@ class DecomposeSpritesProcessorTests(general_app_test_util.GeneralAppTests):
     self.assert_output_result('palette')
     self.assert_output_result_json('sprite_picdata')
 
+  def test_calculate_overlaps(self):
+    PicElem = decompose_sprites_processor.PicElem
+    picture = [PicElem(0, 0, 0), PicElem(1, 0, 5), PicElem(2, 6, 2),
+               PicElem(3, 40, 40)]
+    overlaps = self.processor.calculate_overlaps(picture)
+    # Right 3 columns covered by the 2nd element, bottom 2 rows by the 3rd.
+    self.assertEqual(overlaps[0], [0xe0] * 6 + [0xfc] * 2)
+    # Left 3 columns covered by the 1st element, bottom 2 rows left 5 by 3rd.
+    self.assertEqual(overlaps[1], [0x07] * 6 + [0x1f] * 2)
+    self.assertEqual(overlaps[2], [0xff, 0xff, 0, 0, 0, 0, 0, 0])
+    self.assertEqual(overlaps[3], [0] * 8)
+
+  def test_apply_dots_overlap(self):
+    self.processor.mask_nc = 0x31
+    tile = bytes(bytearray([0x16] * 64))
+    masked = bytearray(
+      self.processor.apply_dots_overlap([0x81, 0, 0, 0, 0, 0, 0, 0x01], tile))
+    self.assertEqual([k for k in range(64) if masked[k] == 0x31],
+                     [0, 7, 56])
+    self.assertIs(self.processor.apply_dots_overlap([0] * 8, tile), tile)
+
+  def test_tile_color_needs(self):
+    tile = bytes(bytearray([0x30] * 8 + [0x16, 0x0f] * 4 + [0x30] * 48))
+    self.assertEqual(self.processor.tile_color_needs(tile),
+                     bytearray([0x30, 0x16, 0x0f, 0xff]))
+    tile = bytes(bytearray([5, 4, 3, 2, 1] + [0] * 59))
+    self.assertEqual(self.processor.tile_color_needs(tile),
+                     bytearray([5, 4, 3, 2]))
+
+  def test_build_tile_from_colors(self):
+    # Second row uses each color of the option, the rest of the tile is an
+    # unknown color that becomes 0.
+    tile = bytes(bytearray([0x20] * 8 + [0x30, 0x16, 0x0f, 0x12] * 2 +
+                           [0x20] * 48))
+    chr_tile = self.processor.build_tile_from_colors(tile,
+                                                     [0x30, 0x16, 0x0f, 0x12])
+    self.assertEqual(chr_tile.low, [0, 0x55, 0, 0, 0, 0, 0, 0])
+    self.assertEqual(chr_tile.hi, [0, 0x33, 0, 0, 0, 0, 0, 0])
 
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+import context
+import errors
+
+
+class ErrorCollectorTests(unittest.TestCase):
+  def test_find_tile_and_block(self):
+    collector = errors.ErrorCollector()
+    tile_err = errors.PaletteOverflowError(2, 10)
+    block_err = errors.PaletteOverflowError(1, 3, is_block=True)
+    collector.add(tile_err)
+    collector.add(block_err)
+    self.assertIs(collector.find(2, 10), tile_err)
+    self.assertIs(collector.find(2, 6), block_err)
+    self.assertIs(collector.find(3, 7), block_err)
+    self.assertIsNone(collector.find(2, 11))
+    self.assertIsNone(collector.find(None, 1))
+
+  def test_find_earliest(self):
+    collector = errors.ErrorCollector()
+    block_err = errors.PaletteOverflowError(1, 3, is_block=True)
+    tile_err = errors.PaletteOverflowError(2, 6)
+    collector.add(block_err)
+    collector.add(tile_err)
+    self.assertIs(collector.find(2, 6), block_err)
+
+  def test_find_list_blocks(self):
+    collector = errors.ErrorCollector()
+    e = errors.PaletteTooManySubsets([[0x30]])
+    collector.add(e)
+    collector.add_block(e, 4, 5)
+    self.assertEqual(e.list_blocks, [[4, 5]])
+    self.assertIs(collector.find(9, 10), e)
+    self.assertIsNone(collector.find(9, 12))
+
+  def test_cells_and_counts(self):
+    collector = errors.ErrorCollector()
+    collector.add(errors.CouldntConvertRGB((1, 2, 3), 0, 1, 0, 0))
+    collector.add(errors.PaletteOverflowError(1, 3, is_block=True))
+    collector.add(errors.CouldntConvertRGB((1, 2, 3), 0, 1, 4, 4))
+    collector.add(errors.CouldntConvertRGB((1, 2, 3), 5, 5, 0, 0))
+    self.assertEqual(len(collector.get()), 2)
+    self.assertEqual(collector.get()[0].count, 3)
+    self.assertEqual(collector.cells(),
+                     [(True, 1, 3), (False, 0, 1), (False, 5, 5)])
+    self.assertEqual(collector.counts(),
+                     [('CouldntConvertRGB', 1), ('PaletteOverflowError', 1)])
+    self.assertEqual(errors.find_cells(collector.get(include_dups=True)),
+                     collector.cells())
+
+
+if __name__ == '__main__':
+  unittest.main()
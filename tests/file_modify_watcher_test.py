@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import context
+import file_modify_watcher
+
+
+class ManualTimer(object):
+  def __init__(self, function, args):
+    self.function = function
+    self.args = args
+    self.is_started = False
+    self.is_cancelled = False
+
+  def start(self):
+    self.is_started = True
+
+  def cancel(self):
+    self.is_cancelled = True
+
+
+class ManualTimers(object):
+  """Makes timers that only go off when fired, instead of after a delay."""
+  def __init__(self):
+    self.timers = []
+
+  def __call__(self, interval, function, args):
+    timer = ManualTimer(function, args)
+    self.timers.append(timer)
+    return timer
+
+  def fire(self):
+    """Fire each timer that is started and not cancelled. Returns how many."""
+    timers = self.timers
+    self.timers = []
+    live = [t for t in timers if t.is_started and not t.is_cancelled]
+    for t in live:
+      t.function(*t.args)
+    return len(live)
+
+
+class FileModifyWatcherTests(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.timers = ManualTimers()
+    self.watcher = file_modify_watcher.FileModifyWatcher(
+      make_timer=self.timers)
+    self.events = []
+    self.changed = threading.Event()
+
+  def tearDown(self):
+    self.watcher.stop()
+    self.watcher.finish()
+    shutil.rmtree(self.tmpdir)
+
+  def callback(self, e):
+    self.events.append(os.path.basename(e.filename))
+    self.changed.set()
+
+  def write(self, name, content):
+    filename = os.path.join(self.tmpdir, name)
+    fp = open(filename, 'wb')
+    fp.write(content)
+    fp.close()
+    return filename
+
+  def test_debounce_many_writes(self):
+    filename = self.write('a.png', b'first')
+    self.watcher.watch(filename, self.callback)
+    for i in range(4):
+      self.write('a.png', b'second' * (i + 1))
+      self.watcher.notify(filename)
+    # Each write restarts the timer, so only the last one goes off.
+    self.assertEqual(self.timers.fire(), 1)
+    self.assertEqual(self.events, ['a.png'])
+
+  def test_unchanged_content(self):
+    filename = self.write('a.png', b'same')
+    self.watcher.watch(filename, self.callback)
+    self.write('a.png', b'same')
+    self.watcher.notify(filename)
+    self.assertEqual(self.timers.fire(), 1)
+    self.assertEqual(self.events, [])
+
+  def test_many_files(self):
+    first = self.write('a.png', b'a')
+    second = self.write('b.png', b'b')
+    self.watcher.watch(first, self.callback)
+    self.watcher.watch(second, self.callback)
+    self.write('b.png', b'bb')
+    self.watcher.notify(second)
+    self.watcher.notify(os.path.join(self.tmpdir, 'other.png'))
+    self.assertEqual(self.timers.fire(), 1)
+    self.assertEqual(self.events, ['b.png'])
+    self.assertEqual(len(self.watcher.watching()), 2)
+
+  def test_unwatch(self):
+    filename = self.write('a.png', b'first')
+    self.watcher.watch(filename, self.callback)
+    self.write('a.png', b'second')
+    self.watcher.notify(filename)
+    self.watcher.unwatch(filename)
+    self.assertEqual(self.timers.fire(), 0)
+    self.assertEqual(self.events, [])
+
+  def test_observer_rename(self):
+    # Uses real timers, since the observer notifies from its own thread.
+    self.watcher.stop()
+    self.watcher = file_modify_watcher.FileModifyWatcher(debounce=0.05)
+    filename = self.write('a.png', b'first')
+    self.watcher.watch(filename, self.callback)
+    # Save by writing a temporary file, then renaming it over the original.
+    tmpname = self.write('a.png.tmp', b'second')
+    os.rename(tmpname, filename)
+    self.assertTrue(self.changed.wait(5))
+    self.assertEqual(self.events, ['a.png'])
+
+
+if __name__ == '__main__':
+  unittest.main()
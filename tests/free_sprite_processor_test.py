@@ -12,7 +12,7 @@ class FreeSpriteProcessorTests(unittest.TestCase):
   def add_region(self, top, left, right):
     region = data.Region(left=left, right=right)
     region.zones.append(data.Zone(left=left, right=right, top=top))
-    self.processor._regions.append(region)
+    self.processor._regions.insert(region)
 
   def set_zones(self, index, zones):
     self.processor._regions[index].zones = zones
@@ -31,6 +31,10 @@ class MockArgs(object):
     self.order = None
     self.compile = None
     self.vertical_pixel_display = False
+    self.write_if_changed = False
+    self.module = None
+    self.jobs = None
+    self.verbose = False
     self.select_chr_plane = None
     self.output = self.tmpfile('actual-%s.dat')
 
@@ -0,0 +1,102 @@
+import unittest
+
+import context
+import errors, image_processor
+
+from PIL import Image
+
+
+class ImageProcessorTests(unittest.TestCase):
+  def process(self, processor, img):
+    processor.process_image(img, None, None, None, None, 'horizontal',
+                            False, False, None, [])
+    self.assertFalse(processor.err().has())
+    mem = processor.ppu_memory()
+    return [bytes(mem.get_bytes(role)) for role in
+            ['nametable', 'chr', 'palette', 'attribute']]
+
+  def edit_image(self):
+    """Flip a tile into the top-left, then copy a block next to it."""
+    img = Image.open('testdata/full-image.png').convert('RGB')
+    img.paste(img.crop((40, 16, 48, 24)).transpose(Image.FLIP_TOP_BOTTOM),
+              (0, 0))
+    img.paste(img.crop((96, 96, 112, 112)), (16, 0))
+    return img
+
+  def test_incremental_matches_full(self):
+    processor = image_processor.ImageProcessor()
+    processor.incremental = True
+    self.process(processor, Image.open('testdata/full-image.png'))
+    edited = self.edit_image()
+    actual = self.process(processor, edited)
+    expect = self.process(image_processor.ImageProcessor(), edited)
+    self.assertEqual(actual, expect)
+
+  def test_incremental_only_processes_changed_tiles(self):
+    processor = image_processor.ImageProcessor()
+    processor.incremental = True
+    self.process(processor, Image.open('testdata/full-image.png'))
+    calls = []
+    real_process_tile = processor.process_tile
+    def counting_process_tile(tile_y, tile_x):
+      calls.append((tile_y, tile_x))
+      return real_process_tile(tile_y, tile_x)
+    processor.process_tile = counting_process_tile
+    self.process(processor, self.edit_image())
+    # Edited tiles whose pixels didn't exist anywhere in the previous image.
+    # Only the flipped tile is new, the copied block's tiles were seen before.
+    self.assertEqual(calls, [(0, 0)])
+
+  def test_incremental_unchanged_image(self):
+    processor = image_processor.ImageProcessor()
+    processor.incremental = True
+    self.process(processor, Image.open('testdata/full-image.png'))
+    mem = processor.ppu_memory()
+    self.process(processor, Image.open('testdata/full-image.png'))
+    self.assertIs(processor.ppu_memory(), mem)
+
+  def test_cancel(self):
+    processor = image_processor.ImageProcessor()
+    processor.incremental = True
+    checks = []
+    def cancel_check():
+      checks.append(1)
+      if len(checks) == 3:
+        raise errors.Cancelled()
+    processor.cancel_check = cancel_check
+    img = Image.open('testdata/full-image.png')
+    with self.assertRaises(errors.Cancelled):
+      self.process(processor, img)
+    # The cancelled run is not mistaken for a finished one.
+    processor.cancel_check = None
+    actual = self.process(processor, img)
+    expect = self.process(image_processor.ImageProcessor(), img)
+    self.assertEqual(actual, expect)
+
+  def noisy_image(self, noise):
+    """Image of black and white stripes, with noise added to the black."""
+    img = Image.new('RGB', (16, 16))
+    for y in range(16):
+      for x in range(16):
+        k = (y * 16 + x) % noise
+        if x % 4 < 2:
+          img.putpixel((x, y), (k // 8, k % 8, 0))
+        else:
+          img.putpixel((x, y), (0xff, 0xfe, 0xff))
+    return img
+
+  def test_nes_color_buffer(self):
+    processor = image_processor.ImageProcessor()
+    for noise in [1, 200]:
+      img = self.noisy_image(noise)
+      # Noisy images have too many colors for whole image operations.
+      self.assertEqual(len(img.getcolors()) > image_processor.MAX_LAYER_COLORS,
+                       noise > 1)
+      expect = bytes(bytearray([0x0f, 0x0f, 0x30, 0x30] * 64))
+      self.assertEqual(processor.nes_color_buffer(img), expect)
+      expect = bytes(bytearray([0, 0, 1, 1] * 64))
+      self.assertEqual(processor.fill_mask(img, 0x0f), expect)
+
+
+if __name__ == '__main__':
+  unittest.main()
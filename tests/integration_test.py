@@ -96,6 +96,15 @@ Palette: P/30-38-16-01/30-19/
     self.assert_file_eq(render_name, self.golden(None, 'png'))
     self.assertEqual(self.out, '')
 
+  def test_produce_image_double_wide(self):
+    render_name = os.path.join(self.tmpdir, 'double-render.png')
+    args = ['testdata/double-image.png', '-o', render_name]
+    self.makechr(args)
+    from PIL import Image
+    img = Image.open(render_name)
+    self.assertEqual((img.mode, img.size), ('RGB', (512, 240)))
+    self.assertEqual(self.out, '')
+
   def test_sprite_8x16(self):
     self.output_name = os.path.join(self.tmpdir, 'reticule.o')
     self.golden_file_prefix = 'reticule'
@@ -279,6 +288,88 @@ To see errors visually, use the "-e <error_image.png>" command-line option.
 """)
     self.assertEqual(self.returncode, 1)
 
+  def test_write_if_changed(self):
+    tmpl = os.path.join(self.tmpdir, '%s.dat')
+    rom = os.path.join(self.tmpdir, 'rom.nes')
+    args = ['testdata/full-image.png', '-o', tmpl, '-c', rom,
+            '--chr-view', os.path.join(self.tmpdir, 'chr.png'),
+            '--write-if-changed']
+    self.makechr(args)
+    self.assertEqual(self.out, 'Unchanged files: 0 of 6\n')
+    self.assert_file_eq(tmpl % 'chr', self.golden('chr', 'dat'))
+    self.assert_file_eq(rom, self.golden('rom', 'nes'))
+    # Make the files look old, so that rewriting them would be noticed.
+    for name in os.listdir(self.tmpdir):
+      os.utime(os.path.join(self.tmpdir, name), (1000, 1000))
+    self.makechr(args)
+    self.assertEqual(self.out, 'Unchanged files: 6 of 6\n')
+    for name in os.listdir(self.tmpdir):
+      self.assertEqual(os.path.getmtime(os.path.join(self.tmpdir, name)), 1000)
+    # Changing the input only rewrites the files that differ.
+    args[-1:] = ['-b', '16', '--write-if-changed']
+    self.makechr(args)
+    self.assertEqual(self.out, 'Unchanged files: 1 of 6\n')
+    self.assertEqual(os.path.getmtime(tmpl % 'attribute'), 1000)
+    self.assertNotEqual(os.path.getmtime(tmpl % 'palette'), 1000)
+
+  def test_archive(self):
+    archive = os.path.join(self.tmpdir, 'lib.vla')
+    for name, img in [('first', 'full-image.png'), ('second', 'full-image.png'),
+                      ('first', 'full-image-16color.png')]:
+      args = ['testdata/' + img, '-o', archive, '--module', name]
+      self.makechr(args)
+      self.assertEqual(self.out, '')
+    tmpl = os.path.join(self.tmpdir, '%s.dat')
+    args = [archive, '--module', 'second', '-o', tmpl]
+    self.makechr(args)
+    self.assert_file_eq(tmpl % 'nametable', self.golden('nametable', 'dat'))
+    self.assert_file_eq(tmpl % 'chr', self.golden('chr', 'dat'))
+    self.assertEqual(self.returncode, 0)
+
+  def test_archive_write_if_changed(self):
+    archive = os.path.join(self.tmpdir, 'lib.vla')
+    args = ['testdata/full-image.png', '-o', archive, '--module', 'first',
+            '--write-if-changed']
+    self.makechr(args)
+    self.assertEqual(self.out, 'Unchanged files: 0 of 1\n')
+    os.utime(archive, (1000, 1000))
+    self.makechr(args)
+    self.assertEqual(self.out, 'Unchanged files: 1 of 1\n')
+    self.assertEqual(os.path.getmtime(archive), 1000)
+
+  def test_archive_error_module(self):
+    archive = os.path.join(self.tmpdir, 'lib.vla')
+    args = ['testdata/full-image.png', '-o', archive]
+    self.makechr(args, is_expect_fail=True)
+    self.assertEqual(self.err,
+                     'Command-line error: archive output needs --module\n')
+    self.assertEqual(self.returncode, 1)
+    for name in ['first', 'second']:
+      self.makechr(['testdata/full-image.png', '-o', archive, '--module', name])
+    args = [archive, '-o', os.path.join(self.tmpdir, '%s.dat')]
+    self.makechr(args, is_expect_fail=True)
+    self.assertEqual(self.err, 'Command-line error: archive has 2 modules, '
+                     'pick one with --module\n')
+    self.assertEqual(self.returncode, 1)
+
+  def test_views_jobs(self):
+    views = ['chr', 'nametable', 'palette', 'reuse']
+    args = ['testdata/full-image.png', '-o', self.output_name, '--jobs', '4',
+            '--verbose']
+    for v in views:
+      args += ['--%s-view' % v, os.path.join(self.tmpdir, v + '.png')]
+    self.makechr(args)
+    self.assert_file_eq(self.output_name, self.golden(None, 'o'))
+    golden = {'chr': 'chr', 'nametable': 'nt', 'palette': 'pal',
+              'reuse': 'reuse'}
+    for v in views:
+      self.assert_file_eq(os.path.join(self.tmpdir, v + '.png'),
+                          self.golden(golden[v], 'png'))
+    lines = self.out.splitlines()
+    self.assertEqual([line.split(':')[0] for line in lines],
+                     ['View chr', 'View nametable', 'View palette',
+                      'View reuse'])
+
   def golden(self, name, ext):
     if name:
       return 'testdata/%s-%s.%s' % (self.golden_file_prefix, name, ext)
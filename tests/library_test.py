@@ -0,0 +1,66 @@
+import unittest
+
+import context
+import errors, library
+
+from PIL import Image
+
+
+class LibraryTests(unittest.TestCase):
+  def read_golden(self, name):
+    fp = open('testdata/full-image-%s.dat' % name, 'rb')
+    content = fp.read()
+    fp.close()
+    return content
+
+  def test_process_image(self):
+    img = Image.open('testdata/full-image.png')
+    result = library.process(img)
+    self.assertFalse(result.has_errors())
+    self.assertIsNotNone(result.ppu_memory)
+    self.assertEqual(sorted(result.components.keys()),
+                     ['attribute', 'chr', 'nametable', 'palette'])
+    for name in ['nametable', 'chr', 'palette', 'attribute']:
+      self.assertEqual(result.get(name), self.read_golden(name))
+
+  def test_process_filename(self):
+    result = library.process('testdata/full-image.png')
+    self.assertEqual(result.get('chr'), self.read_golden('chr'))
+
+  def test_options(self):
+    options = library.Options(is_sprite=True, order=0)
+    result = library.process('testdata/full-image.png', options)
+    self.assertIsNone(result.get('nametable'))
+    self.assertIsNotNone(result.get('spritelist'))
+    self.assertEqual(len(result.get('chr')), 0x2000)
+
+  def test_rgb_mapping(self):
+    # Images made with different rgb mappings, processed in one process.
+    fceux = library.process('testdata/full-image-fceux.png',
+                            library.Options(rgb_mapping='fceux'))
+    almighty = library.process('testdata/full-image.png')
+    self.assertFalse(fceux.has_errors())
+    self.assertEqual(fceux.components, almighty.components)
+    with self.assertRaises(errors.UnknownRgbMapping):
+      library.process('testdata/full-image.png',
+                      library.Options(rgb_mapping='unknown'))
+
+  def test_errors(self):
+    result = library.process('testdata/full-image-conflict.png')
+    self.assertTrue(result.has_errors())
+    self.assertEqual(result.components, {})
+
+  def test_invalid_options(self):
+    options = library.Options(traversal_strategy='8x16')
+    with self.assertRaises(errors.CommandLineArgError):
+      library.process('testdata/full-image.png', options)
+
+  def test_options_unchanged(self):
+    options = library.Options(decompose_sprites=True, bg_color='30=0f')
+    self.assertFalse(options.is_sprite)
+    library.process('testdata/full-image.png', options)
+    self.assertFalse(options.is_sprite)
+
+
+if __name__ == '__main__':
+  unittest.main()
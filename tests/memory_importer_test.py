@@ -19,6 +19,10 @@ class MockArgs(object):
     self.lock_sprite_flips = None
     self.select_chr_plane = None
     self.vertical_pixel_display = False
+    self.write_if_changed = False
+    self.module = None
+    self.jobs = None
+    self.verbose = False
     self.compile = None
 
   def tmpfile(self, template):
@@ -58,6 +62,44 @@ class MemoryImporterTests(unittest.TestCase):
     a.create_output(mem, self.args, 'horizontal', None)
     self.assert_equal_image(self.args.output, 'testdata/full-image.png')
 
+  def test_import_all(self):
+    dump_dir = tempfile.mkdtemp()
+    fp = open('testdata/full-image.mem', 'rb')
+    content = fp.read()
+    fp.close()
+    for name in ['a.mem', 'b.mem']:
+      fp = open(os.path.join(dump_dir, name), 'wb')
+      fp.write(content)
+      fp.close()
+    # Other files in the directory, that aren't dumps, are skipped.
+    fp = open(os.path.join(dump_dir, 'notes.txt'), 'w')
+    fp.write('not a dump')
+    fp.close()
+    importer = memory_importer.MemoryImporter()
+    results = list(importer.read_ram_all(dump_dir))
+    self.assertEqual([os.path.basename(f) for f, mem in results],
+                     ['a.mem', 'b.mem'])
+    mem = importer.decode_ram(content)
+    for f, other in results:
+      self.assertEqual(other.gfx[0].nametable, mem.gfx[0].nametable)
+      self.assertEqual(other.gfx[1].colorization, mem.gfx[1].colorization)
+    results = list(importer.read_ram_all(['testdata/full-image.mem']))
+    self.assertEqual(len(results), 1)
+    a = app.Application()
+    a.create_output(results[0][1], self.args, 'horizontal', None)
+    self.assert_output_result('nametable')
+    self.assert_output_result('attribute')
+
+  def test_import_valiant(self):
+    importer = memory_importer.MemoryImporter()
+    mem = importer.read('testdata/full-image.o', 'valiant')
+    a = app.Application()
+    a.create_output(mem, self.args, 'horizontal', None)
+    self.assert_output_result('chr')
+    self.assert_output_result('nametable')
+    self.assert_output_result('palette')
+    self.assert_output_result('attribute')
+
   def test_import_error_bad_size(self):
     importer = memory_importer.MemoryImporter()
     with self.assertRaises(errors.FileFormatError) as e:
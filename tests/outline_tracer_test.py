@@ -82,9 +82,44 @@ class OutlineTracerTests(unittest.TestCase):
       '#<RegionPerimeter 20 points=[y184,x96 y184,x104 y190,x104 y190,x106 y184,x106 y184,x114 y192,x114 y192,x110 y196,x110 y196,x117 y204,x117 y204,x109 y198,x109 y198,x107 y204,x107 y204,x99 y196,x99 y196,x102 y192,x102 y192,x96]>',
     ]
 
+    self.assertEqual(len(regions), len(expect))
     for i, r in enumerate(regions):
       self.assertEqual('%s' % r, expect[i])
 
+  def make_tracer(self, rows):
+    height = len(rows)
+    width = len(rows[0])
+    def is_clear(y, x):
+      if not (0 <= y < height and 0 <= x < width):
+        return True
+      return rows[y][x] == '.'
+    return outline_tracer.OutlineTracer(height, width, is_clear)
+
+  def test_label_runs_joins_u_shape(self):
+    tracer = self.make_tracer(['#..#',
+                               '#..#',
+                               '####'])
+    runs = tracer.label_runs()
+    self.assertEqual(len(runs), 5)
+    self.assertEqual(set(r[3] for r in runs), set([0]))
+    self.assertEqual(tracer.find_starts(), [(0, 0)])
+
+  def test_region_inside_another_bounding_box(self):
+    tracer = self.make_tracer(['........',
+                               '.######.',
+                               '.######.',
+                               '.##.....',
+                               '.##.##..',
+                               '.##.##..',
+                               '.##.....',
+                               '.######.',
+                               '.######.',
+                               '........'])
+    regions = tracer.find_regions()
+    self.assertEqual(len(regions), 2)
+    self.assertEqual(str(regions[1]),
+                     '#<RegionPerimeter 4 points=[y4,x4 y4,x6 y6,x6 y6,x4]>')
+
 
 if __name__ == '__main__':
   unittest.main()
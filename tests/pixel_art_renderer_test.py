@@ -0,0 +1,59 @@
+import io
+import unittest
+
+import context
+import library, pixel_art_renderer
+
+from PIL import Image, ImageChops
+
+
+class PixelArtRendererTests(unittest.TestCase):
+  def render(self, filename):
+    result = library.process(filename)
+    self.assertFalse(result.has_errors())
+    renderer = pixel_art_renderer.PixelArtRenderer()
+    return result.ppu_memory, renderer
+
+  def assert_equal_image(self, actual, expect):
+    self.assertEqual(actual.size, expect.size)
+    diff = ImageChops.difference(actual.convert('RGB'), expect.convert('RGB'))
+    self.assertIsNone(diff.getbbox())
+
+  def assert_same_art(self, actual, source):
+    """Rendered colors are snapped to nes colors, so colors must match 1:1."""
+    self.assertEqual(actual.size, source.size)
+    a = actual.convert('RGB').tobytes()
+    b = source.convert('RGB').tobytes()
+    pairs = set((a[i:i + 3], b[i:i + 3]) for i in range(0, len(a), 3))
+    self.assertEqual(len(set(p[0] for p in pairs)), len(pairs))
+    self.assertEqual(len(set(p[1] for p in pairs)), len(pairs))
+
+  def test_render_single_screen(self):
+    mem, renderer = self.render('testdata/full-image.png')
+    self.assert_equal_image(renderer.render(mem),
+                            Image.open('testdata/full-image.png'))
+
+  def test_render_double_wide(self):
+    mem, renderer = self.render('testdata/double-image.png')
+    self.assertEqual((mem.screen_y, mem.screen_x), (1, 2))
+    self.assert_same_art(renderer.render(mem),
+                         Image.open('testdata/double-image.png'))
+
+  def test_render_vertical_tall(self):
+    mem, renderer = self.render('testdata/vertical-image.png')
+    self.assertEqual((mem.screen_y, mem.screen_x), (2, 1))
+    self.assert_same_art(renderer.render(mem),
+                         Image.open('testdata/vertical-image.png'))
+
+  def test_render_png_streaming(self):
+    mem, renderer = self.render('testdata/vertical-image.png')
+    buff = io.BytesIO()
+    renderer.render_png(mem, buff)
+    buff.seek(0)
+    img = Image.open(buff)
+    self.assertEqual(img.mode, 'RGB')
+    self.assert_equal_image(img, renderer.render(mem))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+
+import context
+import pixel_mask
+
+
+class PixelMaskTests(unittest.TestCase):
+  def test_border_is_clear(self):
+    mask = pixel_mask.PixelMask(2, 3, b'\x01\x01\x01\x01\x00\x01')
+    self.assertEqual(mask.stride, 5)
+    self.assertEqual(len(mask.data), 5 * 4)
+    self.assertFalse(mask.is_clear(0, 0))
+    self.assertTrue(mask.is_clear(1, 1))
+    for y, x in [(-1, 0), (0, -1), (2, 2), (1, 3), (-1, -1), (2, 3)]:
+      self.assertTrue(mask.is_clear(y, x))
+
+  def test_row(self):
+    mask = pixel_mask.PixelMask(2, 3, b'\x01\x00\x00\x00\x01\x01')
+    self.assertEqual(mask.row(0), b'\x01\x00\x00')
+    self.assertEqual(mask.row(1), b'\x00\x01\x01')
+
+  def test_from_func(self):
+    mask = pixel_mask.PixelMask.from_func(2, 2, lambda y, x: x == y)
+    self.assertEqual(mask.row(0), b'\x00\x01')
+    self.assertEqual(mask.row(1), b'\x01\x00')
+    self.assertEqual(mask.data[mask.index(0, 1)], pixel_mask.OPAQUE)
+
+
+if __name__ == '__main__':
+  unittest.main()
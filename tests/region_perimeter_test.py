@@ -0,0 +1,57 @@
+import unittest
+
+import context
+import geometry
+import outline_tracer
+from direction_constants import *
+
+
+class RegionPerimeterTests(unittest.TestCase):
+  def setUp(self):
+    rows = ['................',
+            '.##############.',
+            '.##############.',
+            '.######.........',
+            '.######.........',
+            '.##############.',
+            '.##############.',
+            '................']
+    tracer = outline_tracer.OutlineTracer(len(rows), len(rows[0]),
+                                          lambda y, x: rows[y][x] == '.')
+    self.region = tracer.find_regions()[0]
+
+  def test_get_opposite_edge(self):
+    top = self.region.edges[0]
+    self.assertEqual(str(self.region.get_opposite_edge(top)),
+                     '#<Edge facing=up y=3 x0=7 x1=15>')
+    left = self.region.edges[-1]
+    self.assertEqual(str(self.region.get_opposite_edge(left)),
+                     '#<Edge facing=left y0=3 y1=5 x=7>')
+
+  def test_find_overlapping_vertices(self):
+    rect = geometry.Rectangle(1, 1, 7, 7)
+    found = self.region.find_overlapping_vertices(rect)
+    self.assertEqual([(v.y, v.x) for v in found],
+                     [(1, 1), (3, 7), (5, 7), (7, 1), (1, 1), (7, 1)])
+
+  def test_find_overlapping_edges(self):
+    rect = geometry.Rectangle(1, 1, 3, 15)
+    found = self.region.find_overlapping_edges(rect)
+    self.assertEqual([str(e) for e, amount in found],
+                     ['#<Edge facing=down y=1 x0=1 x1=15>',
+                      '#<Edge facing=left y0=1 y1=3 x=15>',
+                      '#<Edge facing=up y=3 x0=7 x1=15>',
+                      '#<Edge facing=right y0=1 y1=7 x=1>'])
+
+  def test_push_as_far_as_available(self):
+    edge = geometry.Edge(DIR_RIGHT, 3, 1, 5, 1)
+    self.assertEqual(str(self.region.push_as_far_as_available(edge)),
+                     '#<Edge facing=right y0=3 y1=5 x=7>')
+    # A collected rectangle can stop the push sooner than an edge.
+    self.region.put_rect(geometry.Rectangle(2, 5, 6, 9))
+    self.assertEqual(str(self.region.push_as_far_as_available(edge)),
+                     '#<Edge facing=right y0=3 y1=5 x=5>')
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+import context
+import resource_cache
+
+
+class ResourceCacheTests(unittest.TestCase):
+  def test_get_builds_once(self):
+    calls = []
+    def build():
+      calls.append(1)
+      return object()
+    first = resource_cache.get(('test', 'builds-once'), build)
+    self.assertIs(resource_cache.get(('test', 'builds-once'), build), first)
+    self.assertEqual(len(calls), 1)
+
+  def test_nt_font(self):
+    glyphs, w, h = resource_cache.nt_font(False)
+    self.assertEqual((len(glyphs), w, h), (16, 3, 5))
+    self.assertEqual(glyphs[0].mode, 'P')
+    glyphs, w, h = resource_cache.nt_font(True)
+    self.assertEqual((len(glyphs), w, h), (16, 7, 11))
+    self.assertIs(resource_cache.nt_font(True)[0], glyphs)
+
+  def test_colored_glyph(self):
+    glyph = resource_cache.colored_glyph(1, 0xc0c0c0, 2)
+    self.assertEqual(glyph.size, (3 * 2, 5 * 2))
+    colors = sorted(c for n, c in glyph.getcolors())
+    self.assertEqual(colors, [(0, 0, 0), (0xc0, 0xc0, 0xc0)])
+    self.assertIs(resource_cache.colored_glyph(1, 0xc0c0c0, 2), glyph)
+
+  def test_nt_value_atlas(self):
+    atlas = resource_cache.nt_value_atlas(False, 2)
+    self.assertEqual(len(atlas), 0x100)
+    self.assertEqual(atlas[0x3c].size, (7 + 6, 10))
+    upper = resource_cache.colored_glyph(3, resource_cache.NT_UPPER_COLOR, 2)
+    lower = resource_cache.colored_glyph(0xc, resource_cache.NT_LOWER_COLOR, 2)
+    self.assertEqual(atlas[0x3c].crop((0, 0, 6, 10)).tobytes(),
+                     upper.tobytes())
+    self.assertEqual(atlas[0x3c].crop((7, 0, 13, 10)).tobytes(),
+                     lower.tobytes())
+    self.assertIs(resource_cache.nt_value_atlas(False, 2), atlas)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+
+import context
+import errors
+import rgb
+
+
+class RgbTests(unittest.TestCase):
+  def test_get_mapping(self):
+    mapping = rgb.get_mapping('fceux')
+    self.assertEqual(mapping.name, 'fceux')
+    self.assertIs(rgb.get_mapping('fceux'), mapping)
+    self.assertEqual(rgb.get_mapping().name, 'almighty')
+
+  def test_unknown_mapping(self):
+    with self.assertRaises(errors.UnknownRgbMapping) as cm:
+      rgb.get_mapping('unknown')
+    self.assertEqual(str(cm.exception), 'Unknown rgb-mapping: "unknown"')
+
+  def test_nc_to_rgb(self):
+    self.assertEqual(rgb.get_mapping('almighty').nc_to_rgb(0x16),
+                     (0xf8, 0x38, 0x00))
+    self.assertEqual(rgb.get_mapping('fceux').nc_to_rgb(0x16),
+                     (0xd8, 0x28, 0x00))
+
+  def test_mappings_side_by_side(self):
+    almighty = rgb.RgbMapping('almighty', rgb.get_mapping('almighty').colors)
+    fceux = rgb.RgbMapping('fceux', rgb.get_mapping('fceux').colors)
+    self.assertEqual(fceux.xlat[0xd82800], 0x16)
+    self.assertNotIn(0xd82800, almighty.xlat)
+    # Converted colors are only cached by the mapping that converted them.
+    self.assertEqual(almighty.components_to_nescolor(0xf0, 0x38, 0x00), 0x16)
+    self.assertEqual(almighty.xlat[0xf03800], 0x16)
+    self.assertNotIn(0xf03800, fceux.xlat)
+    self.assertEqual(almighty.components_to_nescolor(0x80, 0xd0, 0x90), -1)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -27,6 +27,10 @@ class MockArgs(object):
     self.compile = self.tmpfile('rom.nes')
     self.select_chr_plane = None
     self.vertical_pixel_display = False
+    self.write_if_changed = False
+    self.module = None
+    self.jobs = None
+    self.verbose = False
     self.output = self.tmpfile('full-image-%s.dat')
 
   def tmpfile(self, template):
@@ -0,0 +1,45 @@
+import unittest
+
+import context
+import span_list
+from data import Span, Region
+
+
+class SpanListTests(unittest.TestCase):
+  def test_find_spans(self):
+    row = b'\x00\x01\x01\x00\x00\x01\x00'
+    self.assertEqual(span_list.find_spans(row), [Span(1,3), Span(5,6)])
+
+  def test_find_spans_empty(self):
+    self.assertEqual(span_list.find_spans(b'\x00' * 8), [])
+
+  def test_find_spans_to_the_edge(self):
+    spans = span_list.find_spans(b'\x01\x00\x00\x01\x01')
+    self.assertEqual(spans[0], Span(0,1))
+    self.assertEqual(spans[1].left, 3)
+    self.assertIsNone(spans[1].right)
+
+  def test_sorted_insert(self):
+    target = span_list.SortedSpanList()
+    target.insert(Region(20, 24))
+    target.insert(Region(4, 8))
+    target.insert(Region(12, 16))
+    self.assertEqual(str(target),
+                     '[<Region L=4 R=8>, <Region L=12 R=16>, '
+                     '<Region L=20 R=24>]')
+    self.assertEqual(len(target), 3)
+    self.assertEqual(target[1], Span(12, 16))
+
+  def test_sorted_remove(self):
+    target = span_list.SortedSpanList()
+    middle = Region(12, 16)
+    for r in [Region(4, 8), middle, Region(20, 24)]:
+      target.insert(r)
+    target.remove(middle)
+    self.assertEqual(str(target), '[<Region L=4 R=8>, <Region L=20 R=24>]')
+    with self.assertRaises(ValueError):
+      target.remove(middle)
+
+
+if __name__ == '__main__':
+  unittest.main()
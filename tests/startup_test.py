@@ -0,0 +1,83 @@
+import unittest
+
+import context
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+
+# Time allowed for makechr's own imports when printing the version. Only the
+# argparse module and a few small ones are needed, which is much less than
+# this, but importing the app or PIL would go over.
+IMPORT_BUDGET_MS = 40
+
+
+# Timing depends on the machine, so it is only checked when asked for.
+IS_PERF = bool(os.environ.get('MAKECHR_PERF_TESTS'))
+
+
+class StartupTests(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def import_times(self, args):
+    """Run python with -X importtime, return the cumulative time of each
+    import, in microseconds, and whether it was imported at the top level."""
+    p = subprocess.Popen([sys.executable, '-X', 'importtime'] + args,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    (out, err) = p.communicate()
+    answer = {}
+    for line in err.decode('utf-8').splitlines():
+      if not line.startswith('import time:'):
+        continue
+      fields = line[len('import time:'):].split('|')
+      if not fields[0].strip().isdigit():
+        continue
+      name = fields[2].rstrip()
+      # Nested imports are indented further.
+      is_top = not name.startswith('  ')
+      answer[name.strip()] = (int(fields[1]), is_top)
+    return answer
+
+  def makechr_import_times(self, args):
+    curr_dir = os.path.dirname(os.path.abspath(__file__))
+    makechr = os.path.join(curr_dir, '../makechr/makechr.py')
+    # First run compiles any stale modules, so that isn't timed.
+    self.import_times([makechr] + args)
+    interpreter = self.import_times(['-c', 'pass'])
+    found = self.import_times([makechr] + args)
+    for name in interpreter:
+      found.pop(name, None)
+    return found
+
+  def test_version_imports(self):
+    found = self.makechr_import_times(['--version'])
+    self.assertIn('argparse', found)
+    for name in ['app', 'PIL', 'google.protobuf', 'multiprocessing']:
+      self.assertNotIn(name, found)
+
+  @unittest.skipUnless(IS_PERF, 'set MAKECHR_PERF_TESTS=1 to check timing')
+  def test_version_import_budget(self):
+    found = self.makechr_import_times(['--version'])
+    total = sum(t for t, is_top in found.values() if is_top) / 1000.0
+    self.assertLess(total, IMPORT_BUDGET_MS,
+                    'imports took %.1fms' % total)
+
+  def test_convert_imports(self):
+    output_name = os.path.join(self.tmpdir, 'full-image.%s.dat')
+    found = self.makechr_import_times(['testdata/full-image.png',
+                                       '-o', output_name])
+    self.assertIn('app', found)
+    for name in ['google.protobuf', 'memory_importer', 'multiprocessing',
+                 'pixel_art_renderer', 'rom_builder', 'view_renderer']:
+      self.assertNotIn(name, found)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+
+import context
+import changed_file_writer, errors, valiant_archive
+
+import os
+import tempfile
+
+
+class ValiantArchiveTests(unittest.TestCase):
+  def setUp(self):
+    self.filename = os.path.join(tempfile.mkdtemp(), 'lib.vla')
+    fp = open('testdata/full-image.o', 'rb')
+    self.content = fp.read()
+    fp.close()
+
+  def test_put_and_read(self):
+    archive = valiant_archive.ValiantArchive(self.filename)
+    archive.put('first', self.content)
+    archive.put_file('testdata/full-image-order1.o')
+    self.assertTrue(valiant_archive.is_archive(self.filename))
+    archive = valiant_archive.ValiantArchive(self.filename)
+    self.assertEqual(archive.names(), ['first', 'full-image-order1'])
+    self.assertEqual(archive.read('first'), self.content)
+    with archive.reader('first') as reader:
+      self.assertEqual(reader.header.module, 'full-image')
+      self.assertEqual(len(reader.binary('nametable')), 0x3c0)
+    with archive.reader('full-image-order1') as reader:
+      self.assertEqual(reader.roles(),
+                       ['nametable', 'chr', 'palette', 'attribute'])
+
+  def test_replace(self):
+    archive = valiant_archive.ValiantArchive(self.filename)
+    archive.put('first', b'(VALIANT)old')
+    archive.put('second', self.content)
+    offset, size = archive.locate('second')
+    archive.put('first', self.content)
+    archive = valiant_archive.ValiantArchive(self.filename)
+    self.assertEqual(archive.names(), ['first', 'second'])
+    self.assertEqual(archive.read('first'), self.content)
+    # Other modules are not moved.
+    self.assertEqual(archive.locate('second'), (offset, size))
+
+  def test_compact(self):
+    archive = valiant_archive.ValiantArchive(self.filename)
+    archive.put('first', b'(VALIANT)old')
+    archive.put('second', self.content)
+    archive.put('first', b'(VALIANT)new')
+    self.assertGreater(archive.dead_space(), 0)
+    archive.compact()
+    self.assertEqual(archive.dead_space(), 0)
+    archive = valiant_archive.ValiantArchive(self.filename)
+    self.assertEqual(archive.names(), ['first', 'second'])
+    self.assertEqual(archive.read('first'), b'(VALIANT)new')
+    self.assertEqual(archive.read('second'), self.content)
+
+  def test_replace_many_times(self):
+    archive = valiant_archive.ValiantArchive(self.filename)
+    archive.put('other', self.content)
+    for i in range(50):
+      archive.put('first', self.content)
+    # Replaced modules are reclaimed, instead of growing without a limit.
+    live = os.path.getsize(self.filename) - archive.dead_space()
+    self.assertLessEqual(archive.dead_space(), live)
+    archive = valiant_archive.ValiantArchive(self.filename)
+    self.assertEqual(archive.names(), ['other', 'first'])
+    self.assertEqual(archive.read('first'), self.content)
+
+  def test_put_if_changed(self):
+    writer = changed_file_writer.ChangedFileWriter(True)
+    archive = valiant_archive.ValiantArchive(self.filename)
+    self.assertTrue(archive.put('first', self.content, writer))
+    size = os.path.getsize(self.filename)
+    self.assertFalse(archive.put('first', self.content, writer))
+    self.assertEqual(os.path.getsize(self.filename), size)
+    self.assertEqual((writer.num_written, writer.num_unchanged), (1, 1))
+
+  def test_module_not_found(self):
+    archive = valiant_archive.ValiantArchive(self.filename)
+    archive.put('first', self.content)
+    with self.assertRaises(errors.ValiantFormatError):
+      archive.read('missing')
+
+  def test_not_archive(self):
+    with self.assertRaises(errors.ValiantFormatError):
+      valiant_archive.ValiantArchive('testdata/full-image.o')
+    self.assertFalse(valiant_archive.is_archive('testdata/full-image.o'))
+
+  def test_empty_index(self):
+    fp = open(self.filename, 'wb')
+    fp.write(valiant_archive.MAGIC + b'\0' * 12)
+    fp.close()
+    with self.assertRaises(errors.ValiantFormatError):
+      valiant_archive.ValiantArchive(self.filename)
+
+  def test_failed_put(self):
+    archive = valiant_archive.ValiantArchive(self.filename)
+    # Content that fails to be written.
+    with self.assertRaises(TypeError):
+      archive.put('first', None)
+    # A new archive is not left behind half written.
+    self.assertFalse(os.path.exists(self.filename))
+    self.assertEqual(archive.names(), [])
+    archive.put('first', self.content)
+    with self.assertRaises(TypeError):
+      archive.put('second', None)
+    self.assertEqual(archive.names(), ['first'])
+    archive = valiant_archive.ValiantArchive(self.filename)
+    self.assertEqual(archive.names(), ['first'])
+    self.assertEqual(archive.read('first'), self.content)
+
+
+if __name__ == '__main__':
+  unittest.main()
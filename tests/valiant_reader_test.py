@@ -0,0 +1,77 @@
+import unittest
+
+import context
+import errors, valiant_reader
+
+import os
+import tempfile
+
+
+class ClosingReader(valiant_reader.ValiantReader):
+  closed = []
+
+  def close(self):
+    valiant_reader.ValiantReader.close(self)
+    ClosingReader.closed.append(self._fp.closed)
+
+
+class ValiantReaderTests(unittest.TestCase):
+  def read_golden(self, name):
+    fp = open('testdata/full-image-%s.dat' % name, 'rb')
+    content = fp.read()
+    fp.close()
+    return content
+
+  def test_index(self):
+    with valiant_reader.ValiantReader('testdata/full-image.o') as reader:
+      self.assertEqual(reader.header.module, 'full-image')
+      self.assertEqual(reader.roles(),
+                       ['nametable', 'chr', 'palette', 'attribute'])
+      self.assertEqual(reader.count('nametable'), 1)
+      self.assertEqual(reader.count('spritelist'), 0)
+      self.assertTrue(reader.has('chr'))
+      self.assertFalse(reader.has('spritelist'))
+      self.assertIs(reader.find('palette'), reader.packets[2])
+      with self.assertRaises(errors.ValiantFormatError):
+        reader.find('nametable', 1)
+
+  def test_lazy_expand(self):
+    with valiant_reader.ValiantReader('testdata/full-image.o') as reader:
+      self.assertEqual(reader.binary('nametable'),
+                       self.read_golden('nametable'))
+      self.assertEqual(reader.binary('attribute'),
+                       self.read_golden('attribute'))
+      # Only the accessed packets are parsed.
+      self.assertEqual(len(reader._parsed), 2)
+      self.assertIs(reader.binary('nametable'), reader.binary('nametable'))
+
+  def test_chr(self):
+    with valiant_reader.ValiantReader('testdata/full-image.o') as reader:
+      self.assertEqual(reader.binary('chr')[:0x1000],
+                       self.read_golden('chr')[:0x1000])
+      self.assertEqual(len(reader.binary('chr')), 0x1000)
+
+  def test_is_valiant(self):
+    self.assertTrue(valiant_reader.is_valiant('testdata/full-image.o'))
+    self.assertFalse(valiant_reader.is_valiant('testdata/full-image.png'))
+
+  def test_not_valiant(self):
+    with self.assertRaises(errors.ValiantFormatError):
+      valiant_reader.ValiantReader('testdata/full-image.png')
+
+  def test_truncated(self):
+    fp = open('testdata/full-image.o', 'rb')
+    content = fp.read()
+    fp.close()
+    tmpfile = os.path.join(tempfile.mkdtemp(), 'truncated.o')
+    fp = open(tmpfile, 'wb')
+    fp.write(content[:len(content) // 2])
+    fp.close()
+    with self.assertRaises(errors.ValiantFormatError):
+      ClosingReader(tmpfile)
+    # The file is closed, even though the reader was never returned.
+    self.assertEqual(ClosingReader.closed, [True])
+
+
+if __name__ == '__main__':
+  unittest.main()
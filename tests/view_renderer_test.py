@@ -0,0 +1,26 @@
+import unittest
+
+import context
+import chr_data, view_renderer
+
+
+class ViewRendererTests(unittest.TestCase):
+  def test_tile_bitmap_cached(self):
+    renderer = view_renderer.ViewRenderer()
+    tile = chr_data.ChrTile()
+    tile.put_pixel(0, 1, 3)
+    bitmap = renderer.tile_bitmap(tile, view_renderer.GRAY_PALETTE, 2)
+    self.assertEqual(bitmap.size, (16, 16))
+    self.assertEqual(bitmap.getpixel((0, 0)), (30, 30, 30))
+    self.assertEqual(bitmap.getpixel((2, 0)), (255, 255, 255))
+    self.assertEqual(bitmap.getpixel((3, 1)), (255, 255, 255))
+    same = chr_data.ChrTile()
+    same.put_pixel(0, 1, 3)
+    self.assertIs(renderer.tile_bitmap(same, view_renderer.GRAY_PALETTE, 2),
+                  bitmap)
+    self.assertIsNot(renderer.tile_bitmap(same, view_renderer.GRAY_PALETTE, 1),
+                     bitmap)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+import context
+import view_scheduler
+
+import threading
+
+
+class ViewSchedulerTests(unittest.TestCase):
+  def test_parallel(self):
+    views = view_scheduler.ViewScheduler(jobs=3)
+    names = []
+    def render(name):
+      names.append(threading.current_thread().name)
+      return name.upper()
+    for name in ['palette', 'chr', 'nametable']:
+      views.add(name, render, name)
+    views.start()
+    results = views.wait()
+    self.assertEqual(results, {'palette': 'PALETTE', 'chr': 'CHR',
+                               'nametable': 'NAMETABLE'})
+    self.assertEqual(sorted(n for n, t in views.timings),
+                     ['chr', 'nametable', 'palette'])
+    self.assertNotIn(threading.current_thread().name, names)
+
+  def test_single_job(self):
+    views = view_scheduler.ViewScheduler(jobs=1)
+    names = []
+    views.add('chr', lambda: names.append(threading.current_thread().name))
+    views.start()
+    # Runs right away, on the calling thread.
+    self.assertEqual(names, [threading.current_thread().name])
+    self.assertEqual(list(views.wait().keys()), ['chr'])
+
+  def test_error(self):
+    views = view_scheduler.ViewScheduler(jobs=2)
+    def fail():
+      raise RuntimeError('failed')
+    views.add('chr', fail)
+    views.add('palette', lambda: None)
+    views.start()
+    with self.assertRaises(RuntimeError):
+      views.wait()
+
+  def test_keep_pool(self):
+    views = view_scheduler.ViewScheduler(jobs=2, keep_pool=True)
+    for n in range(3):
+      views.add('chr', lambda: n)
+      views.add('palette', lambda: -n)
+      views.start()
+      self.assertEqual(views.wait(), {'chr': n, 'palette': -n})
+      if n == 0:
+        pool = views._pool
+      # The same threads render each time.
+      self.assertIs(views._pool, pool)
+    views.close()
+    self.assertIsNone(views._pool)
+
+  def test_pool_closed_after_wait(self):
+    views = view_scheduler.ViewScheduler(jobs=2)
+    views.add('chr', lambda: None)
+    views.add('palette', lambda: None)
+    views.start()
+    views.wait()
+    self.assertIsNone(views._pool)
+
+
+if __name__ == '__main__':
+  unittest.main()